@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sms.settings')
+# Serve the read-only pages with the coroutine views (students/async_views.py).
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,277 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+
+from students import caching
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Share of requests profiled when PERF_SAMPLE_RATE is not set. Profiling
+# wraps every SQL statement, so it is kept low outside development.
+DEFAULT_SAMPLE_RATE = 0.01
+METRICS = ("wall", "queries", "sql", "render", "duplicates")
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RequestProfile:
+    """SQL and template timings of one sampled request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_start = None
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values())
+
+    def render_started(self):
+        self.render_start = time.perf_counter()
+
+    def render_finished(self, response):
+        self.render_time = time.perf_counter() - self.render_start
+
+
+class RouteStats:
+    def __init__(self, window):
+        self.count = 0
+        self.wall_sum = 0.0
+        self.sampled = 0
+        self.queries_sum = 0
+        self.duplicates_sum = 0
+        self.samples = {name: deque(maxlen=window) for name in METRICS}
+
+
+class PerfRegistry:
+    """Rolling per-route samples plus cumulative counters, shared by all threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, wall, profile=None):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats(setting("PERF_WINDOW", 1000))
+            stats.count += 1
+            stats.wall_sum += wall
+            stats.samples["wall"].append(wall)
+            if profile is not None:
+                stats.sampled += 1
+                stats.queries_sum += profile.queries
+                stats.duplicates_sum += profile.duplicates
+                stats.samples["queries"].append(profile.queries)
+                stats.samples["sql"].append(profile.sql_time)
+                stats.samples["render"].append(profile.render_time)
+                stats.samples["duplicates"].append(profile.duplicates)
+
+    def snapshot(self):
+        """[(route, stats, {metric: {quantile: value}})] sorted by route."""
+        with self.lock:
+            rows = []
+            for route, stats in sorted(self.routes.items()):
+                summary = {}
+                for name, values in stats.samples.items():
+                    ordered = sorted(values)
+                    summary[name] = {q: percentile(ordered, q) for q in QUANTILES}
+                rows.append((route, stats, summary))
+            return rows
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = PerfRegistry()
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or "<unnamed>"
+
+
+class PerfMiddleware:
+    """
+    Times every request and, for a PERF_SAMPLE_RATE share of them, also
+    counts SQL queries, SQL time, duplicate statements and template render
+    time. Add it first in MIDDLEWARE so its timings cover the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not setting("PERF_ENABLED", True):
+            return self.get_response(request)
+
+        profile = self.sample(request)
+        start = time.perf_counter()
+        with self.wrap_connections(profile):
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start, profile)
+
+    async def __acall__(self, request):
+        if not setting("PERF_ENABLED", True):
+            return await self.get_response(request)
+
+        profile = self.sample(request)
+        start = time.perf_counter()
+        if profile is None:
+            response = await self.get_response(request)
+        else:
+            # Connections are per thread: the wrappers go on the ones of the
+            # thread the async ORM runs this request's queries in.
+            stack = await sync_to_async(self.wrap_connections)(profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        return self.finish(request, response, time.perf_counter() - start, profile)
+
+    def sample(self, request):
+        if random.random() < setting("PERF_SAMPLE_RATE", DEFAULT_SAMPLE_RATE):
+            request._perf_profile = RequestProfile()
+            return request._perf_profile
+        return None
+
+    def wrap_connections(self, profile):
+        stack = ExitStack()
+        if profile is not None:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile))
+        return stack
+
+    def finish(self, request, response, wall, profile):
+        registry.record(route_name(request), wall, profile)
+        if profile is not None:
+            response["Server-Timing"] = (
+                f'sql;dur={profile.sql_time * 1000:.1f};desc="{profile.queries} queries", '
+                f"render;dur={profile.render_time * 1000:.1f}, "
+                f"total;dur={wall * 1000:.1f}"
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Being first in MIDDLEWARE, this hook runs last, right before render().
+        profile = getattr(request, "_perf_profile", None)
+        if profile is not None:
+            profile.render_started()
+            response.add_post_render_callback(profile.render_finished)
+        return response
+
+
+@staff_member_required
+def perf_panel(request):
+    rows = []
+    for route, stats, summary in registry.snapshot():
+        rows.append({
+            "route": route,
+            "count": stats.count,
+            "sampled": stats.sampled,
+            "wall": [summary["wall"][q] * 1000 for q in QUANTILES],
+            "queries": [summary["queries"][q] for q in QUANTILES],
+            "sql": [summary["sql"][q] * 1000 for q in QUANTILES],
+            "render": [summary["render"][q] * 1000 for q in QUANTILES],
+            "duplicates": summary["duplicates"][0.95],
+        })
+    rows.sort(key=lambda row: row["wall"][1], reverse=True)
+    context = {
+        "rows": rows,
+        "sample_rate": setting("PERF_SAMPLE_RATE", DEFAULT_SAMPLE_RATE),
+        "cache_rows": [(view, hit, miss) for view, (hit, miss) in caching.hits.snapshot().items()],
+    }
+    return render(request, "perf/panel.html", context)
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metrics(request):
+    """
+    Prometheus exposition of the registry and page cache counters, for
+    staff sessions or, when PERF_METRICS_TOKEN is set, scrapers sending
+    "Authorization: Bearer <token>".
+    """
+    token = setting("PERF_METRICS_TOKEN", None)
+    authorization = request.headers.get("Authorization")
+    if token and authorization == f"Bearer {token}":
+        return metrics_response()
+    if authorization:
+        return HttpResponseForbidden()
+    return staff_metrics(request)
+
+
+@staff_member_required
+def staff_metrics(request):
+    return metrics_response()
+
+
+def metrics_response():
+    summaries = [
+        ("sms_request_duration_seconds", "Wall time per request.", "wall", "wall_sum", "count"),
+        ("sms_request_queries", "SQL queries per sampled request.", "queries", "queries_sum", "sampled"),
+    ]
+    lines = []
+    snapshot = registry.snapshot()
+    for metric, help_text, sample, total, count in summaries:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+        for route, stats, summary in snapshot:
+            label = f'route="{escape_label(route)}"'
+            for q in QUANTILES:
+                lines.append(f'{metric}{{{label},quantile="{q}"}} {summary[sample][q]}')
+            lines.append(f"{metric}_sum{{{label}}} {getattr(stats, total)}")
+            lines.append(f"{metric}_count{{{label}}} {getattr(stats, count)}")
+    lines += [
+        "# HELP sms_request_duplicate_queries_total Repeated identical SQL statements in sampled requests.",
+        "# TYPE sms_request_duplicate_queries_total counter",
+    ]
+    for route, stats, _ in snapshot:
+        lines.append(f'sms_request_duplicate_queries_total{{route="{escape_label(route)}"}} {stats.duplicates_sum}')
+    lines += [
+        "# HELP sms_page_cache_requests_total Page cache lookups by outcome.",
+        "# TYPE sms_page_cache_requests_total counter",
+    ]
+    for view, (hit, miss) in caching.hits.snapshot().items():
+        lines.append(f'sms_page_cache_requests_total{{view="{view}",outcome="hit"}} {hit}')
+        lines.append(f'sms_page_cache_requests_total{{view="{view}",outcome="miss"}} {miss}')
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
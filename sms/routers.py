@@ -0,0 +1,128 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PIN_COOKIE = "sms_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_replica_down_until = 0.0
+
+
+def replica_alias():
+    return getattr(settings, "REPLICA_ALIAS", "replica")
+
+
+def replica_available():
+    """
+    True if the replica alias is configured and answers. A failed connect
+    marks it down for REPLICA_RETRY_SECONDS so every query in the meantime
+    goes to the primary without paying for another attempt.
+    """
+    global _replica_down_until
+    alias = replica_alias()
+    if alias not in connections.settings or time.monotonic() < _replica_down_until:
+        return False
+    conn = connections[alias]
+    if conn.connection is None:
+        try:
+            conn.ensure_connection()
+        except DatabaseError:
+            _replica_down_until = time.monotonic() + getattr(settings, "REPLICA_RETRY_SECONDS", 30)
+            return False
+    return True
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica while a read-only view (use_replica = True) is
+    handling a safe request that is not pinned to the primary; everything
+    else, including all writes, the admin and management commands, uses the
+    default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_available():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated itself.
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Turns replica reads on for read-only views and pins a client to the
+    primary for REPLICA_PIN_SECONDS after it writes, so it reads its own
+    writes while the replica catches up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(request)
+        return self.pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        if request.method in SAFE_METHODS and getattr(view_class, "use_replica", False) and not self.pinned(request):
+            request._replica_reads = True
+            _replica_reads.set(True)
+
+    def finish(self, request):
+        # Threads are reused between requests under WSGI; clear the flag.
+        if getattr(request, "_replica_reads", False):
+            _replica_reads.set(False)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax")
+        return response
+
+    def pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'sms.perf.PerfMiddleware',
+    'sms.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +56,21 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'sms.urls'
 
+# Route the list and detail pages to the async views in students/async_views.py.
+# sms/asgi.py turns this on; under WSGI the sync views are used.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Request instrumentation (sms/perf.py). Wall time is recorded for every
+# request; SQL and template timings for a PERF_SAMPLE_RATE share of them
+# (raise it, up to 1.0, while investigating a route).
+# Percentiles are taken over the last PERF_WINDOW samples per route.
+# /metrics needs a staff login, or "Authorization: Bearer <token>" when
+# PERF_METRICS_TOKEN is set, so Prometheus can scrape it.
+PERF_ENABLED = True
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '0.01'))
+PERF_WINDOW = 1000
+PERF_METRICS_TOKEN = os.environ.get('PERF_METRICS_TOKEN')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -76,13 +93,80 @@ LOGOUT_REDIRECT_URL = "login"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# sms.sqlite is the stock SQLite backend plus per-connection PRAGMAs (WAL,
+# synchronous=NORMAL, busy_timeout, cache/mmap sizes; see sms/sqlite/base.py),
+# overridable through OPTIONS['pragmas']. IMMEDIATE transactions take the
+# write lock up front, so concurrent writers wait on busy_timeout instead of
+# failing with "database is locked" when a read lock cannot be upgraded.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'sms.sqlite',
+        # SQLITE_PATH points a process at another file, e.g. the benchmark datasets.
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {},
+        },
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica (sms/routers.py). Read-only views read from REPLICA_ALIAS when
+# it is configured and reachable, otherwise from default. A client is pinned
+# to default for REPLICA_PIN_SECONDS after each write. For local use, point
+# REPLICA_DATABASE at a file and keep it in sync with
+# `python manage.py sync_replica --interval 5`.
+REPLICA_ALIAS = 'replica'
+REPLICA_PIN_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+REPLICA_DATABASE = os.environ.get('REPLICA_DATABASE')
+if REPLICA_DATABASE:
+    DATABASES[REPLICA_ALIAS] = {
+        'ENGINE': 'sms.sqlite',
+        # Opened read-only, so a missing file fails to connect (and the
+        # router falls back) instead of being created empty.
+        'NAME': f'file:{REPLICA_DATABASE}?mode=ro',
+        'OPTIONS': {'pragmas': {'journal_mode': None}},
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['sms.routers.ReplicaRouter']
+
+
+# Cache
+# CACHE_BACKEND picks the store behind the page cache (students/caching.py):
+# "locmem" (per process, default), "file" (shared by processes on one host)
+# or "redis" (shared by all hosts; needs the redis package and REDIS_URL).
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sms',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]}
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 600
+
+# Background jobs (students/jobs.py), run by `manage.py run_workers`. Export
+# files and uploads waiting to be imported are kept in JOB_FILES_DIR. A worker
+# beats every JOB_HEARTBEAT_SECONDS while a job runs; a job silent for
+# JOB_STALE_SECONDS is taken to have lost its worker and is requeued.
+JOB_FILES_DIR = os.environ.get('JOB_FILES_DIR', os.path.join(BASE_DIR, 'jobfiles'))
+JOB_RETRY_DELAY = 10
+JOB_STALE_SECONDS = 600
+JOB_HEARTBEAT_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
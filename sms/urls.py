@@ -1,12 +1,16 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
+from . import perf
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("_perf/", perf.perf_panel, name="perf_panel"),
+    path("metrics", perf.metrics, name="perf_metrics"),
     path("", TemplateView.as_view(template_name="home.html"), name="home"),
     path("accounts/login/", auth_views.LoginView.as_view(template_name="auth/login.html"), name="login"),
     path("accounts/logout/", auth_views.LogoutView.as_view(), name="logout"),
-    path("", include("students.urls")),
+    path("", include("students.async_urls" if settings.ASYNC_VIEWS else "students.urls")),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Course, Instructor, Enrollment, Metadata
+from .models import Student, Course, CourseStats, Instructor, Enrollment, ArchivedEnrollment, Job, Metadata, Term
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ("first_name", "last_name", "email")
@@ -17,8 +17,29 @@ class InstructorAdmin(admin.ModelAdmin):
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
-    list_display = ("student", "course", "grade")
+    list_display = ("student", "course", "term", "grade")
+    list_filter = ("term",)
     search_fields = ("student__first_name", "student__last_name", "course__course_code")
 
+@admin.register(Term)
+class TermAdmin(admin.ModelAdmin):
+    list_display = ("name", "starts_on", "ends_on", "archived_at")
+
+@admin.register(ArchivedEnrollment)
+class ArchivedEnrollmentAdmin(admin.ModelAdmin):
+    list_display = ("student", "course", "term", "grade")
+    list_filter = ("term",)
+    readonly_fields = [f.name for f in ArchivedEnrollment._meta.fields]
+
 admin.site.register(Metadata)
 
+@admin.register(CourseStats)
+class CourseStatsAdmin(admin.ModelAdmin):
+    list_display = ("course", "enrollment_count", "score_count")
+    readonly_fields = [f.name for f in CourseStats._meta.fields]
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "progress", "total", "created_at", "finished_at")
+    list_filter = ("status", "task")
+    readonly_fields = [f.name for f in Job._meta.fields]
@@ -0,0 +1,196 @@
+from collections import defaultdict
+
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.generic import View
+
+from .models import Course, Enrollment, Instructor, Metadata, Student
+from .pagination import InvalidCursor, KeysetPaginator
+from .views import CourseListView, EnrollmentListView, InstructorListView, MetadataListView, StudentListView
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Resource:
+    """
+    One API collection. fields are the names ?fields= may select (FKs come
+    out as ids); includes are the relations ?include= may follow.
+    """
+
+    def __init__(self, name, model, list_view, fields, includes=(), login_required=False):
+        self.name = name
+        self.model = model
+        self.list_view = list_view
+        self.fields = fields
+        self.includes = includes
+        self.login_required = login_required
+
+
+RESOURCES = {
+    resource.name: resource
+    for resource in [
+        Resource("students", Student, StudentListView,
+                 ["id", "first_name", "last_name", "email", "dob", "updated_at"], ["enrollments", "metadata"]),
+        Resource("courses", Course, CourseListView,
+                 ["id", "course_code", "course_name", "description", "updated_at"], ["enrollments", "instructors", "metadata"]),
+        Resource("instructors", Instructor, InstructorListView,
+                 ["id", "first_name", "last_name", "email", "updated_at"], ["courses", "metadata"]),
+        Resource("enrollments", Enrollment, EnrollmentListView,
+                 ["id", "student", "course", "term", "exam_score", "grade", "updated_at"], ["student", "course", "metadata"]),
+        Resource("metadata", Metadata, MetadataListView,
+                 ["id", "key", "value", "created_at", "updated_at"], login_required=True),
+    ]
+}
+BY_MODEL = {resource.model: resource for resource in RESOURCES.values()}
+
+
+def parse_includes(param, resource):
+    """'enrollments.course,metadata' -> {"enrollments": {"course": {}}, "metadata": {}}"""
+    tree = {}
+    for item in filter(None, (part.strip() for part in param.split(","))):
+        node, current = tree, resource
+        for name in item.split("."):
+            if name not in current.includes:
+                raise ApiError(f"Cannot include '{name}' on {current.name}.")
+            current = BY_MODEL[current.model._meta.get_field(name).related_model]
+            node = node.setdefault(name, {})
+    return tree
+
+
+def parse_fields(param, resource, tree):
+    """'email,enrollments.grade' -> {(): ["email"], ("enrollments",): ["grade"]}"""
+    selected = defaultdict(list)
+    for item in filter(None, (part.strip() for part in param.split(","))):
+        *path, name = item.split(".")
+        node, current = tree, resource
+        for segment in path:
+            if segment not in node:
+                raise ApiError(f"'{item}' selects fields of '{segment}', which is not included.")
+            node = node[segment]
+            current = BY_MODEL[current.model._meta.get_field(segment).related_model]
+        if name not in current.fields:
+            raise ApiError(f"Unknown field '{name}' on {current.name}.")
+        selected[tuple(path)].append(name)
+    return selected
+
+
+def columns(resource, tree, selected, path):
+    """Fields to read for one level: the selection (or all), the id, and FKs the includes follow."""
+    wanted = selected.get(path) or resource.fields
+    needed = ["id"] + [f for f in wanted if f != "id"]
+    for name in tree:
+        field = resource.model._meta.get_field(name)
+        if field.many_to_one and name not in needed:
+            needed.append(name)
+    return needed
+
+
+def attach(rows, resource, tree, selected, path=()):
+    """Resolve each include with one query per relation level, whatever the row count."""
+    ids = [row["id"] for row in rows]
+    for name, subtree in tree.items():
+        field = resource.model._meta.get_field(name)
+        target = BY_MODEL[field.related_model]
+        subpath = path + (name,)
+        needed = columns(target, subtree, selected, subpath)
+        manager = target.model._default_manager.order_by(*(target.model._meta.ordering or ["pk"]))
+
+        if field.many_to_one:
+            related = {row["id"]: row for row in manager.filter(pk__in={row[name] for row in rows} - {None}).values(*needed)}
+            attach(list(related.values()), target, subtree, selected, subpath)
+            for row in rows:
+                row[name] = related.get(row[name])
+            continue
+
+        # Reverse FK and M2M alike: join back to the parent and read its id
+        # alongside each child, one query for the whole level.
+        back = field.related_query_name() if field.concrete else field.field.name
+        children = list(manager.values(*needed, _parent=F(back)).filter(_parent__in=ids))
+        groups = defaultdict(list)
+        for child in children:
+            groups[child.pop("_parent")].append(child)
+        attach(children, target, subtree, selected, subpath)
+        for row in rows:
+            row[name] = groups.get(row["id"], [])
+
+
+class ApiView(View):
+    use_replica = True
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            self.resource = RESOURCES.get(kwargs.pop("resource"))
+            if self.resource is None:
+                raise ApiError("Unknown resource.", status=404)
+            if self.resource.login_required and not request.user.is_authenticated:
+                raise ApiError("Authentication required.", status=403)
+            self.tree = parse_includes(request.GET.get("include", ""), self.resource)
+            self.selected = parse_fields(request.GET.get("fields", ""), self.resource, self.tree)
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+
+
+class ApiListView(ApiView):
+    """
+    GET /api/<resource>/?q=&meta_key=&meta_val=&fields=&include=&cursor=&limit=
+
+    Filters and orders exactly like the HTML list, pages by keyset cursor and
+    reads rows with values(), so no model instances are built.
+    """
+
+    def get(self, request):
+        view = self.resource.list_view()
+        view.setup(request)
+        queryset = view.get_queryset().prefetch_related(None)
+        ordering = [f.lstrip("-") for f in queryset.query.order_by]
+
+        needed = columns(self.resource, self.tree, self.selected, ())
+        extra = [f for f in ordering + ["pk"] if f not in needed]
+        try:
+            limit = min(int(request.GET.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            raise ApiError("limit must be an integer.")
+        if limit < 1:
+            raise ApiError("limit must be positive.")
+        paginator = KeysetPaginator(queryset.values(*needed, *extra), limit, queryset.query.order_by)
+        try:
+            page = paginator.page(request.GET.get("cursor") or None)
+        except InvalidCursor:
+            raise ApiError("Invalid cursor.")
+
+        rows = list(page)
+        for row in rows:
+            for name in extra:
+                row.pop(name, None)
+        attach(rows, self.resource, self.tree, self.selected)
+        return JsonResponse({
+            "results": rows,
+            "next": self.page_url(page.next_cursor),
+            "previous": self.page_url(page.previous_cursor),
+        })
+
+    def page_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params["cursor"] = cursor
+        return self.request.build_absolute_uri(f"{self.request.path}?{params.urlencode()}")
+
+
+
+class ApiDetailView(ApiView):
+    def get(self, request, pk):
+        needed = columns(self.resource, self.tree, self.selected, ())
+        rows = list(self.resource.model._default_manager.filter(pk=pk).values(*needed))
+        if not rows:
+            return JsonResponse({"error": "Not found."}, status=404)
+        attach(rows, self.resource, self.tree, self.selected)
+        return JsonResponse(rows[0])
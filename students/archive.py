@@ -0,0 +1,109 @@
+from collections import Counter, defaultdict
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import caching, stats
+from .deletion import delete_enrollments
+from .models import ArchivedEnrollment, Course, Enrollment, Metadata, Student
+from .utils import chunks
+
+
+# Per database vendor: a scalar subquery folding one enrollment's metadata
+# links into a JSON array of [key, value] pairs. {links} joins the link
+# table as t to the metadata table as m for the outer enrollment e.
+PAIRS_SQL = {
+    "sqlite": "(SELECT json_group_array(json_array(key, value)) FROM (SELECT m.key, m.value {links} ORDER BY m.key, m.id))",
+    "postgresql": "(SELECT COALESCE(jsonb_agg(jsonb_build_array(m.key, m.value) ORDER BY m.key, m.id), '[]'::jsonb) {links})",
+}
+
+
+def _copy(pks, term, using):
+    """
+    Copy enrollments into the archive with one INSERT ... SELECT, their
+    metadata links folded into JSON by the database, so no row goes through
+    Python. Other databases fall back to _copy_rows().
+    """
+    connection = connections[using]
+    pairs_sql = PAIRS_SQL.get(connection.vendor)
+    if pairs_sql is None:
+        return _copy_rows(pks, term, using)
+    qn = connection.ops.quote_name
+    through = Enrollment.metadata.through._meta
+    links = (
+        f"FROM {qn(through.db_table)} t JOIN {qn(Metadata._meta.db_table)} m ON m.id = t.metadata_id "
+        "WHERE t.enrollment_id = e.id"
+    )
+    placeholders = ", ".join(["%s"] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(ArchivedEnrollment._meta.db_table)} "
+            "(id, term_id, student_id, course_id, exam_score, grade, metadata) "
+            f"SELECT e.id, %s, e.student_id, e.course_id, e.exam_score, e.grade, {pairs_sql.format(links=links)} "
+            f"FROM {qn(Enrollment._meta.db_table)} e WHERE e.id IN ({placeholders})",
+            [term.pk, *pks],
+        )
+
+
+def _copy_rows(pks, term, using):
+    """_copy() through the ORM: the pairs are grouped in Python per batch."""
+    pairs = defaultdict(list)
+    links = Enrollment.metadata.through.objects.using(using).filter(enrollment_id__in=pks)
+    for enrollment_id, key, value in links.order_by("metadata__key", "metadata_id").values_list("enrollment_id", "metadata__key", "metadata__value"):
+        pairs[enrollment_id].append([key, value])
+    rows = Enrollment.objects.using(using).filter(pk__in=pks).values_list("pk", "student_id", "course_id", "exam_score", "grade")
+    ArchivedEnrollment.objects.using(using).bulk_create(
+        ArchivedEnrollment(id=pk, term=term, student_id=student_id, course_id=course_id, exam_score=exam_score, grade=grade, metadata=pairs[pk])
+        for pk, student_id, course_id, exam_score, grade in rows
+    )
+
+
+def archive_term(term, batch_size=5000, using="default", progress=None):
+    """
+    Move a term's enrollments into ArchivedEnrollment, batch_size at a time,
+    each batch copied and deleted in one short transaction. Enrollments
+    added to the term later are picked up by running it again. The
+    statistics of the affected courses are rebuilt from what remains;
+    student aggregates already include archived enrollments and are left
+    alone. Returns (archived, {model label: rows deleted}).
+    """
+    enrollments = Enrollment.objects.using(using).filter(term=term)
+    total = enrollments.count()
+    archived, counts = 0, Counter()
+    students, courses = set(), set()
+    last = 0
+    # Paged by pk rather than streamed, as each batch is deleted in between.
+    while batch := list(enrollments.filter(pk__gt=last).order_by("pk").values_list("pk", "student_id", "course_id")[:batch_size]):
+        last = batch[-1][0]
+        pks = [row[0] for row in batch]
+        with transaction.atomic(using=using):
+            _copy(pks, term, using)
+            delete_enrollments(pks, counts, using)
+        archived += len(batch)
+        students.update(row[1] for row in batch)
+        courses.update(row[2] for row in batch)
+        if progress:
+            progress(archived, total)
+
+    now = timezone.now()
+    for model, pks in ((Student, students), (Course, courses)):
+        for chunk in chunks(sorted(pks), batch_size):
+            model.objects.using(using).filter(pk__in=chunk).update(updated_at=now)
+    stats.recompute(courses, using=using)
+    term.archived_at = now
+    term.save(using=using, update_fields=["archived_at"])
+    caching.bump(Student, Course, Enrollment, using=using)
+    return archived, dict(counts)
+
+
+def history(student, using="default"):
+    """A student's live and archived enrollments in one list, newest term first."""
+    live = list(student.enrollments.all())
+    archived = list(ArchivedEnrollment.objects.using(using).filter(student=student).select_related("course", "term"))
+    return sorted(live + archived, key=history_order)
+
+
+def history_order(enrollment):
+    term = enrollment.term
+    # Enrollments without a term sort before every term.
+    return (term is not None, -term.starts_on.toordinal() if term else 0, enrollment.course.course_code)
@@ -0,0 +1,183 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import aprefetch_related_objects
+from django.http import Http404
+from django.utils.translation import gettext as _
+
+from . import archive, exports, ranking, stats, views
+from .conditional import aconditional, alast_modified, make_etag, updated_paths
+from .models import Course
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+class AsyncViewMixin:
+    """
+    Runs a read-only view as a coroutine under ASGI. The user is resolved up
+    front with auser(), so the mixins behind this one (LoginRequiredMixin,
+    the page cache, conditional GET) can read request.user without blocking.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        response = super().dispatch(request, *args, **kwargs)
+        # LoginRequiredMixin answers with a plain response, not a coroutine.
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+class AsyncListMixin(AsyncViewMixin):
+    """
+    SearchPaginateListView with the page, its count and exports read
+    through the async ORM. Rendering stays sync; the page is materialised
+    before the template sees it.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        fmt = request.GET.get("format")
+        if fmt in exports.FORMATS and self.export_fields:
+            if request.GET.get("background") and request.user.is_staff:
+                return await sync_to_async(self.export_in_background)(fmt)
+            return await self.aexport(fmt)
+        # Search may pick a database (and connect to it) while building the query.
+        self.object_list = await sync_to_async(self.get_queryset)()
+        self._paginated = await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        return self.render_to_response(self.get_context_data())
+
+    async def aexport(self, fmt):
+        queryset = await sync_to_async(self.get_export_queryset)()
+        filename = self.model._meta.verbose_name_plural.replace(" ", "_")
+        modified, rows = await alast_modified(queryset, updated_paths(self.model, self.export_fields))
+
+        async def respond():
+            return exports.aexport_response(queryset, self.export_fields, fmt, filename)
+
+        if modified is None:
+            return await respond()
+        etag = make_etag(type(self).__name__, self.request.GET.urlencode(), rows, modified.isoformat())
+        return await aconditional(self.request, etag, modified, respond)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if self.keyset_pagination or "cursor" in self.request.GET:
+            paginator = KeysetPaginator(queryset, page_size, queryset.query.order_by)
+            try:
+                page = await paginator.apage(self.request.GET.get("cursor") or None)
+            except InvalidCursor:
+                raise Http404("Invalid cursor.")
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(), allow_empty_first_page=self.get_allow_empty()
+        )
+        # Paginator.count is a cached_property; fill it so that page() and
+        # the template never run COUNT(*) synchronously.
+        paginator.count = await queryset.acount()
+        page_kwarg = self.page_kwarg
+        page = self.kwargs.get(page_kwarg) or self.request.GET.get(page_kwarg) or 1
+        try:
+            page_number = int(page)
+        except ValueError:
+            if page == "last":
+                page_number = paginator.num_pages
+            else:
+                raise Http404(_("Page is not “last”, nor can it be converted to an int."))
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(_("Invalid page (%(page_number)s): %(message)s") % {"page_number": page_number, "message": str(e)})
+        page.object_list = [obj async for obj in page.object_list]
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def paginate_queryset(self, queryset, page_size):
+        return self._paginated
+
+
+class AsyncDetailMixin(AsyncViewMixin):
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    async def aget_object(self):
+        try:
+            return await self.get_queryset().aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except self.model.DoesNotExist:
+            raise Http404(_("No %(verbose_name)s found matching the query") % {"verbose_name": self.model._meta.verbose_name})
+
+
+class MetadataListView(AsyncListMixin, views.MetadataListView):
+    pass
+
+
+class StudentListView(AsyncListMixin, views.StudentListView):
+    pass
+
+
+class CourseListView(AsyncListMixin, views.CourseListView):
+    pass
+
+
+class InstructorListView(AsyncListMixin, views.InstructorListView):
+    pass
+
+
+class EnrollmentListView(AsyncListMixin, views.EnrollmentListView):
+    pass
+
+
+class StudentDetailView(AsyncDetailMixin, views.StudentDetailView):
+    async def aget_object(self):
+        student = await super().aget_object()
+        self.standing = await sync_to_async(ranking.standing)(student)
+        if self.show_history():
+            self.history = await sync_to_async(archive.history)(student)
+        return student
+
+    def get_standing(self):
+        return self.standing
+
+    def get_history(self):
+        return self.history
+
+
+class CourseDetailView(AsyncDetailMixin, views.CourseDetailView):
+    """
+    Loads the course, then its roster, its metadata, its top scores and its
+    stats as four concurrent awaits instead of one prefetch chain.
+    """
+
+    async def aget_object(self):
+        try:
+            course = await Course.objects.select_related("stats").aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except Course.DoesNotExist:
+            raise Http404(_("No %(verbose_name)s found matching the query") % {"verbose_name": Course._meta.verbose_name})
+        results = await asyncio.gather(
+            aprefetch_related_objects([course], self.roster()),
+            aprefetch_related_objects([course], "metadata"),
+            sync_to_async(ranking.top)(self.top_size, course=course),
+            sync_to_async(stats.get_stats)(course),
+        )
+        self.top, self.stats = results[-2:]
+        return course
+
+    def get_context_data(self, **kwargs):
+        # Skip CourseDetailView's sync lookups; they were loaded above.
+        context = super(views.CourseDetailView, self).get_context_data(**kwargs)
+        context["stats"] = self.stats
+        context["top"] = self.top
+        return context
+
+
+class InstructorDetailView(AsyncDetailMixin, views.InstructorDetailView):
+    pass
+
+
+class EnrollmentDetailView(AsyncDetailMixin, views.EnrollmentDetailView):
+    async def aget_object(self):
+        enrollment = await super().aget_object()
+        self.standing = await sync_to_async(ranking.course_standing)(enrollment)
+        return enrollment
+
+    def get_standing(self):
+        return self.standing
@@ -0,0 +1,191 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+
+# Query parameters that select what a cached page shows. Requests carrying
+# anything else (exports, unknown parameters) are never served from cache.
+PAGE_PARAMS = ("q", "meta_key", "meta_val", "sort", "page", "cursor", "bins", "points", "term", "history", "course")
+
+
+def get_cache():
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "default")]
+
+
+def generation_key(model):
+    return f"gen:{model._meta.label_lower}"
+
+
+def fresh_generation():
+    # Seeded from the clock so a counter that was evicted and re-created can
+    # never come back with a value an older cache entry was stored under.
+    return time.time_ns() // 1000
+
+
+def generations(models):
+    """Current generation of each model, fetched in one cache round trip."""
+    cache = get_cache()
+    keys = [generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, fresh_generation(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def agenerations(models):
+    cache = get_cache()
+    keys = [generation_key(model) for model in models]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, fresh_generation(), timeout=None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def _bump(models):
+    cache = get_cache()
+    for model in models:
+        try:
+            cache.incr(generation_key(model))
+        except ValueError:
+            cache.set(generation_key(model), fresh_generation(), timeout=None)
+
+
+def bump(*models, using="default"):
+    """
+    Invalidate every cached page built from these models. Bumped once now and
+    again on commit, so a page cached by a concurrent reader between the
+    write and the commit is not served afterwards.
+    """
+    _bump(models)
+    transaction.on_commit(lambda: _bump(models), using=using)
+
+
+class HitCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, view, outcome):
+        with self.lock:
+            self.counts[(view, outcome)] += 1
+
+    def snapshot(self):
+        """{view: (hits, misses)}"""
+        with self.lock:
+            views = sorted({view for view, _ in self.counts})
+            return {view: (self.counts[(view, "hit")], self.counts[(view, "miss")]) for view in views}
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+hits = HitCounter()
+
+
+def normalized_params(request):
+    """Sorted (name, value) pairs, or None if the request is not cacheable."""
+    params = []
+    for name in request.GET:
+        if name not in PAGE_PARAMS:
+            return None
+        value = request.GET.get(name, "").strip()
+        if value and not (name == "page" and value == "1"):
+            params.append((name, value))
+    return sorted(params)
+
+
+def page_key(view, params, models):
+    return _page_key(view, params, generations(models))
+
+
+async def apage_key(view, params, models):
+    return _page_key(view, params, await agenerations(models))
+
+
+def _page_key(view, params, gens):
+    parts = [
+        type(view).__name__,
+        urlencode(sorted(view.kwargs.items())),
+        urlencode(params),
+        ".".join(str(g) for g in gens),
+    ]
+    return "page:" + hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+class CachedPageMixin:
+    """
+    Serves anonymous GETs from the page cache. The key holds the view, its
+    URL kwargs, the normalised query parameters and the generation of every
+    model in cache_models, which the signal receivers bump on each write;
+    entries are never deleted, they simply stop being looked up.
+    """
+
+    cache_models = ()
+    cache_timeout = None
+
+    def cacheable(self, request):
+        return (
+            request.method in ("GET", "HEAD")
+            and not request.user.is_authenticated
+            # A page built inside an open transaction may show rows that are
+            # later rolled back.
+            and not transaction.get_connection().in_atomic_block
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch_cached(request, *args, **kwargs)
+        params = normalized_params(request) if self.cache_models and self.cacheable(request) else None
+        if params is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_key(self, params, self.cache_models)
+        response = get_cache().get(key)
+        if self.record_lookup(response) is not None:
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        return response if self.reads_replica() else self.store(key, response)
+
+    async def adispatch_cached(self, request, *args, **kwargs):
+        params = normalized_params(request) if self.cache_models and self.cacheable(request) else None
+        if params is None:
+            return await super().dispatch(request, *args, **kwargs)
+
+        key = await apage_key(self, params, self.cache_models)
+        response = await get_cache().aget(key)
+        if self.record_lookup(response) is not None:
+            return response
+        response = await super().dispatch(request, *args, **kwargs)
+        # The router may connect to the replica to see whether it is up.
+        return response if await sync_to_async(self.reads_replica)() else self.store(key, response)
+
+    def reads_replica(self):
+        # A replica may lag behind the write that moved the generation, so a
+        # page read from it could be cached under the new key while still
+        # showing the old rows. Such pages are served but never stored.
+        return router.db_for_read(self.cache_models[0]) != DEFAULT_DB_ALIAS
+
+    def record_lookup(self, response):
+        hits.add(type(self).__name__, "miss" if response is None else "hit")
+        return response
+
+    def store(self, key, response):
+        if response.status_code == 200 and not response.streaming:
+            timeout = self.cache_timeout or getattr(settings, "PAGE_CACHE_TIMEOUT", 600)
+            store = lambda r: get_cache().set(key, r, timeout)
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
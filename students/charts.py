@@ -0,0 +1,98 @@
+from django.db.models import Count, Q
+
+from .models import Course, Enrollment, Student
+
+GRADES = [grade for grade, _ in Enrollment.GRADE_CHOICES]
+SCORE_RANGE = 100
+DEFAULT_BINS = 10
+MAX_BINS = 50
+DEFAULT_POINTS = 50
+MAX_POINTS = 500
+
+
+def bounded(value, default, maximum):
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def bin_edges(bins):
+    width = SCORE_RANGE / bins
+    return [(round(i * width, 2), round((i + 1) * width, 2)) for i in range(bins)]
+
+
+def label(number):
+    return f"{number:g}"
+
+
+def course_series(course_id, bins=DEFAULT_BINS, using=None):
+    """
+    Score histogram and grade distribution of one course, counted by a
+    single aggregate over the course and its enrollments. Scores outside
+    0-100 fall into the first or last bin. Returns None if there is no
+    such course.
+    """
+    edges = bin_edges(bins)
+    annotations = {"courses": Count("pk", distinct=True), "scored": Count("enrollments__exam_score")}
+    for i, (lo, hi) in enumerate(edges):
+        lookup = Q()
+        if i:
+            lookup &= Q(enrollments__exam_score__gte=lo)
+        if i < bins - 1:
+            lookup &= Q(enrollments__exam_score__lt=hi)
+        annotations[f"bin_{i}"] = Count("enrollments", filter=lookup & Q(enrollments__exam_score__isnull=False))
+    for grade in GRADES:
+        annotations[f"grade_{grade}"] = Count("enrollments", filter=Q(enrollments__grade=grade))
+    row = Course.objects.using(using).filter(pk=course_id).aggregate(**annotations)
+    if not row["courses"]:
+        return None
+    return {
+        "histogram": {
+            "labels": [f"{label(lo)}-{label(hi)}" for lo, hi in edges],
+            "counts": [row[f"bin_{i}"] for i in range(bins)],
+        },
+        "grades": {"labels": GRADES, "counts": [row[f"grade_{grade}"] for grade in GRADES]},
+        "scored": row["scored"],
+    }
+
+
+def downsample(labels, values, points):
+    """
+    Average consecutive values into at most `points` buckets, labelled with
+    their first and last label, so a long series keeps its shape.
+    """
+    if len(values) <= points:
+        return labels, values
+    size = len(values) / points
+    sampled_labels, sampled_values = [], []
+    for i in range(points):
+        start, end = round(i * size), round((i + 1) * size)
+        present = [value for value in values[start:end] if value is not None]
+        sampled_labels.append(labels[start] if end - start == 1 else f"{labels[start]}-{labels[end - 1]}")
+        sampled_values.append(round(sum(present) / len(present), 2) if present else None)
+    return sampled_labels, sampled_values
+
+
+def student_series(student_id, points=DEFAULT_POINTS, using=None):
+    """
+    Exam score per course, by course code, and grade distribution of one
+    student, from one query over the student and its enrollments. Returns
+    None if there is no such student.
+    """
+    rows = list(
+        Student.objects.using(using).filter(pk=student_id)
+        .order_by("enrollments__course__course_code")
+        .values_list("enrollments__course__course_code", "enrollments__exam_score", "enrollments__grade")
+    )
+    if not rows:
+        return None
+    rows = [row for row in rows if row[0] is not None]
+    scores = [None if score is None else float(score) for _, score, _ in rows]
+    labels, scores = downsample([code for code, _, _ in rows], scores, points)
+    grades = [grade for _, _, grade in rows]
+    return {
+        "history": {"labels": labels, "scores": scores},
+        "grades": {"labels": GRADES, "counts": [grades.count(grade) for grade in GRADES]},
+        "enrollments": len(rows),
+    }
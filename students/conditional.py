@@ -0,0 +1,120 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import caching
+
+
+def last_modified(queryset, paths):
+    """
+    Latest updated_at across the queryset and the given relation paths, and
+    the number of rows, in one aggregate query. Returns (None, 0) when empty.
+    """
+    return _latest(queryset.order_by().aggregate(**_aggregates(paths)), paths)
+
+
+async def alast_modified(queryset, paths):
+    return _latest(await queryset.order_by().aaggregate(**_aggregates(paths)), paths)
+
+
+def _aggregates(paths):
+    return {"rows": Count("pk", distinct=True), **{f"m{i}": Max(path) for i, path in enumerate(paths)}}
+
+
+def _latest(row, paths):
+    stamps = [row[f"m{i}"] for i in range(len(paths)) if row[f"m{i}"] is not None]
+    return (max(stamps) if stamps else None), row["rows"]
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest())
+
+
+def conditional(request, etag, modified, render):
+    """
+    Return a 304 (or 412) if the request's validators still match, otherwise
+    call render() and stamp its response with ETag and Last-Modified (left
+    out when modified is None).
+    """
+    timestamp = int(modified.timestamp()) if modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    return _stamp(response, etag, timestamp)
+
+
+async def aconditional(request, etag, modified, render):
+    """conditional() for async views; render is a coroutine function."""
+    timestamp = int(modified.timestamp()) if modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await render()
+    return _stamp(response, etag, timestamp)
+
+
+def _stamp(response, etag, timestamp):
+    if response.status_code == 200 or response.status_code == 304:
+        response.headers.setdefault("ETag", etag)
+        if timestamp is not None:
+            response.headers.setdefault("Last-Modified", http_date(timestamp))
+    return response
+
+
+def updated_paths(model, fields):
+    """updated_at lookups for the model and every relation named in fields."""
+    paths = ["updated_at"]
+    for field in fields:
+        prefix = field.rpartition("__")[0]
+        path = f"{prefix}__updated_at" if prefix else "updated_at"
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+class ConditionalDetailMixin:
+    """
+    Answers conditional GETs on detail pages from a single aggregate over
+    updated_at before the object, its relations or the template are loaded.
+    modified_paths lists the updated_at lookups of everything the page shows.
+    """
+
+    modified_paths = ("updated_at",)
+    # Models the page also depends on beyond its own rows (e.g. a rank
+    # across all students). Their page cache generations go into the ETag;
+    # Last-Modified cannot follow them, so such pages are sent without it.
+    etag_models = ()
+    etag_generations = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch_conditional(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+        modified, _ = last_modified(self.modified_queryset(kwargs), self.modified_paths)
+        if modified is None:
+            return super().dispatch(request, *args, **kwargs)
+        if self.etag_models:
+            self.etag_generations = caching.generations(self.etag_models)
+        return conditional(request, self.etag(request, kwargs, modified), self.stamped_modified(modified), lambda: super(ConditionalDetailMixin, self).dispatch(request, *args, **kwargs))
+
+    async def adispatch_conditional(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await super().dispatch(request, *args, **kwargs)
+        modified, _ = await alast_modified(self.modified_queryset(kwargs), self.modified_paths)
+        if modified is None:
+            return await super().dispatch(request, *args, **kwargs)
+        if self.etag_models:
+            self.etag_generations = await caching.agenerations(self.etag_models)
+        return await aconditional(request, self.etag(request, kwargs, modified), self.stamped_modified(modified), lambda: super(ConditionalDetailMixin, self).dispatch(request, *args, **kwargs))
+
+    def modified_queryset(self, kwargs):
+        return self.model._default_manager.filter(pk=kwargs.get(self.pk_url_kwarg))
+
+    def stamped_modified(self, modified):
+        return None if self.etag_models else modified
+
+    def etag(self, request, kwargs, modified):
+        # The page shows different controls to each user.
+        return make_etag(type(self).__name__, kwargs, request.user.pk, modified.isoformat(), *self.etag_generations)
@@ -0,0 +1,267 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from . import caching, search, stats
+from .models import ArchivedEnrollment, Course, CourseStats, Enrollment, Instructor, Metadata, Student
+from .utils import chunks
+
+# Row counts of the named dataset sizes.
+SCALES = {
+    "tiny": {"students": 200, "courses": 20, "instructors": 10, "enrollments": 1_000},
+    "small": {"students": 10_000, "courses": 200, "instructors": 50, "enrollments": 50_000},
+    "medium": {"students": 100_000, "courses": 1_000, "instructors": 250, "enrollments": 1_000_000},
+    "large": {"students": 1_000_000, "courses": 5_000, "instructors": 1_000, "enrollments": 10_000_000},
+}
+
+FIRST_NAMES = [
+    "Aarav", "Aisha", "Amelia", "Ananya", "Ben", "Bikash", "Chen", "Chloe", "Daniel", "Diya", "Elena", "Ethan",
+    "Fatima", "Gabriel", "Hana", "Hari", "Isabel", "Ivan", "Jin", "Kavya", "Leo", "Lucia", "Maya", "Mohammed",
+    "Nadia", "Noah", "Olivia", "Omar", "Priya", "Rita", "Sami", "Sara", "Sofia", "Tenzin", "Uma", "Wei", "Yuki", "Zara",
+]
+LAST_NAMES = [
+    "Adhikari", "Ahmed", "Bhandari", "Brown", "Chen", "Da Silva", "Dubois", "Garcia", "Gurung", "Hansen", "Ito",
+    "Kim", "Kowalski", "Lama", "Lee", "Martin", "Müller", "Nguyen", "Okafor", "Pal", "Patel", "Rai", "Rossi",
+    "Sharma", "Shrestha", "Silva", "Smith", "Tamang", "Thapa", "Wang", "Williams", "Yadav",
+]
+SUBJECTS = [
+    ("MTH", "Mathematics"), ("PHY", "Physics"), ("CHM", "Chemistry"), ("BIO", "Biology"), ("CSC", "Computer Science"),
+    ("ENG", "English"), ("HIS", "History"), ("ECO", "Economics"), ("GEO", "Geography"), ("PSY", "Psychology"),
+    ("ART", "Art"), ("MUS", "Music"), ("PHL", "Philosophy"), ("STA", "Statistics"), ("SOC", "Sociology"),
+]
+TOPICS = ["Foundations", "Methods", "Theory", "Laboratory", "Seminar", "Applications", "Topics", "Workshop"]
+
+METADATA = {
+    "club": ["Chess", "Robotics", "Drama", "Debate", "Football", "Basketball", "Science", "Music", "Photography", "Coding"],
+    "hobby": ["Reading", "Hiking", "Painting", "Gaming", "Cooking", "Cycling", "Swimming", "Dancing", "Writing", "Gardening"],
+    "house": ["Red", "Blue", "Green", "Yellow"],
+    "scholarship": ["Merit", "Need-based", "Sports", "Arts", "None"],
+    "room": [f"{block}{number}" for block in "ABCD" for number in range(101, 121)],
+    "level": ["Introductory", "Intermediate", "Advanced", "Graduate"],
+    "term": ["Fall", "Spring", "Summer"],
+    "office": [f"Faculty {block}-{number}" for block in "ABC" for number in range(1, 21)],
+    "specialty": ["Algebra", "Optics", "Genetics", "Databases", "Poetry", "Modern History", "Macroeconomics", "Statistics"],
+    "attendance": [f"{percent}%" for percent in range(60, 101, 5)],
+    "status": ["Completed", "In progress", "Withdrawn", "Audit"],
+}
+# Metadata keys each model draws from; each applies to an object with
+# probability fanout / len(keys), so fanout is the mean links per object.
+METADATA_KEYS = {
+    Student: ["club", "hobby", "house", "scholarship"],
+    Course: ["room", "level", "term"],
+    Instructor: ["office", "specialty"],
+    Enrollment: ["attendance", "status"],
+}
+MODELS = [Metadata, Student, Course, Instructor, Enrollment]
+
+
+def zipf_weights(count, exponent=1.0):
+    """Cumulative weights of count items whose popularity falls off with rank."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def grade_for(score):
+    for grade, floor in (("A", 90), ("B", 80), ("C", 70), ("D", 60)):
+        if score >= floor:
+            return grade
+    return "F"
+
+
+def clear(using="default"):
+    """Delete every row the generator writes, children first, without loading objects or sending signals."""
+    connection = connections[using]
+    tables = []
+    for model in [Enrollment, Instructor, Course, Student]:
+        tables += [field.remote_field.through._meta.db_table for field in model._meta.local_many_to_many]
+    tables += [model._meta.db_table for model in [ArchivedEnrollment, Enrollment, CourseStats, Instructor, Course, Student, Metadata]]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)}")
+
+
+class DatasetGenerator:
+    """
+    Writes a deterministic synthetic dataset: the same seed and sizes give
+    the same rows and ids on every run. Each model draws from its own random
+    stream, so changing one size leaves the other tables unchanged.
+
+    Rows are written with bulk_create, which skips the model signals; the
+    search index, course and student statistics and page cache are rebuilt
+    at the end.
+    """
+
+    def __init__(self, students, courses, instructors, enrollments, fanout=1.5, seed=0, batch_size=5000,
+                 using="default", progress=None):
+        if enrollments > students * courses:
+            raise ValueError(f"{enrollments} enrollments do not fit {students} students x {courses} courses.")
+        if enrollments and not courses:
+            raise ValueError("Enrollments need at least one course.")
+        self.sizes = {"students": students, "courses": courses, "instructors": instructors, "enrollments": enrollments}
+        self.fanout = fanout
+        self.seed = seed
+        self.batch_size = batch_size
+        self.using = using
+        self.progress = progress or (lambda message: None)
+        self.metadata_ids = {}
+
+    def rng(self, name):
+        return random.Random(f"{self.seed}:{name}")
+
+    def run(self):
+        for model in MODELS:
+            if model._default_manager.using(self.using).exists():
+                raise ValueError(f"{model._meta.verbose_name_plural} already has rows; clear the database first.")
+        self.step("metadata", lambda: self.write(Metadata, ((obj, []) for obj in self.metadata())))
+        self.step("students", lambda: self.write(Student, self.students()))
+        self.step("courses", lambda: self.write(Course, self.courses()))
+        self.step("instructors", lambda: self.write(Instructor, self.instructors()))
+        self.step("enrollments", lambda: self.write(Enrollment, self.enrollments()))
+        self.step("instructor courses", self.teaching)
+        self.reset_sequences()
+        self.step("search index", lambda: sum(search.rebuild(model, using=self.using) for model in MODELS))
+        self.step("course statistics", lambda: stats.recompute(using=self.using))
+        self.step("student statistics", lambda: stats.recompute_students(using=self.using))
+        caching.bump(*MODELS, CourseStats, using=self.using)
+        return {name: model._default_manager.using(self.using).count() for name, model in zip(
+            ["metadata", "students", "courses", "instructors", "enrollments"], MODELS)}
+
+    def step(self, name, work):
+        start = time.perf_counter()
+        count = work()
+        self.progress(f"{name}: {count} rows in {time.perf_counter() - start:.1f}s")
+
+    def write(self, model, items):
+        """bulk_create (object, metadata ids) pairs and their metadata links, one transaction per batch."""
+        manager = model._default_manager.using(self.using)
+        through = model.metadata.through if model is not Metadata else None
+        fk = f"{model._meta.model_name}_id"
+        count = 0
+        for batch in chunks(items, self.batch_size):
+            with transaction.atomic(using=self.using):
+                manager.bulk_create([obj for obj, _ in batch])
+                if through is not None:
+                    links = [through(**{fk: obj.pk, "metadata_id": pk}) for obj, pks in batch for pk in pks]
+                    through.objects.using(self.using).bulk_create(links, batch_size=self.batch_size)
+            count += len(batch)
+        return count
+
+    def reset_sequences(self):
+        # Rows were written with explicit ids; move the sequences past them.
+        connection = connections[self.using]
+        models = MODELS + [field.remote_field.through for model in MODELS for field in model._meta.local_many_to_many]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def metadata(self):
+        pk = 0
+        for key, values in METADATA.items():
+            weights = zipf_weights(len(values))
+            self.metadata_ids[key] = (weights, [])
+            for value in values:
+                pk += 1
+                self.metadata_ids[key][1].append(pk)
+                yield Metadata(pk=pk, key=key, value=value)
+
+    def pick_metadata(self, rng, model):
+        keys = METADATA_KEYS[model]
+        chance = min(1.0, self.fanout / len(keys))
+        picked = []
+        for key in keys:
+            if rng.random() < chance:
+                weights, ids = self.metadata_ids[key]
+                picked.append(rng.choices(ids, cum_weights=weights)[0])
+        return picked
+
+    def students(self):
+        rng = self.rng("students")
+        for pk in range(1, self.sizes["students"] + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f"{first}.{last}.{pk}@example.edu".lower().replace(" ", "")
+            dob = date(1995, 1, 1) + timedelta(days=rng.randrange(3650))
+            yield Student(pk=pk, first_name=first, last_name=last, email=email, dob=dob), self.pick_metadata(rng, Student)
+
+    def courses(self):
+        rng = self.rng("courses")
+        for pk in range(1, self.sizes["courses"] + 1):
+            code, subject = SUBJECTS[pk % len(SUBJECTS)]
+            topic = rng.choice(TOPICS)
+            course = Course(
+                pk=pk, course_code=f"{code}{pk:05}", course_name=f"{subject} {topic} {100 * rng.randint(1, 4)}",
+                description=f"{topic} in {subject.lower()} for students of every background.",
+            )
+            yield course, self.pick_metadata(rng, Course)
+
+    def instructors(self):
+        rng = self.rng("instructors")
+        for pk in range(1, self.sizes["instructors"] + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f"{first}.{last}.{pk}@faculty.example.edu".lower().replace(" ", "")
+            yield Instructor(pk=pk, first_name=first, last_name=last, email=email), self.pick_metadata(rng, Instructor)
+
+    def teaching(self):
+        """Every course gets one instructor in turn, and a second one for about a third of them."""
+        instructors = self.sizes["instructors"]
+        if not instructors:
+            return 0
+        rng = self.rng("teaching")
+        through = Instructor.courses.through
+
+        def links():
+            for course in range(1, self.sizes["courses"] + 1):
+                first = course % instructors + 1
+                yield through(instructor_id=first, course_id=course)
+                second = rng.randint(1, instructors)
+                if second != first and rng.random() < 0.3:
+                    yield through(instructor_id=second, course_id=course)
+
+        count = 0
+        for batch in chunks(links(), self.batch_size):
+            through.objects.using(self.using).bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def enrollment_counts(self, rng):
+        """Enrollments per student: varied, but summing to exactly the requested total."""
+        students, courses = self.sizes["students"], self.sizes["courses"]
+        base, extra = divmod(self.sizes["enrollments"], students) if students else (0, 0)
+        counts = [base + (pk <= extra) for pk in range(1, students + 1)]
+        for i in range(0, students - 1, 2):
+            # Move some enrollments from one student to the next; the pair keeps its total.
+            shift = rng.randint(0, min(counts[i + 1], courses - counts[i]))
+            counts[i] += shift
+            counts[i + 1] -= shift
+        return counts
+
+    def enrollments(self):
+        rng = self.rng("enrollments")
+        course_ids = list(range(1, self.sizes["courses"] + 1))
+        # Popular courses are spread over the id range rather than clustered at the start.
+        popularity = course_ids[:]
+        rng.shuffle(popularity)
+        weights = zipf_weights(len(popularity), exponent=0.8)
+        pk = 0
+        for student, count in enumerate(self.enrollment_counts(rng), start=1):
+            if count * 4 > len(course_ids):
+                chosen = rng.sample(course_ids, count)
+            else:
+                chosen = list(dict.fromkeys(rng.choices(popularity, cum_weights=weights, k=count * 2)))[:count]
+                while len(chosen) < count:
+                    course = rng.choice(course_ids)
+                    if course not in chosen:
+                        chosen.append(course)
+            for course in chosen:
+                pk += 1
+                score, grade = None, ""
+                if rng.random() >= 0.1:
+                    value = round(min(100.0, max(0.0, rng.gauss(72, 14))), 2)
+                    score, grade = Decimal(f"{value:.2f}"), grade_for(value)
+                enrollment = Enrollment(pk=pk, student_id=student, course_id=course, exam_score=score, grade=grade)
+                yield enrollment, self.pick_metadata(rng, Enrollment)
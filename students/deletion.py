@@ -0,0 +1,105 @@
+from collections import Counter
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import caching, search, stats
+from .models import ArchivedEnrollment, Course, CourseStats, Enrollment, Instructor, Student
+from .utils import chunks
+
+# The column of Enrollment that points at each deletable parent.
+PARENTS = {Student: "student_id", Course: "course_id"}
+
+# Every model whose cached pages a bulk delete can change.
+AFFECTED = (Student, Course, Enrollment, Instructor, CourseStats)
+
+
+def _delete(model, field, values, counts, using):
+    # One DELETE ... WHERE field IN (...) statement: no rows are loaded and no
+    # signals sent, so callers bump the page cache and touch parents themselves.
+    if not values:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    column = model._meta.get_field(field).column
+    placeholders = ", ".join(["%s"] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} IN ({placeholders})", list(values))
+        count = cursor.rowcount
+    if count > 0:
+        counts[model._meta.label] += count
+
+
+def delete_enrollments(pks, counts, using):
+    _delete(Enrollment.metadata.through, "enrollment_id", pks, counts, using)
+    _delete(Enrollment, "id", pks, counts, using)
+    search.remove_objects(Enrollment, pks, using)
+
+
+def bulk_delete(model, pks, batch_size=500, using="default", progress=None):
+    """
+    Delete students or courses and everything that cascades from them with
+    set-based DELETEs, instead of the collector loading every enrollment
+    and metadata link. Enrollments go first, batch_size at a time in their
+    own transactions, so the write lock is only held briefly; each batch of
+    parents then goes in one more transaction that also takes enrollments
+    added in the meantime and bumps the page cache. Statistics, timestamps
+    and search documents of the surviving rows are refreshed at the end, as
+    the signals would have.
+    Returns (total, {model label: count}) like QuerySet.delete().
+    """
+    column = PARENTS[model]
+    pks = sorted(set(pks))
+    counts = Counter()
+    students, courses, instructors = set(), set(), set()
+    enrollments = Enrollment.objects.using(using)
+
+    def take_enrollments(parent_pks):
+        rows = list(enrollments.filter(**{f"{column}__in": parent_pks}).values_list("pk", "student_id", "course_id"))
+        students.update(student_id for _, student_id, _ in rows)
+        courses.update(course_id for _, _, course_id in rows)
+        return [pk for pk, _, _ in rows]
+
+    for done, chunk in enumerate(chunks(pks, batch_size)):
+        for batch in chunks(take_enrollments(chunk), batch_size):
+            with transaction.atomic(using=using):
+                delete_enrollments(batch, counts, using)
+        with transaction.atomic(using=using):
+            late = take_enrollments(chunk)
+            if late:
+                delete_enrollments(late, counts, using)
+            if model is Course:
+                # Archived enrollments count towards their students' aggregates.
+                archived = ArchivedEnrollment.objects.using(using).filter(course_id__in=chunk)
+                students.update(archived.values_list("student_id", flat=True))
+            _delete(ArchivedEnrollment, column, chunk, counts, using)
+            for field in model._meta.local_many_to_many:
+                _delete(field.remote_field.through, f"{field.m2m_field_name()}_id", chunk, counts, using)
+            if model is Course:
+                links = Instructor.courses.through.objects.using(using).filter(course_id__in=chunk)
+                instructors.update(links.values_list("instructor_id", flat=True))
+                _delete(Instructor.courses.through, "course_id", chunk, counts, using)
+                _delete(CourseStats, "course_id", chunk, counts, using)
+            _delete(model, model._meta.pk.attname, chunk, counts, using)
+            search.remove_objects(model, chunk, using)
+            # Bumped with each batch, so pages stop showing the deleted rows
+            # as soon as it commits, even if a later batch fails.
+            caching.bump(*AFFECTED, using=using)
+        if progress:
+            progress(min((done + 1) * batch_size, len(pks)), len(pks))
+
+    now = timezone.now()
+    if model is Student:
+        for batch in chunks(sorted(courses), batch_size):
+            Course.objects.using(using).filter(pk__in=batch).update(updated_at=now)
+        stats.recompute(courses, batch_size=batch_size, using=using)
+    else:
+        for batch in chunks(sorted(students), batch_size):
+            Student.objects.using(using).filter(pk__in=batch).update(updated_at=now)
+        stats.recompute_students(students, batch_size=batch_size, using=using)
+        for batch in chunks(sorted(instructors), batch_size):
+            Instructor.objects.using(using).filter(pk__in=batch).update(updated_at=now)
+            # Instructor documents embed their course names.
+            search.index_objects(Instructor, batch, using)
+    caching.bump(*AFFECTED, using=using)
+    return sum(counts.values()), dict(counts)
@@ -0,0 +1,223 @@
+from collections import namedtuple
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import combinations, groupby
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import caching, search, stats
+from .models import ArchivedEnrollment, Course, Enrollment, Student
+from .phonetic import soundex
+from .utils import chunks
+
+Row = namedtuple("Row", "pk first_name last_name email dob first_name_key last_name_key")
+Pair = namedtuple("Pair", "score first second")
+
+ROW_FIELDS = list(Row._fields)
+
+# Blocking keys: only students sharing one of these field pairs are ever
+# compared, so a typo in one name or the date of birth still meets the
+# other two. Each pair is indexed on Student.
+BLOCKS = [
+    ("last_name_key", "dob"),
+    ("first_name_key", "dob"),
+    ("first_name_key", "last_name_key"),
+]
+# Blocks larger than this are common names on a common key; comparing them
+# pairwise costs more than it finds, so they are skipped and counted.
+MAX_BLOCK = 100
+THRESHOLD = 0.8
+
+WEIGHTS = {"first_name": 0.3, "last_name": 0.35, "dob": 0.25, "email": 0.1}
+
+
+@lru_cache(maxsize=65536)
+def similarity(a, b):
+    a, b = a.strip().lower(), b.strip().lower()
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def dob_similarity(a, b):
+    if a == b:
+        return 1.0
+    same = (a.year == b.year) + (a.month == b.month) + (a.day == b.day)
+    swapped = a.year == b.year and a.month == b.day and a.day == b.month
+    return 0.5 if same == 2 or swapped else 0.0
+
+
+def score(a, b, floor=0.0):
+    """
+    How alike two students are, from 0 to 1: weighted name, date of birth
+    and email similarity. Emails are only compared when they could lift the
+    score to `floor`; below it the result is just known to be lower.
+    """
+    value = (
+        WEIGHTS["first_name"] * similarity(a.first_name, b.first_name)
+        + WEIGHTS["last_name"] * similarity(a.last_name, b.last_name)
+        + WEIGHTS["dob"] * dob_similarity(a.dob, b.dob)
+    )
+    if value + WEIGHTS["email"] >= floor:
+        value += WEIGHTS["email"] * SequenceMatcher(None, a.email.partition("@")[0].lower(), b.email.partition("@")[0].lower()).ratio()
+    return round(value, 3)
+
+
+def find_candidates(threshold=THRESHOLD, max_block=MAX_BLOCK, using="default"):
+    """
+    Scored candidate pairs over the whole student table, best first.
+    Students are streamed once per blocking key in index order and only
+    compared within a block. A pair that also shares an earlier blocking key
+    was scored there already and is passed over, so nothing is remembered
+    about compared pairs. Returns (pairs, skipped oversized blocks).
+    """
+    pairs, skipped = [], 0
+    # Keys of the oversized blocks of each blocking, whose pairs were not
+    # compared there; at most one per max_block students.
+    oversized = [set() for _ in BLOCKS]
+    students = Student.objects.using(using)
+    for i, fields in enumerate(BLOCKS):
+        earlier = [(attrgetter(*BLOCKS[j]), oversized[j]) for j in range(i)]
+        rows = students.order_by(*fields, "pk").values_list(*ROW_FIELDS).iterator(chunk_size=5000)
+        for key, block in groupby(map(Row._make, rows), key=attrgetter(*fields)):
+            if "" in key:
+                continue
+            block = list(block)
+            if len(block) > max_block:
+                skipped += 1
+                oversized[i].add(key)
+                continue
+            for a, b in combinations(block, 2):
+                if any(_compared(a, b, get_key, skipped_keys) for get_key, skipped_keys in earlier):
+                    continue
+                value = score(a, b, threshold)
+                if value >= threshold:
+                    pairs.append(Pair(value, a, b))
+    pairs.sort(key=lambda pair: (-pair.score, pair.first.pk, pair.second.pk))
+    return pairs, skipped
+
+
+def _compared(a, b, get_key, skipped_keys):
+    # Whether an earlier blocking put a and b in the same compared block.
+    key = get_key(a)
+    return key == get_key(b) and "" not in key and key not in skipped_keys
+
+
+def candidates_for(first_name, last_name, dob, email="", exclude=None, threshold=THRESHOLD, max_block=MAX_BLOCK, using="default"):
+    """Existing students that look like the given one, best first, from one query over the blocking indexes."""
+    new = Row(exclude, first_name, last_name, email, dob, soundex(first_name), soundex(last_name))
+    lookup = Q()
+    for fields in BLOCKS:
+        values = {field: getattr(new, field) for field in fields}
+        if "" not in values.values():
+            lookup |= Q(**values)
+    if not lookup:
+        return []
+    rows = Student.objects.using(using).filter(lookup).exclude(pk=exclude).order_by("pk").values_list(*ROW_FIELDS)
+    pairs = [Pair(score(new, row, threshold), new, row) for row in map(Row._make, rows[:max_block])]
+    return sorted((pair for pair in pairs if pair.score >= threshold), key=lambda pair: (-pair.score, pair.second.pk))
+
+
+def clusters(pairs):
+    """Group linked pairs into (kept pk, [duplicate pks]), keeping the oldest (lowest pk) student."""
+    parent = {}
+
+    def find(pk):
+        parent.setdefault(pk, pk)
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    for pair in pairs:
+        a, b = find(pair.first.pk), find(pair.second.pk)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    groups = {}
+    for pk in sorted(parent):
+        groups.setdefault(find(pk), []).append(pk)
+    return [(keep, others) for keep, (_, *others) in sorted(groups.items())]
+
+
+def merge_students(keep, others, batch_size=1000, using="default"):
+    """
+    Fold the students `others` into `keep` and delete them. Their
+    enrollments, archived ones included, are re-pointed at keep, except in
+    courses keep already takes that term (unique_student_course_term):
+    there the kept enrollment gets any missing score or grade and the
+    metadata of the other, which is deleted. Metadata links are copied
+    over. Returns (moved, merged) enrollment counts.
+    """
+    others = sorted(set(others) - {keep})
+    if not others:
+        return 0, 0
+    now = timezone.now()
+    enrollments = Enrollment.objects.using(using)
+    with transaction.atomic(using=using):
+        taken = {(course_id, term_id): pk for pk, course_id, term_id in enrollments.filter(student_id=keep).values_list("pk", "course_id", "term_id")}
+        moved, clashes, course_ids = [], [], set()
+        for pk, course_id, term_id in enrollments.filter(student_id__in=others).order_by("student_id", "pk").values_list("pk", "course_id", "term_id"):
+            if (course_id, term_id) in taken:
+                clashes.append((taken[course_id, term_id], pk))
+            else:
+                taken[course_id, term_id] = pk
+                moved.append(pk)
+                course_ids.add(course_id)
+
+        for batch in chunks(moved, batch_size):
+            enrollments.filter(pk__in=batch).update(student_id=keep, updated_at=now)
+            search.index_objects(Enrollment, batch, using)
+        for batch in chunks(sorted(course_ids), batch_size):
+            Course.objects.using(using).filter(pk__in=batch).update(updated_at=now)
+
+        # Rare, so merged one at a time through the model and its signals.
+        for kept_pk, dup_pk in clashes:
+            kept, dup = enrollments.get(pk=kept_pk), enrollments.get(pk=dup_pk)
+            changed = []
+            if kept.exam_score is None and dup.exam_score is not None:
+                kept.exam_score = dup.exam_score
+                changed.append("exam_score")
+            if not kept.grade and dup.grade:
+                kept.grade = dup.grade
+                changed.append("grade")
+            if changed:
+                kept.save(update_fields=[*changed, "updated_at"])
+            metadata = list(dup.metadata.all())
+            if metadata:
+                kept.metadata.add(*metadata)
+            dup.delete()
+
+        ArchivedEnrollment.objects.using(using).filter(student_id__in=others).update(student_id=keep)
+        through = Student.metadata.through
+        metadata_ids = set(through.objects.using(using).filter(student_id__in=others).values_list("metadata_id", flat=True))
+        through.objects.using(using).bulk_create(
+            [through(student_id=keep, metadata_id=metadata_id) for metadata_id in metadata_ids],
+            ignore_conflicts=True,
+        )
+        Student.objects.using(using).filter(pk__in=others).delete()
+        Student.objects.using(using).filter(pk=keep).update(updated_at=now)
+        stats.recompute_students([keep], using=using)
+        caching.bump(Student, Enrollment, Course, using=using)
+    return len(moved), len(clashes)
+
+
+def fill_name_keys(student_model=Student, batch_size=5000, using="default"):
+    """
+    Set the soundex name keys of every student, one UPDATE per distinct key
+    pair in each batch. Takes the model as an argument so migrations can
+    pass their historical version. Returns the row count.
+    """
+    students = student_model._default_manager.using(using)
+    count, last = 0, 0
+    # Paged by pk rather than streamed, as the table is written in between.
+    while batch := list(students.filter(pk__gt=last).order_by("pk").values_list("pk", "first_name", "last_name")[:batch_size]):
+        last = batch[-1][0]
+        by_keys = {}
+        for pk, first_name, last_name in batch:
+            by_keys.setdefault((soundex(first_name), soundex(last_name)), []).append(pk)
+        for (first_name_key, last_name_key), pks in by_keys.items():
+            count += students.filter(pk__in=pks).update(first_name_key=first_name_key, last_name_key=last_name_key)
+    return count
@@ -0,0 +1,75 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    # csv.writer target that hands each formatted line straight back.
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows, header):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + "\n"
+
+
+async def acsv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    async for row in rows:
+        yield writer.writerow(row)
+
+
+async def ajsonl_lines(rows, header):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    async for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + "\n"
+
+
+def export_rows(queryset, fields, chunk_size=2000):
+    """Stream tuples straight from the cursor; no model instances are built."""
+    return queryset.prefetch_related(None).values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+async def aexport_rows(queryset, fields, chunk_size=2000):
+    # values() rather than values_list(): ValuesListIterable runs its query
+    # as soon as it is created, which aiterator() does outside a thread.
+    async for row in queryset.prefetch_related(None).values(*fields).aiterator(chunk_size=chunk_size):
+        yield tuple(row.values())
+
+
+def export_response(queryset, fields, fmt, filename):
+    lines = csv_lines if fmt == "csv" else jsonl_lines
+    return _attachment(lines(export_rows(queryset, fields), _header(fields)), fmt, filename)
+
+
+def aexport_response(queryset, fields, fmt, filename):
+    """export_response() streaming from an async iterator, for ASGI."""
+    lines = acsv_lines if fmt == "csv" else ajsonl_lines
+    return _attachment(lines(aexport_rows(queryset, fields), _header(fields)), fmt, filename)
+
+
+def _header(fields):
+    return [f.replace("__", "_") for f in fields]
+
+
+def _attachment(content, fmt, filename):
+    response = StreamingHttpResponse(content, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
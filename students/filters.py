@@ -0,0 +1,48 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.sql.datastructures import Join
+
+
+def relation_q(model, lookup, value):
+    """
+    Q for `lookup=value` on model. Lookups that cross a multi-valued relation
+    (M2M or reverse FK) become a correlated EXISTS subquery, so the outer
+    query never joins to the relation and never returns duplicate rows.
+    """
+    name, _, rest = lookup.partition("__")
+    if rest:
+        field = model._meta.get_field(name)
+        if field.many_to_many or field.one_to_many:
+            if field.concrete:
+                remote = field.related_query_name()
+            else:
+                remote = field.field.name
+            inner = field.related_model._default_manager.filter(**{remote: OuterRef("pk"), rest: value})
+            return Q(Exists(inner))
+    return Q(**{lookup: value})
+
+
+def metadata_q(model, key="", value=""):
+    # Key and value must match on the same metadata pair.
+    conditions = {}
+    if key:
+        conditions["key__icontains"] = key
+    if value:
+        conditions["value__icontains"] = value
+    if not conditions:
+        return Q()
+    try:
+        field = model._meta.get_field("metadata")
+    except FieldDoesNotExist:
+        # Metadata itself: filter on its own key and value.
+        return Q(**conditions)
+    inner = field.related_model._default_manager.filter(**{field.related_query_name(): OuterRef("pk")}, **conditions)
+    return Q(Exists(inner))
+
+
+def needs_distinct(queryset):
+    """True if the query joins a multi-valued relation and may repeat rows."""
+    for join in queryset.query.alias_map.values():
+        if isinstance(join, Join) and (join.join_field.many_to_many or join.join_field.one_to_many):
+            return True
+    return False
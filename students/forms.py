@@ -1,14 +1,19 @@
 from django import forms
-from .models import Student, Course, Instructor, Enrollment, Metadata
+from .models import Student, Course, Instructor, Enrollment, Metadata, Term
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from .duplicates import candidates_for
+from .widgets import AutocompleteSelect, AutocompleteSelectMultiple
 # Student Form
 class StudentForm(forms.ModelForm):
     metadata = forms.ModelMultipleChoiceField(
         queryset=Metadata.objects.all(),
         required=False,
-         widget=forms.CheckboxSelectMultiple
+        widget=AutocompleteSelectMultiple("metadata", attrs={"class": "form-select"})
     )
+    # Shown once a new student looks like an existing one, to save anyway.
+    not_duplicate = forms.BooleanField(required=False, widget=forms.HiddenInput, label="This is a different person")
+    check_duplicates = True
 
     class Meta:
         model = Student
@@ -21,12 +26,27 @@ class StudentForm(forms.ModelForm):
             raise ValidationError("Date of Birth cannot be in the future.")
         return dob
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.check_duplicates and self.instance.pk is None and not cleaned_data.get("not_duplicate"):
+            fields = [cleaned_data.get(name) for name in ("first_name", "last_name", "dob")]
+            if all(fields):
+                matches = candidates_for(*fields, email=cleaned_data.get("email") or "", max_block=5)
+                if matches:
+                    self.fields["not_duplicate"].widget = forms.CheckboxInput(attrs={"class": "form-check-input"})
+                    names = "; ".join(f"{m.second.first_name} {m.second.last_name} ({m.second.email}, born {m.second.dob})" for m in matches)
+                    raise ValidationError(
+                        f"This student may already exist: {names}. "
+                        "Tick \"This is a different person\" to save anyway."
+                    )
+        return cleaned_data
+
 # Course Form
 class CourseForm(forms.ModelForm):
     metadata = forms.ModelMultipleChoiceField(
         queryset=Metadata.objects.all(),
         required=False,
-         widget=forms.CheckboxSelectMultiple
+        widget=AutocompleteSelectMultiple("metadata", attrs={"class": "form-select"})
     )
 
     class Meta:
@@ -44,12 +64,12 @@ class InstructorForm(forms.ModelForm):
     metadata = forms.ModelMultipleChoiceField(
         queryset=Metadata.objects.all(),
         required=False,
-         widget=forms.CheckboxSelectMultiple
+        widget=AutocompleteSelectMultiple("metadata", attrs={"class": "form-select"})
     )
     courses = forms.ModelMultipleChoiceField(
         queryset=Course.objects.all(),
         required=False,
-         widget=forms.CheckboxSelectMultiple
+        widget=AutocompleteSelectMultiple("course", attrs={"class": "form-select"})
     )
 
     class Meta:
@@ -59,7 +79,6 @@ class InstructorForm(forms.ModelForm):
             "first_name": forms.TextInput(attrs={"class": "form-control"}),
             "last_name": forms.TextInput(attrs={"class": "form-control"}),
             "email": forms.EmailInput(attrs={"class": "form-control"}),
-            "courses": forms.SelectMultiple(attrs={"class": "form-select"}),
         }
 
 
@@ -68,19 +87,28 @@ class EnrollmentForm(forms.ModelForm):
     metadata = forms.ModelMultipleChoiceField(
         queryset=Metadata.objects.all(),
         required=False,
-         widget=forms.CheckboxSelectMultiple
+        widget=AutocompleteSelectMultiple("metadata", attrs={"class": "form-select"})
     )
 
     class Meta:
         model = Enrollment
-        fields = ["student", "course", "exam_score", "grade", "metadata"]
+        fields = ["student", "course", "term", "exam_score", "grade", "metadata"]
         widgets = {
-            "student": forms.Select(attrs={"class": "form-select form-select-lg mb-3"}),
-            "course": forms.Select(attrs={"class": "form-select form-select-lg mb-3"}),
+            "student": AutocompleteSelect("student", attrs={"class": "form-select form-select-lg mb-3"}),
+            "course": AutocompleteSelect("course", attrs={"class": "form-select form-select-lg mb-3"}),
+            "term": forms.Select(attrs={"class": "form-select"}),
             "exam_score": forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "placeholder": "Enter exam score"}),
             "grade": forms.Select(attrs={"class": "form-select"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if "term" in self.fields:
+            # Archived terms take no new enrollments.
+            self.fields["term"].queryset = Term.objects.filter(archived_at__isnull=True)
+            if self.instance.pk is None and "term" not in self.initial:
+                self.initial["term"] = Term.objects.current()
+
 
 # Metadata Form
 class MetadataForm(forms.ModelForm):
@@ -91,3 +119,21 @@ class MetadataForm(forms.ModelForm):
             "key": forms.TextInput(attrs={"class": "form-control"}),
             "value": forms.TextInput(attrs={"class": "form-control"}),
         }
+
+
+# Roster import upload Form
+class RosterImportForm(forms.Form):
+    kind = forms.ChoiceField(
+        choices=[("students", "Students"), ("enrollments", "Enrollments")],
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    file = forms.FileField(
+        help_text="CSV with a header row, or JSONL with one object per line.",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.jsonl,.ndjson"}),
+    )
+    background = forms.BooleanField(
+        required=False,
+        label="Run in the background",
+        help_text="Returns at once and imports with the job workers; follow it on the Jobs page.",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
@@ -0,0 +1,291 @@
+import csv
+import json
+
+from django.db import transaction
+
+from . import caching, interning, search, stats
+from .forms import EnrollmentForm, StudentForm
+from .models import Course, Enrollment, Metadata, Student, Term
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row_dict) from a CSV or JSONL text stream, one line at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {"_error": f"Invalid JSON: {e}"}
+            if not isinstance(row, dict):
+                row = {"_error": "Expected a JSON object."}
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def guess_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def parse_metadata(value):
+    """Accept {"key": "value"}, [["key", "value"]] or "key=value; key=value"."""
+    if not value:
+        return []
+    if isinstance(value, dict):
+        return [(str(k), str(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [(str(k), str(v)) for k, v in value]
+    pairs = []
+    for item in str(value).split(";"):
+        if item.strip():
+            key, sep, val = item.partition("=")
+            if not sep:
+                raise ValueError(f"Metadata '{item.strip()}' must look like key=value.")
+            pairs.append((key.strip(), val.strip()))
+    return pairs
+
+
+class Lookup:
+    """Natural key -> pk dict that only queries keys it has not seen yet."""
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.cache = {}
+
+    def load(self, keys):
+        missing = {k for k in keys if k not in self.cache}
+        if missing:
+            found = dict(self.queryset.filter(**{f"{self.field}__in": missing}).values_list(self.field, "pk"))
+            for key in missing:
+                self.cache[key] = found.get(key)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.rejected = 0
+        self.errors = []
+
+    def __str__(self):
+        return f"{self.created} created, {self.rejected} rejected"
+
+
+class RosterImporter:
+    """
+    Streams rows into the database in batches. Each row is validated with
+    the same rules as the matching model form, but uniqueness and foreign
+    keys are checked per batch against lookup dicts instead of per row, and
+    valid rows are written with bulk_create inside one transaction per batch.
+
+    bulk_create skips model signals, so the search index and course and
+    student statistics are refreshed explicitly for every written batch.
+    """
+
+    model = None
+    form_class = None
+
+    def __init__(self, batch_size=1000, using="default", on_error=None, max_errors=100):
+        self.batch_size = batch_size
+        self.using = using
+        self.on_error = on_error
+        self.max_errors = max_errors
+        self.result = ImportResult()
+
+    def run(self, rows):
+        batch = []
+        for line_number, row in rows:
+            batch.append((line_number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        self.finish()
+        return self.result
+
+    def reject(self, line_number, row, message):
+        self.result.rejected += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append((line_number, message))
+        if self.on_error:
+            self.on_error(line_number, row, message)
+
+    def validate(self, line_number, row):
+        if "_error" in row:
+            self.reject(line_number, row, row["_error"])
+            return None
+        form = self.form_class(data=row)
+        if not form.is_valid():
+            message = "; ".join(f"{field}: {' '.join(errs)}" for field, errs in form.errors.items())
+            self.reject(line_number, row, message)
+            return None
+        try:
+            metadata = parse_metadata(row.get("metadata"))
+        except (ValueError, TypeError) as e:
+            self.reject(line_number, row, f"metadata: {e}")
+            return None
+        return form.instance, metadata
+
+    def import_batch(self, batch):
+        valid = []
+        for line_number, row in batch:
+            cleaned = self.validate(line_number, row)
+            if cleaned:
+                valid.append((line_number, row, *cleaned))
+        objects = self.resolve(valid)
+        if not objects:
+            return
+        with transaction.atomic(using=self.using):
+            created = self.model.objects.using(self.using).bulk_create([obj for obj, _ in objects])
+            self.link_metadata([(obj, pairs) for obj, (_, pairs) in objects])
+            self.after_batch(created)
+        self.result.created += len(created)
+
+    def resolve(self, valid):
+        """
+        Check keys against the database; return [(obj, (line_number,
+        metadata_pairs))]. Models without unique or foreign keys to check
+        keep every validated row; subclasses reject rows with self.reject().
+        """
+        return [(obj, (line_number, pairs)) for line_number, _, obj, pairs in valid]
+
+    def after_batch(self, created):
+        search.index_objects(self.model, [obj.pk for obj in created], self.using)
+        caching.bump(self.model, Metadata, using=self.using)
+
+    def finish(self):
+        pass
+
+    def link_metadata(self, objects):
+        through = self.model.metadata.through
+        fk = f"{self.model._meta.model_name}_id"
+        # Resolve every pair of the batch at once.
+        ids = interning.intern_pairs([pair for _, pairs in objects for pair in pairs], self.using)
+        links = []
+        for obj, pairs in objects:
+            for metadata_id in dict.fromkeys(ids[pair] for pair in pairs):
+                links.append(through(**{fk: obj.pk, "metadata_id": metadata_id}))
+        through.objects.using(self.using).bulk_create(links, batch_size=self.batch_size)
+
+
+class StudentImportForm(StudentForm):
+    metadata = None
+    not_duplicate = None
+    check_duplicates = False
+
+    class Meta(StudentForm.Meta):
+        fields = ["first_name", "last_name", "email", "dob"]
+
+    def validate_unique(self):
+        # Checked for the whole batch in StudentImporter.resolve().
+        pass
+
+
+class StudentImporter(RosterImporter):
+    model = Student
+    form_class = StudentImportForm
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seen_emails = set()
+
+    def resolve(self, valid):
+        emails = [student.email for _, _, student, _ in valid]
+        existing = set(Student.objects.using(self.using).filter(email__in=emails).values_list("email", flat=True))
+        objects = []
+        for line_number, row, student, pairs in valid:
+            if student.email in existing or student.email in self.seen_emails:
+                self.reject(line_number, row, "email: Student with this Email already exists.")
+                continue
+            self.seen_emails.add(student.email)
+            objects.append((student, (line_number, pairs)))
+        return objects
+
+
+class EnrollmentImportForm(EnrollmentForm):
+    metadata = None
+
+    class Meta(EnrollmentForm.Meta):
+        fields = ["exam_score", "grade"]
+
+    def validate_unique(self):
+        # Checked for the whole batch in EnrollmentImporter.resolve().
+        pass
+
+
+class EnrollmentImporter(RosterImporter):
+    model = Enrollment
+    form_class = EnrollmentImportForm
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.students = Lookup(Student.objects.using(self.using), "email")
+        self.courses = Lookup(Course.objects.using(self.using), "course_code")
+        self.terms = Lookup(Term.objects.using(self.using), "name")
+        self.seen_pairs = set()
+        self.touched_courses = set()
+        self.touched_students = set()
+
+    def resolve(self, valid):
+        self.students.load({str(row.get("student_email", "")).strip() for _, row, _, _ in valid})
+        self.courses.load({str(row.get("course_code", "")).strip() for _, row, _, _ in valid})
+        # The term column is optional; a blank one leaves the enrollment without a term.
+        self.terms.load({str(row.get("term") or "").strip() for _, row, _, _ in valid} - {""})
+
+        resolved = []
+        for line_number, row, enrollment, pairs in valid:
+            student_id = self.students.get(str(row.get("student_email", "")).strip())
+            course_id = self.courses.get(str(row.get("course_code", "")).strip())
+            term_name = str(row.get("term") or "").strip()
+            term_id = self.terms.get(term_name) if term_name else None
+            if student_id is None:
+                self.reject(line_number, row, "student_email: No student with this email.")
+            elif course_id is None:
+                self.reject(line_number, row, "course_code: No course with this code.")
+            elif term_name and term_id is None:
+                self.reject(line_number, row, "term: No term with this name.")
+            else:
+                enrollment.student_id, enrollment.course_id, enrollment.term_id = student_id, course_id, term_id
+                resolved.append((line_number, row, enrollment, pairs))
+
+        existing = set(
+            Enrollment.objects.using(self.using)
+            .filter(student_id__in={e.student_id for _, _, e, _ in resolved}, course_id__in={e.course_id for _, _, e, _ in resolved})
+            .values_list("student_id", "course_id", "term_id")
+        )
+        objects = []
+        for line_number, row, enrollment, pairs in resolved:
+            pair = (enrollment.student_id, enrollment.course_id, enrollment.term_id)
+            if pair in existing or pair in self.seen_pairs:
+                self.reject(line_number, row, "Enrollment with this Student, Course and Term already exists.")
+                continue
+            self.seen_pairs.add(pair)
+            objects.append((enrollment, (line_number, pairs)))
+        return objects
+
+    def after_batch(self, created):
+        super().after_batch(created)
+        self.touched_courses.update(obj.course_id for obj in created)
+        self.touched_students.update(obj.student_id for obj in created)
+
+    def finish(self):
+        if self.touched_courses:
+            stats.recompute(self.touched_courses, using=self.using)
+        if self.touched_students:
+            stats.recompute_students(self.touched_students, using=self.using)
+
+
+IMPORTERS = {
+    "students": StudentImporter,
+    "enrollments": EnrollmentImporter,
+}
@@ -0,0 +1,158 @@
+import operator
+import threading
+from collections import OrderedDict
+from functools import reduce
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import caching, search
+from .models import Metadata
+from .utils import chunks
+
+CACHE_SIZE = 4096
+# Pairs per lookup query: two parameters each.
+LOOKUP_BATCH = 400
+
+
+class PairCache:
+    """Thread-safe LRU of (using, key, value) -> Metadata pk for hot pairs."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.pairs = OrderedDict()
+        self.by_pk = {}
+
+    def get(self, item):
+        with self.lock:
+            pk = self.pairs.get(item)
+            if pk is not None:
+                self.pairs.move_to_end(item)
+            return pk
+
+    def set(self, item, pk):
+        with self.lock:
+            self.pairs[item] = pk
+            self.pairs.move_to_end(item)
+            self.by_pk[(item[0], pk)] = item
+            while len(self.pairs) > self.maxsize:
+                old, old_pk = self.pairs.popitem(last=False)
+                self.by_pk.pop((old[0], old_pk), None)
+
+    def discard_pk(self, using, pk):
+        with self.lock:
+            item = self.by_pk.pop((using, pk), None)
+            if item is not None:
+                self.pairs.pop(item, None)
+
+    def clear(self):
+        with self.lock:
+            self.pairs.clear()
+            self.by_pk.clear()
+
+
+cache = PairCache()
+
+
+def intern_pairs(pairs, using="default"):
+    """
+    Return {(key, value): pk} for the given pairs, creating the missing
+    Metadata rows. Cached pairs cost nothing; the rest cost one lookup query
+    per LOOKUP_BATCH pairs plus, if any are new, one bulk insert and one
+    re-read.
+    """
+    result = {}
+    missing = set()
+    for pair in set(pairs):
+        pk = cache.get((using, *pair))
+        if pk is None:
+            missing.add(pair)
+        else:
+            result[pair] = pk
+    if not missing:
+        return result
+
+    def lookup():
+        # The pairs themselves, so a common key does not pull in every
+        # value stored under it; each term is a probe of the unique index.
+        found = {}
+        for chunk in chunks(sorted(missing), LOOKUP_BATCH):
+            pairs = reduce(operator.or_, (Q(key=k, value=v) for k, v in chunk))
+            rows = Metadata.objects.using(using).filter(pairs).order_by().values_list("key", "value", "pk")
+            found.update(((k, v), pk) for k, v, pk in rows)
+        return found
+
+    found = lookup()
+    new = [Metadata(key=k, value=v) for k, v in missing if (k, v) not in found]
+    if new:
+        # Another process may insert the same pair meanwhile; the unique
+        # constraint makes that a no-op and the re-read picks its pk up.
+        Metadata.objects.using(using).bulk_create(new, ignore_conflicts=True)
+        found = lookup()
+        search.index_objects(Metadata, [found[(m.key, m.value)] for m in new], using)
+        caching.bump(Metadata, using=using)
+
+    def remember():
+        for pair, pk in found.items():
+            cache.set((using, *pair), pk)
+
+    # Only cache rows that are known to be committed: a pk from a rolled
+    # back transaction must never be handed out again.
+    transaction.on_commit(remember, using=using)
+    result.update(found)
+    return result
+
+
+def intern_pair(key, value, using="default"):
+    return intern_pairs([(key, value)], using)[(key, value)]
+
+
+def merge_duplicates(metadata_model, using="default", batch_size=500):
+    """
+    Collapse Metadata rows sharing a (key, value) onto the lowest pk and
+    rewrite every M2M through table in bulk. Takes the model as an argument
+    so migrations can pass their historical version. Returns
+    (duplicate groups, rows removed).
+    """
+    manager = metadata_model._default_manager.using(using)
+    rows = manager.order_by("key", "value", "pk").values_list("key", "value", "pk").iterator(chunk_size=batch_size * 4)
+    remap = {}
+    group_count = 0
+    for _, group in groupby(rows, key=lambda row: row[:2]):
+        keep, *dups = [pk for _, _, pk in group]
+        if dups:
+            group_count += 1
+            remap.update(dict.fromkeys(dups, keep))
+    if not remap:
+        return 0, 0
+
+    relations = [rel for rel in metadata_model._meta.related_objects if rel.many_to_many]
+    dup_ids = list(remap)
+    for start in range(0, len(dup_ids), batch_size):
+        chunk = dup_ids[start:start + batch_size]
+        with transaction.atomic(using=using):
+            _merge_chunk(manager, relations, chunk, remap, using, batch_size)
+    cache.clear()
+    caching.bump(metadata_model, *(rel.related_model for rel in relations), using=using)
+    return group_count, len(remap)
+
+
+def _merge_chunk(manager, relations, chunk, remap, using, batch_size):
+    for rel in relations:
+        through = rel.through
+        owner = rel.field.m2m_field_name()
+        target = rel.field.m2m_reverse_field_name()
+        links = through._default_manager.using(using).filter(**{f"{target}_id__in": chunk})
+        rewired = {
+            (owner_id, remap[metadata_id])
+            for owner_id, metadata_id in links.values_list(f"{owner}_id", f"{target}_id")
+        }
+        through._default_manager.using(using).bulk_create(
+            [through(**{f"{owner}_id": o, f"{target}_id": m}) for o, m in rewired],
+            ignore_conflicts=True,
+            batch_size=batch_size,
+        )
+        links.delete()
+    manager.filter(pk__in=chunk).delete()
@@ -0,0 +1,238 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+Task = namedtuple("Task", "func label max_attempts manual")
+
+# Registered tasks by name; see students/tasks.py.
+TASKS = {}
+
+# Seconds before the first retry, doubled for each further attempt.
+RETRY_DELAY = getattr(settings, "JOB_RETRY_DELAY", 10)
+# A running job whose heartbeat is older than this is taken to have lost
+# its worker and is queued again (or failed, out of attempts).
+STALE_AFTER = getattr(settings, "JOB_STALE_SECONDS", 600)
+# Seconds between heartbeats of a running job; keep well under STALE_AFTER.
+HEARTBEAT_INTERVAL = getattr(settings, "JOB_HEARTBEAT_SECONDS", 30)
+PROGRESS_INTERVAL = 1.0
+
+
+def task(name=None, label=None, max_attempts=3, manual=False):
+    """
+    Register a function as a job task, called as func(progress, **job.args)
+    in a worker; its return value (JSON) is stored as the job's result.
+    `manual` tasks take no arguments and can be started from the job page.
+    """
+    def register(func):
+        TASKS[name or func.__name__] = Task(func, label or func.__name__.replace("_", " ").capitalize(), max_attempts, manual)
+        return func
+    return register
+
+
+def enqueue(name, args=None, user=None, delay=0, using="default"):
+    """Queue a job and return it at once; a worker picks it up."""
+    if name not in TASKS:
+        raise ValueError(f"Unknown task {name!r}.")
+    return Job.objects.using(using).create(
+        task=name,
+        args=args or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=TASKS[name].max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(worker, using="default"):
+    """
+    Take the oldest due job, or return None. The UPDATE only matches a row
+    that is still queued, so when two workers race for one job only one of
+    them gets it and the other looks again.
+    """
+    jobs = Job.objects.using(using)
+    while True:
+        now = timezone.now()
+        pk = jobs.filter(status=Job.QUEUED, run_after__lte=now).order_by("run_after", "pk").values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        claimed = jobs.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F("attempts") + 1, started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            return jobs.get(pk=pk)
+
+
+class Progress:
+    """
+    Handed to every task to report how far it got. Writes at most once per
+    `interval` seconds, and each write is also the job's heartbeat. Tasks
+    should report between transactions: inside one the row is only seen by
+    others on commit.
+    """
+
+    def __init__(self, job, using="default", interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.using = using
+        self.interval = interval
+        self.written = float("-inf")
+
+    def __call__(self, done, total=None, message=None, force=False):
+        self.job.progress = done
+        if total is not None:
+            self.job.total = total
+        if message is not None:
+            self.job.message = message[:255]
+        now = time.monotonic()
+        if force or now - self.written >= self.interval:
+            self.written = now
+            Job.objects.using(self.using).filter(pk=self.job.pk).update(
+                progress=self.job.progress, total=self.job.total, message=self.job.message, heartbeat_at=timezone.now(),
+            )
+
+
+class Heartbeat(threading.Thread):
+    """
+    Touches a running job's heartbeat every `interval` seconds, on its own
+    thread and connection, while the task runs. Progress writes only happen
+    when a task reports, so without this a task busy for longer than
+    STALE_AFTER in one statement would be requeued by requeue_stale() and
+    run a second time alongside the first.
+    """
+
+    def __init__(self, job, using="default", interval=None):
+        super().__init__(name=f"heartbeat-{job.pk}", daemon=True)
+        self.job = job
+        self.using = using
+        self.interval = HEARTBEAT_INTERVAL if interval is None else interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        # Only while this worker still holds the job, so a beat racing the
+        # final save or a requeue does not mark someone else's run alive.
+        beats = Job.objects.using(self.using).filter(pk=self.job.pk, status=Job.RUNNING, worker=self.job.worker)
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    beats.update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # Locked out by the task's own transaction; next interval.
+                    pass
+        finally:
+            connections.close_all()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+
+
+def run(job, using="default"):
+    """
+    Run a claimed job, with a Heartbeat for as long as the task runs. A task
+    that raises is queued again after a growing delay until it runs out of
+    attempts, then marked failed with the traceback.
+    """
+    task = TASKS.get(job.task)
+    try:
+        if task is None:
+            raise LookupError(f"Unknown task {job.task!r}.")
+        with Heartbeat(job, using):
+            result = task.func(Progress(job, using), **job.args)
+    except Exception:
+        job.error = traceback.format_exc()
+        if task is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.result = result
+        job.error = ""
+        job.finished_at = timezone.now()
+        if job.total is not None:
+            job.progress = job.total
+    job.heartbeat_at = timezone.now()
+    job.save(using=using, update_fields=[
+        "status", "result", "error", "run_after", "progress", "total", "message", "heartbeat_at", "finished_at",
+    ])
+    return job
+
+
+def requeue_stale(stale_after=STALE_AFTER, using="default"):
+    """
+    Queue running jobs whose worker went quiet again, or fail them if out of
+    attempts. A live worker beats every HEARTBEAT_INTERVAL, so only jobs of
+    workers that stopped go quiet. Returns (requeued, failed).
+    """
+    now = timezone.now()
+    stale = Job.objects.using(using).filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, finished_at=now, error="The worker stopped responding.",
+    )
+    requeued = stale.update(status=Job.QUEUED, run_after=now, worker="")
+    return requeued, failed
+
+
+def worker_name(index):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+class Worker:
+    """
+    Claims and runs jobs until `stop` is set, sleeping `poll` seconds when
+    the queue is empty. In burst mode it returns as soon as no job is due.
+    """
+
+    def __init__(self, index=0, using="default", poll=1.0, burst=False, stop=None, log=None):
+        self.index = index
+        self.using = using
+        self.poll = poll
+        self.burst = burst
+        self.stop = stop or threading.Event()
+        self.log = log or (lambda message: None)
+        self.processed = 0
+
+    def run(self):
+        name = worker_name(self.index)
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim(name, self.using)
+                except DatabaseError as e:
+                    self.log(f"[{name}] could not claim a job: {e}")
+                    self.stop.wait(self.poll)
+                    continue
+                if job is None:
+                    if self.burst:
+                        break
+                    self.stop.wait(self.poll)
+                    continue
+                started = time.perf_counter()
+                try:
+                    run(job, self.using)
+                except DatabaseError as e:
+                    # Recording the outcome failed (e.g. the database stayed
+                    # locked); the job stays running until requeue_stale().
+                    self.log(f"[{name}] {job} could not be saved: {e}")
+                    continue
+                self.processed += 1
+                self.log(f"[{name}] {job} {job.status} after {time.perf_counter() - started:.2f}s (attempt {job.attempts}/{job.max_attempts})")
+        finally:
+            connections.close_all()
+        return self.processed
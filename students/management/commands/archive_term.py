@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students import archive
+from students.models import Term
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the enrollments of a finished term out of the enrollment table into the "
+        "archive table, in batches. Student pages show them again with ?history=1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("term", help="Name of the term to archive.")
+        parser.add_argument("--force", action="store_true", help="Archive a term that has not ended yet.")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be archived without moving it.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        try:
+            term = Term.objects.using(using).get(name=options["term"])
+        except Term.DoesNotExist:
+            raise CommandError(f"No term named {options['term']!r}.")
+        if not term.closed and not options["force"]:
+            raise CommandError(f"{term} runs until {term.ends_on}; pass --force to archive it anyway.")
+
+        if options["dry_run"]:
+            count = term.enrollments.using(using).count()
+            self.stdout.write(f"Would archive {count} enrollments of {term}.")
+            return
+        archived, counts = archive.archive_term(term, batch_size=options["batch_size"], using=using)
+        links = sum(count for label, count in counts.items() if label != "students.Enrollment")
+        self.stdout.write(f"Archived {archived} enrollments of {term} ({links} metadata links folded in).")
@@ -0,0 +1,420 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from students import datasets, urls
+from students.models import Course, Enrollment, Instructor, Metadata, Student
+from students.pagination import KeysetPaginator
+from students.views import CourseListView, EnrollmentListView, InstructorListView, MetadataListView, StudentListView
+
+LIST_VIEWS = {
+    "student_list": StudentListView,
+    "course_list": CourseListView,
+    "instructor_list": InstructorListView,
+    "enrollment_list": EnrollmentListView,
+    "metadata_list": MetadataListView,
+}
+# Differences below this are noise whatever the ratio.
+NOISE_MS = 1.0
+
+
+class Case:
+    """
+    One timed request. url and data may be callables taking the repetition
+    number, for requests that need rows of their own (deletes, unique
+    emails); they are called before the clock starts.
+    """
+
+    def __init__(self, name, url, method="get", data=None, staff=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.staff = staff
+
+    def request(self, i):
+        url = self.url(i) if callable(self.url) else self.url
+        data = self.data(i) if callable(self.data) else self.data
+        if self.method == "get" and not self.staff:
+            # A parameter the page cache does not know: every request renders.
+            url += ("&" if "?" in url else "?") + f"_bench={i}"
+        return url, data
+
+
+class Suite:
+    """
+    Benchmark cases for every named route in students/urls.py, built from
+    the rows in the database: search, first and last pages of every list,
+    detail pages, create/update/delete, import, API and autocomplete.
+    Write cases create and remove their own rows.
+    """
+
+    def __init__(self, host):
+        self.token = uuid.uuid4().hex[:8]
+        self.guest = Client(HTTP_HOST=host)
+        self.staff = Client(HTTP_HOST=host)
+        User = get_user_model()
+        self.user, self.created_user = User.objects.get_or_create(
+            username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+        )
+        self.staff.force_login(self.user)
+        self.factory = RequestFactory(HTTP_HOST=host)
+
+    def middle(self, model):
+        queryset = model.objects.order_by("pk")
+        count = queryset.count()
+        return queryset[count // 2] if count else None
+
+    def cases(self):
+        """(case list, names of routes without cases)."""
+        builders = {
+            "list": self.list_cases, "detail": self.detail_cases, "chart": self.detail_cases,
+            "create": self.create_cases, "edit": self.edit_cases, "delete": self.delete_cases,
+        }
+        cases, skipped = [], []
+        for pattern in urls.urlpatterns:
+            name = getattr(pattern, "name", None)
+            if not name:
+                continue
+            kind = name.rpartition("_")[2]
+            build = getattr(self, f"{name}_cases", None) or builders.get(kind)
+            built = list(build(name)) if build else []
+            cases += built
+            if not built:
+                skipped.append(name)
+        return cases, skipped
+
+    def list_cases(self, name):
+        view_class = LIST_VIEWS[name]
+        staff = name == "metadata_list"
+        url = reverse(name)
+        yield Case(name, url, staff=staff)
+
+        sample = self.middle(view_class.model)
+        if sample is None:
+            return
+        term = {
+            Student: lambda: sample.last_name, Course: lambda: sample.course_name.split()[0],
+            Instructor: lambda: sample.last_name, Enrollment: lambda: sample.student.last_name,
+            Metadata: lambda: sample.key,
+        }[view_class.model]()
+        yield Case(f"{name}:search", f"{url}?q={term}", staff=staff)
+
+        # Deep pagination: the last page, by offset and by keyset cursor.
+        view = view_class()
+        view.setup(self.factory.get(url))
+        queryset = view.get_queryset()
+        count = queryset.count()
+        last = max(count - view.paginate_by, 1)
+        yield Case(f"{name}:deep", f"{url}?page={-(-count // view.paginate_by)}", staff=staff)
+        cursor = KeysetPaginator(queryset, view.paginate_by, queryset.query.order_by).cursor_at(last)
+        yield Case(f"{name}:deep:cursor", f"{url}?cursor={cursor}", staff=staff)
+
+    def detail_cases(self, name):
+        model = self.model_for(name)
+        sample = self.middle(model)
+        if sample is not None:
+            yield Case(name, reverse(name, args=[sample.pk]))
+        if model is Course:
+            busiest = Course.objects.order_by("-stats__enrollment_count", "pk").first()
+            if busiest is not None:
+                yield Case(f"{name}:largest", reverse(name, args=[busiest.pk]))
+
+    def scratch(self, model, i, tag):
+        """A row for a write case to change or delete."""
+        email = f"bench-{self.token}-{tag}{i}@example.edu"
+        if model is Student:
+            return Student.objects.create(first_name="Bench", last_name=f"Run{i}", email=email, dob="2000-01-01")
+        if model is Course:
+            return Course.objects.create(course_name="Bench", course_code=f"B{self.token}{tag}{i}")
+        if model is Instructor:
+            return Instructor.objects.create(first_name="Bench", last_name=f"Run{i}", email=email)
+        if model is Enrollment:
+            return Enrollment.objects.create(student=self.scratch(Student, i, f"{tag}e"), course=Course.objects.order_by("pk").first())
+        return Metadata.objects.create(key="bench", value=f"{self.token}-{tag}{i}")
+
+    def form_data(self, model, i):
+        email = f"bench-{self.token}-c{i}@example.edu"
+        if model is Student:
+            # Scratch students all look alike; confirm them past the duplicate check.
+            return {"first_name": "Bench", "last_name": f"Run{i}", "email": email, "dob": "2000-01-01", "not_duplicate": "on"}
+        if model is Course:
+            return {"course_name": "Bench", "course_code": f"C{self.token}{i}", "description": ""}
+        if model is Instructor:
+            return {"first_name": "Bench", "last_name": f"Run{i}", "email": email, "courses": [Course.objects.order_by("pk").first().pk]}
+        if model is Enrollment:
+            return {"student": self.scratch(Student, i, "ce").pk, "course": Course.objects.order_by("pk").first().pk,
+                    "exam_score": "75", "grade": "C"}
+        return {"key": "bench", "value": f"{self.token}-c{i}"}
+
+    def model_for(self, name):
+        return {"student": Student, "course": Course, "instructor": Instructor, "enrollment": Enrollment,
+                "metadata": Metadata}[name.split("_")[0]]
+
+    def create_cases(self, name):
+        model = self.model_for(name)
+        if model in (Instructor, Enrollment) and not Course.objects.exists():
+            return
+        yield Case(f"{name}:form", reverse(name), staff=True)
+        yield Case(name, reverse(name), method="post", data=lambda i: self.form_data(model, i), staff=True)
+
+    def edit_cases(self, name):
+        model = self.model_for(name)
+        if model is Enrollment and not Course.objects.exists():
+            return
+        target = self.scratch(model, 0, "u")
+        if model in (Student, Instructor):
+            data = {"first_name": "Bench", "last_name": "Edited", "email": target.email, "dob": "2000-01-01"}
+        elif model is Course:
+            data = {"course_name": "Bench edited", "course_code": target.course_code, "description": "Edited"}
+        elif model is Enrollment:
+            data = {"student": target.student_id, "course": target.course_id, "exam_score": "82", "grade": "B"}
+        else:
+            data = {"key": "bench", "value": target.value}
+        yield Case(name, reverse(name, args=[target.pk]), method="post", data=data, staff=True)
+
+    def delete_cases(self, name):
+        model = self.model_for(name)
+        if model is Enrollment and not Course.objects.exists():
+            return
+        url = lambda i: reverse(name, args=[self.scratch(model, i, "d").pk])
+        yield Case(name, url, method="post", staff=True)
+
+    def student_bulk_delete_cases(self, name):
+        # Only the confirmation page: a POST would delete part of the dataset.
+        sample = self.middle(Student)
+        if sample is not None:
+            yield Case(name, reverse(name) + f"?q={sample.last_name}", staff=True)
+
+    def course_bulk_delete_cases(self, name):
+        sample = self.middle(Course)
+        if sample is not None:
+            yield Case(name, reverse(name) + f"?q={sample.course_code}", staff=True)
+
+    def roster_import_cases(self, name):
+        def upload(i):
+            lines = ["first_name,last_name,email,dob"]
+            lines += [f"Bench,Import{n},bench-{self.token}-r{i}x{n}@example.edu,2000-01-01" for n in range(100)]
+            return {"kind": "students", "file": SimpleUploadedFile("roster.csv", "\n".join(lines).encode())}
+
+        yield Case(name, reverse(name), method="post", data=upload, staff=True)
+
+    def api_list_cases(self, name):
+        yield Case(name, reverse(name, args=["students"]) + "?include=enrollments.course&limit=50")
+
+    def api_detail_cases(self, name):
+        sample = self.middle(Student)
+        if sample is not None:
+            yield Case(name, reverse(name, args=["students", sample.pk]) + "?include=enrollments.course,metadata")
+
+    def autocomplete_cases(self, name):
+        sample = self.middle(Student)
+        if sample is not None:
+            yield Case(name, reverse(name, args=["student"]) + f"?q={sample.last_name[:3]}", staff=True)
+
+    def job_list_cases(self, name):
+        yield Case(name, reverse(name), staff=True)
+
+    def job_detail_cases(self, name):
+        # Job pages only read the job table, which the datasets leave empty.
+        return []
+
+    job_create_cases = job_detail_cases
+
+    def run(self, case, repeat):
+        client = self.staff if case.staff else self.guest
+        timings = []
+        queries = status = url = None
+        for i in range(repeat + 1):
+            url, data = case.request(i)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, case.method)(url, data)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            status = response.status_code
+            if i:  # the first run warms up
+                timings.append(elapsed * 1000)
+                queries = len(captured)
+        return {
+            "url": url,
+            "method": case.method.upper(),
+            "status": status,
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings),
+            "max_ms": max(timings),
+            "queries": queries,
+        }
+
+    def cleanup(self):
+        prefix = f"bench-{self.token}-"
+        Enrollment.objects.filter(student__email__startswith=prefix).delete()
+        Student.objects.filter(email__startswith=prefix).delete()
+        Instructor.objects.filter(email__startswith=prefix).delete()
+        Course.objects.filter(course_code__startswith=f"B{self.token}").delete()
+        Course.objects.filter(course_code__startswith=f"C{self.token}").delete()
+        Metadata.objects.filter(key="bench", value__startswith=self.token).delete()
+        if self.created_user:
+            self.user.delete()
+
+
+def row_counts():
+    return {name: model.objects.count() for name, model in
+            [("students", Student), ("courses", Course), ("instructors", Instructor), ("enrollments", Enrollment), ("metadata", Metadata)]}
+
+
+def compare(results, baseline, tolerance):
+    """[(scale, case, baseline ms, current ms, baseline queries, current queries, problem)] for cases in both."""
+    rows = []
+    for scale, current in results["scales"].items():
+        before = baseline.get("scales", {}).get(scale)
+        if before is None:
+            continue
+        for name, now in current["cases"].items():
+            then = before["cases"].get(name)
+            if then is None:
+                continue
+            problem = ""
+            if now["median_ms"] > then["median_ms"] * (1 + tolerance) and now["median_ms"] - then["median_ms"] > NOISE_MS:
+                problem = "slower"
+            if (now["queries"] or 0) > (then["queries"] or 0):
+                problem = f"{problem}, more queries" if problem else "more queries"
+            rows.append((scale, name, then["median_ms"], now["median_ms"], then["queries"], now["queries"], problem))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every route in students/urls.py and write the results as JSON. "
+        "With --scale, each named dataset is generated once into its own SQLite "
+        "file under --workdir and benchmarked in a subprocess; without it, the "
+        "configured database is used as it is. Pass --baseline to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", action="append", dest="scales", choices=list(datasets.SCALES),
+                            help="Dataset size to benchmark; repeatable. Default: the configured database.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case, after one warm-up run.")
+        parser.add_argument("--only", action="append", default=[], help="Run only cases whose name starts with this; repeatable.")
+        parser.add_argument("--output", default=os.path.join(".benchmarks", "results.json"))
+        parser.add_argument("--baseline", help="Earlier results to compare against.")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown of a case's median before it is flagged.")
+        parser.add_argument("--fail-on-regression", action="store_true")
+        parser.add_argument("--workdir", default=".benchmarks", help="Where generated datasets are kept.")
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument("--worker", action="store_true", help="Print one scale's results as JSON (used internally).")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+        if options["worker"]:
+            self.stdout.write(json.dumps(self.measure(options)))
+            return
+
+        results = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "seed": options["seed"],
+            "environment": {
+                "python": platform.python_version(), "django": django.get_version(),
+                "database": connection.vendor, "machine": platform.machine(),
+            },
+            "scales": {},
+        }
+        if options["scales"]:
+            for scale in options["scales"]:
+                results["scales"][scale] = self.spawn(scale, options)
+        else:
+            results["scales"]["current"] = self.measure(options)
+
+        os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+        self.report(results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            regressions = self.report_comparison(compare(results, baseline, options["tolerance"]))
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{regressions} cases regressed against {options['baseline']}.")
+
+    def measure(self, options):
+        suite = Suite(options["host"])
+        try:
+            cases, skipped = suite.cases()
+            measured = {}
+            for case in cases:
+                if options["only"] and not case.name.startswith(tuple(options["only"])):
+                    continue
+                self.stderr.write(f"  {case.name}")
+                measured[case.name] = suite.run(case, options["repeat"])
+        finally:
+            suite.cleanup()
+        return {"counts": row_counts(), "cases": measured, "skipped": skipped}
+
+    def spawn(self, scale, options):
+        path = os.path.abspath(os.path.join(options["workdir"], f"{scale}-seed{options['seed']}.sqlite3"))
+        env = {**os.environ, "SQLITE_PATH": path, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        run = lambda *args: subprocess.run([sys.executable, "-m", "django", *args], cwd=settings.BASE_DIR, env=env,
+                                           capture_output=True, text=True)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.stderr.write(f"Generating the {scale} dataset into {path}...")
+            for args in (["migrate", "--no-input"], ["generate_dataset", "--scale", scale, "--seed", str(options["seed"])]):
+                finished = run(*args)
+                if finished.returncode:
+                    os.remove(path)
+                    raise CommandError(f"{' '.join(args)} failed:\n{finished.stderr}")
+        self.stderr.write(f"Benchmarking {scale}...")
+        args = ["benchmark", "--worker", "--repeat", str(options["repeat"]), "--host", options["host"]]
+        for prefix in options["only"]:
+            args += ["--only", prefix]
+        finished = run(*args)
+        if finished.returncode:
+            raise CommandError(f"Benchmark of {scale} failed:\n{finished.stderr}")
+        return json.loads(finished.stdout.strip().splitlines()[-1])
+
+    def report(self, results):
+        for scale, result in results["scales"].items():
+            counts = ", ".join(f"{count} {name}" for name, count in result["counts"].items())
+            self.stdout.write(f"{scale} ({counts})")
+            width = max((len(name) for name in result["cases"]), default=4)
+            for name, row in result["cases"].items():
+                self.stdout.write(
+                    f"  {name:<{width}}  {row['median_ms']:9.1f} ms  {row['queries']:4} queries  {row['status']}"
+                )
+            if result["skipped"]:
+                self.stdout.write(f"  no cases for: {', '.join(result['skipped'])}")
+
+    def report_comparison(self, rows):
+        if not rows:
+            self.stdout.write("No cases in common with the baseline.")
+            return 0
+        self.stdout.write("Against baseline (median ms, queries):")
+        width = max(len(f"{scale} {name}") for scale, name, *_ in rows)
+        for scale, name, then, now, queries_then, queries_now, problem in rows:
+            change = (now - then) / then * 100 if then else 0
+            self.stdout.write(
+                f"  {scale + ' ' + name:<{width}}  {then:9.1f} -> {now:9.1f} ({change:+6.1f}%)  "
+                f"{queries_then} -> {queries_now}  {problem}"
+            )
+        return sum(1 for *_, problem in rows if problem)
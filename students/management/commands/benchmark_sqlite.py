@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sms.sqlite.base import DEFAULT_PRAGMAS, pragma_statements
+
+ROWS = 10000
+
+
+def setup_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE roster (id INTEGER PRIMARY KEY, name TEXT NOT NULL, score REAL)")
+    conn.executemany("INSERT INTO roster (name, score) VALUES (?, ?)", ((f"student {i}", i % 100) for i in range(ROWS)))
+    conn.commit()
+    conn.close()
+
+
+def worker(path, pragmas, begin, seconds, write_ratio, seed):
+    """Mixed read/write loop against one connection; returns (reads, writes, lock errors)."""
+    rng = random.Random(seed)
+    # isolation_level=None: transactions are opened explicitly below, like
+    # Django's autocommit mode does.
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for statement in pragma_statements(pragmas):
+        conn.execute(statement)
+    reads = writes = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                # Read-then-write, as a form save does.
+                conn.execute(begin)
+                pk = rng.randint(1, ROWS)
+                conn.execute("SELECT score FROM roster WHERE id = ?", (pk,)).fetchone()
+                conn.execute("UPDATE roster SET score = score + 1 WHERE id = ?", (pk,))
+                conn.execute("COMMIT")
+                writes += 1
+            else:
+                start = rng.randint(1, ROWS - 50)
+                conn.execute("SELECT id, name, score FROM roster WHERE id BETWEEN ? AND ?", (start, start + 50)).fetchall()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    return reads, writes, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read/write throughput of N concurrent processes on a scratch "
+        "SQLite file, with stock settings and with the configured PRAGMAs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        configured = settings.DATABASES["default"].get("OPTIONS", {}).get("pragmas", {})
+        scenarios = [
+            ("stock", {}, "BEGIN"),
+            ("tuned", {**DEFAULT_PRAGMAS, **configured}, "BEGIN IMMEDIATE"),
+        ]
+        self.stdout.write(f"{options['workers']} workers, {options['seconds']}s, {options['write_ratio']:.0%} writes")
+        for name, pragmas, begin in scenarios:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                setup_database(path)
+                args = [
+                    (path, pragmas, begin, options["seconds"], options["write_ratio"], seed)
+                    for seed in range(options["workers"])
+                ]
+                with multiprocessing.Pool(options["workers"]) as pool:
+                    results = pool.starmap(worker, args)
+            reads, writes, errors = (sum(column) for column in zip(*results))
+            self.stdout.write(
+                f"{name:>6}: {reads / options['seconds']:10.0f} reads/s {writes / options['seconds']:8.0f} writes/s "
+                f"{errors:6d} lock errors"
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from students.interning import merge_duplicates
+from students.models import Metadata
+
+
+class Command(BaseCommand):
+    help = "Merge Metadata rows with the same key and value and re-point every link to the survivor."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        groups, removed = merge_duplicates(Metadata, using=options["database"], batch_size=options["batch_size"])
+        self.stdout.write(f"Merged {groups} duplicated pairs, removed {removed} metadata rows.")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from students import duplicates
+
+
+def describe(row):
+    return f"#{row.pk} {row.first_name} {row.last_name} <{row.email}> {row.dob}"
+
+
+class Command(BaseCommand):
+    help = (
+        "List likely duplicate students, comparing only those that share a blocking key "
+        "(soundex of a name plus date of birth, or of both names), and optionally merge them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=duplicates.THRESHOLD, help="Minimum score, 0-1.")
+        parser.add_argument("--max-block", type=int, default=duplicates.MAX_BLOCK, help="Skip blocks with more students.")
+        parser.add_argument("--limit", type=int, default=50, help="Pairs to list (-1 for all).")
+        parser.add_argument(
+            "--merge", action="store_true",
+            help="Merge every group of linked pairs into its oldest student.",
+        )
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        pairs, skipped = duplicates.find_candidates(options["threshold"], options["max_block"], using=using)
+        shown = pairs if options["limit"] < 0 else pairs[:options["limit"]]
+        for pair in shown:
+            self.stdout.write(f"{pair.score:.3f}  {describe(pair.first)}  ~  {describe(pair.second)}")
+        if len(shown) < len(pairs):
+            self.stdout.write(f"  ... and {len(pairs) - len(shown)} more")
+        self.stdout.write(f"Found {len(pairs)} candidate pairs.")
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} blocks larger than {options['max_block']} students.")
+
+        if options["merge"]:
+            groups = duplicates.clusters(pairs)
+            removed = moved = merged = 0
+            for keep, others in groups:
+                group_moved, group_merged = duplicates.merge_students(keep, others, using=using)
+                removed += len(others)
+                moved += group_moved
+                merged += group_merged
+            self.stdout.write(
+                f"Merged {removed} students into {len(groups)}: "
+                f"moved {moved} enrollments, combined {merged} in shared courses."
+            )
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from students.importers import IMPORTERS, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import students or enrollments from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--kind", choices=sorted(IMPORTERS), required=True)
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--errors", help="Write rejected rows to this CSV file.")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        error_file = open(options["errors"], "w", newline="", encoding="utf-8") if options["errors"] else None
+        on_error = None
+        if error_file:
+            writer = csv.writer(error_file)
+            writer.writerow(["line", "error", "row"])
+
+            def on_error(line_number, row, message):
+                writer.writerow([line_number, message, json.dumps(row, default=str)])
+
+        importer = IMPORTERS[options["kind"]](
+            batch_size=options["batch_size"], using=options["database"], on_error=on_error
+        )
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as stream:
+                result = importer.run(read_rows(stream, fmt))
+        except OSError as e:
+            raise CommandError(e)
+        finally:
+            if error_file:
+                error_file.close()
+
+        self.stdout.write(f"{options['kind']}: {result}")
+        if result.rejected and not error_file:
+            for line_number, message in result.errors[:10]:
+                self.stderr.write(f"line {line_number}: {message}")
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from sms.perf import percentile
+from students.models import Course, Enrollment, Instructor, Student
+
+LIST_PAGES = ["student_list", "course_list", "instructor_list", "enrollment_list"]
+DETAIL_PAGES = [("student_detail", Student), ("course_detail", Course), ("instructor_detail", Instructor), ("enrollment_detail", Enrollment)]
+
+
+def default_paths():
+    paths = [reverse(name) for name in LIST_PAGES]
+    for name, model in DETAIL_PAGES:
+        pk = model.objects.order_by("pk").values_list("pk", flat=True).first()
+        if pk is not None:
+            paths.append(reverse(name, args=[pk]))
+    return paths
+
+
+def request_urls(path, count, cached):
+    # A parameter the page cache does not know makes every request render.
+    if cached:
+        return [path] * count
+    separator = "&" if "?" in path else "?"
+    return [f"{path}{separator}_lt={i}" for i in range(count)]
+
+
+def summarize(seconds, samples):
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "requests": len(samples),
+        "rps": len(samples) / seconds if seconds else 0,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "errors": sum(1 for _, status in samples if status is None or status >= 400),
+    }
+
+
+def run_threads(fetch, urls, concurrency):
+    def timed(url):
+        start = time.perf_counter()
+        status = fetch(url)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(timed, urls))
+    return time.perf_counter() - start, samples
+
+
+async def run_tasks(fetch, urls, concurrency):
+    pending = iter(urls)
+    samples = []
+
+    async def worker():
+        for url in pending:
+            start = time.perf_counter()
+            status = await fetch(url)
+            samples.append((time.perf_counter() - start, status))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, samples
+
+
+class WSGIClient:
+    """Calls the WSGI application directly from a pool of threads, as a threaded server would."""
+
+    def __init__(self, host):
+        from django.core.wsgi import get_wsgi_application
+
+        self.app = get_wsgi_application()
+        self.host = host
+
+    def __call__(self, url):
+        path, _, query = url.partition("?")
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "HTTP_HOST": self.host}
+        setup_testing_defaults(environ)
+        status = []
+        response = self.app(environ, lambda line, headers, exc_info=None: status.append(line))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(status[0].split()[0])
+
+    def run(self, urls, concurrency):
+        return run_threads(self, urls, concurrency)
+
+
+class ASGIClient:
+    """Calls the ASGI application directly from concurrent tasks on one event loop, as uvicorn would."""
+
+    def __init__(self, host):
+        from django.core.asgi import get_asgi_application
+
+        self.app = get_asgi_application()
+        self.host = host
+
+    async def __call__(self, url):
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+            "headers": [(b"host", self.host.encode())], "client": ("127.0.0.1", 0), "server": (self.host, 80),
+        }
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+        status = None
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # No disconnect: wait until the handler cancels its listener.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await self.app(scope, receive, send)
+        return status
+
+    def run(self, urls, concurrency):
+        return asyncio.run(run_tasks(self, urls, concurrency))
+
+
+class HTTPClient:
+    """Requests a running server over keep-alive connections, one per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise CommandError(f"Invalid --url {base_url!r}.")
+        self.parts = parts
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, "connection", None) is None:
+            factory = http.client.HTTPSConnection if self.parts.scheme == "https" else http.client.HTTPConnection
+            self.local.connection = factory(self.parts.hostname, self.parts.port, timeout=30)
+        return self.local.connection
+
+    def __call__(self, url):
+        try:
+            connection = self.connection()
+            connection.request("GET", self.parts.path.rstrip("/") + url)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.local.connection = None
+            return None
+
+    def run(self, urls, concurrency):
+        return run_threads(self, urls, concurrency)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second and latency percentiles of the WSGI stack "
+        "(sync views, thread pool) and the ASGI stack (async views, event loop) "
+        "on the configured database. Each stack runs in-process in its own "
+        "subprocess; with --url, a running server is load-tested over HTTP "
+        "instead, e.g. gunicorn sms.wsgi --threads 8 vs uvicorn sms.asgi:application."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=["wsgi", "asgi", "both"], default="both")
+        parser.add_argument("--url", help="Base URL of a running server to test over HTTP.")
+        parser.add_argument("--path", action="append", dest="paths",
+                            help="Path to request; repeatable. Defaults to every list page and one detail page of each kind.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per path.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--cached", action="store_true", help="Let anonymous pages come from the page cache.")
+        parser.add_argument("--host", default="localhost", help="Host header of in-process requests.")
+        parser.add_argument("--worker", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        paths = options["paths"] or default_paths()
+
+        if options["worker"]:
+            client = (WSGIClient if options["worker"] == "wsgi" else ASGIClient)(options["host"])
+            self.stdout.write(json.dumps(self.measure(client, paths, options)))
+            return
+
+        if options["url"]:
+            results = {options["url"]: self.measure(HTTPClient(options["url"]), paths, options)}
+        else:
+            servers = ["wsgi", "asgi"] if options["server"] == "both" else [options["server"]]
+            results = {server: self.spawn(server, paths, options) for server in servers}
+        self.report(paths, results)
+
+    def measure(self, client, paths, options):
+        results = {}
+        for path in paths:
+            client.run([path], 1)  # warm up connections and caches
+            seconds, samples = client.run(request_urls(path, options["requests"], options["cached"]), options["concurrency"])
+            results[path] = summarize(seconds, samples)
+        return results
+
+    def spawn(self, server, paths, options):
+        # ASYNC_VIEWS is read when settings load, so each stack gets a fresh process.
+        command = [
+            sys.executable, "-m", "django", "loadtest", "--worker", server,
+            "--requests", str(options["requests"]), "--concurrency", str(options["concurrency"]), "--host", options["host"],
+        ]
+        for path in paths:
+            command += ["--path", path]
+        if options["cached"]:
+            command.append("--cached")
+        env = {**os.environ, "ASYNC_VIEWS": "1" if server == "asgi" else "0", "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        self.stderr.write(f"Running {server}...")
+        finished = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if finished.returncode:
+            raise CommandError(f"{server} run failed:\n{finished.stderr}")
+        return json.loads(finished.stdout.strip().splitlines()[-1])
+
+    def report(self, paths, results):
+        width = max(len(path) for path in paths)
+        label = max(len(name) for name in results)
+        self.stdout.write(f"{'path':<{width}}  {'server':<{label}}  {'req/s':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  errors")
+        for path in paths:
+            for name, runs in results.items():
+                row = runs[path]
+                self.stdout.write(
+                    f"{path:<{width}}  {name:<{label}}  {row['rps']:8.1f}  {row['p50']:8.1f}  {row['p95']:8.1f}  "
+                    f"{row['p99']:8.1f}  {row['errors']}"
+                )
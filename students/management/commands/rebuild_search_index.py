@@ -0,0 +1,22 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from students import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index used by the list views from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Models to rebuild (default: all indexed models).")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        names = options["models"] or list(search.INDEXES)
+        for name in names:
+            if name not in search.INDEXES:
+                raise CommandError(f"'{name}' is not an indexed model. Choose from: {', '.join(search.INDEXES)}")
+            model = apps.get_model("students", name)
+            count = search.rebuild(model, batch_size=options["batch_size"], using=options["database"])
+            self.stdout.write(f"{name}: {count} rows indexed")
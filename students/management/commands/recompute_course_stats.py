@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students import stats
+from students.models import Course
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-course statistics summary from the enrollment table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_codes", nargs="*", help="Courses to rebuild (default: all).")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        course_ids = None
+        if options["course_codes"]:
+            codes = options["course_codes"]
+            found = dict(Course.objects.using(options["database"]).filter(course_code__in=codes).values_list("course_code", "pk"))
+            missing = sorted(set(codes) - set(found))
+            if missing:
+                raise CommandError(f"Unknown course codes: {', '.join(missing)}")
+            course_ids = list(found.values())
+        count = stats.recompute(course_ids, batch_size=options["batch_size"], using=options["database"])
+        self.stdout.write(f"Recomputed statistics for {count} courses.")
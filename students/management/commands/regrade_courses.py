@@ -0,0 +1,70 @@
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from students import grading
+from students.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Enrollment.grade from exam_score for whole courses with fixed "
+        "cutoffs or a curve (percentile or z-score within each course). "
+        "Enrollments without a score are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_codes", nargs="*", help="Courses to regrade (default: all).")
+        parser.add_argument("--scheme", choices=sorted(grading.SCHEMES), default="cutoffs")
+        parser.add_argument(
+            "--cutoffs",
+            help="e.g. A=90,B=80,C=70,D=60. Minimum score (cutoffs), minimum z-score (zscore) or "
+                 "percent of the course counted from the top (percentile); below the last grade is F.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without saving them.")
+        parser.add_argument("--show", type=int, default=20, help="Changed enrollments to list (-1 for all).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        try:
+            cutoffs = grading.parse_cutoffs(options["cutoffs"]) if options["cutoffs"] else None
+            scheme = grading.SCHEMES[options["scheme"]](cutoffs)
+        except ValueError as e:
+            raise CommandError(e)
+
+        course_ids = None
+        if options["course_codes"]:
+            codes = options["course_codes"]
+            found = dict(Course.objects.using(using).filter(course_code__in=codes).values_list("course_code", "pk"))
+            missing = sorted(set(codes) - set(found))
+            if missing:
+                raise CommandError(f"Unknown course codes: {', '.join(missing)}")
+            course_ids = list(found.values())
+
+        graded, changes = grading.regrade(
+            scheme, course_ids, dry_run=options["dry_run"], batch_size=options["batch_size"], using=using
+        )
+        self.report(scheme, graded, changes, options)
+
+    def report(self, scheme, graded, changes, options):
+        by_course = defaultdict(Counter)
+        for change in changes:
+            by_course[change.course_id][change.old or "-", change.new] += 1
+        codes = dict(Course.objects.using(options["database"]).filter(pk__in=by_course).values_list("pk", "course_code"))
+        for course_id, moves in sorted(by_course.items(), key=lambda item: codes[item[0]]):
+            summary = ", ".join(f"{old}->{new} x{count}" for (old, new), count in sorted(moves.items()))
+            self.stdout.write(f"{codes[course_id]}: {sum(moves.values())} changed ({summary})")
+
+        shown = changes if options["show"] < 0 else changes[:options["show"]]
+        for change in shown:
+            self.stdout.write(
+                f"  enrollment {change.pk} ({codes[change.course_id]}, student {change.student_id}): "
+                f"score {change.exam_score} {change.old or '-'} -> {change.new}"
+            )
+        if len(shown) < len(changes):
+            self.stdout.write(f"  ... and {len(changes) - len(shown)} more")
+
+        verb = "Would change" if options["dry_run"] else "Changed"
+        self.stdout.write(f"{verb} {len(changes)} of {graded} scored enrollments in {len(by_course)} courses ({scheme}).")
@@ -0,0 +1,70 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from students import jobs
+
+
+def work(index, options, stop, log):
+    jobs.Worker(index, using=options["database"], poll=options["poll"], burst=options["burst"], stop=stop, log=log).run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the job table with a pool of worker threads or processes. "
+        "Failed jobs are retried with a growing delay; jobs left running by a dead worker are queued again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--pool", choices=["thread", "process"], default="thread",
+            help="Threads share one process; processes suit CPU-bound tasks.",
+        )
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between checks of an empty queue.")
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due.")
+        parser.add_argument("--stale-after", type=int, default=jobs.STALE_AFTER, help="Seconds without a heartbeat before a running job is requeued.")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        requeued, failed = jobs.requeue_stale(options["stale_after"], using=using)
+        if requeued or failed:
+            self.stdout.write(f"Requeued {requeued} and failed {failed} stale jobs.")
+
+        if options["pool"] == "process":
+            context = multiprocessing.get_context("fork")
+            stop = context.Event()
+            # Children must not share the parent's SQLite connection.
+            connections.close_all()
+            workers = [context.Process(target=work, args=(i, options, stop, self.stdout.write), daemon=True) for i in range(options["workers"])]
+        else:
+            stop = threading.Event()
+            workers = [threading.Thread(target=work, args=(i, options, stop, self.stdout.write), daemon=True) for i in range(options["workers"])]
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish.")
+            stop.set()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            handlers = {signum: signal.signal(signum, shutdown) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(f"Started {options['workers']} {options['pool']} workers.")
+        try:
+            for worker in workers:
+                worker.start()
+            swept = time.monotonic()
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(options["poll"])
+                if not options["burst"] and time.monotonic() - swept > options["stale_after"] / 4:
+                    jobs.requeue_stale(options["stale_after"], using=using)
+                    swept = time.monotonic()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write("Workers stopped.")
@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the default SQLite database onto the replica file with SQLite's online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", default=None, help="Replica file (default: REPLICA_DATABASE).")
+        parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds instead of copying once.")
+        parser.add_argument("--pages", type=int, default=1024, help="Pages copied per step; writers can proceed between steps.")
+
+    def handle(self, *args, **options):
+        target = options["target"] or getattr(settings, "REPLICA_DATABASE", None)
+        if not target:
+            raise CommandError("No replica file: pass --target or set REPLICA_DATABASE.")
+        source = connections["default"]
+        if source.vendor != "sqlite":
+            raise CommandError("sync_replica only copies SQLite databases; use the database's own replication otherwise.")
+        while True:
+            start = time.perf_counter()
+            source.ensure_connection()
+            destination = sqlite3.connect(target)
+            try:
+                source.connection.backup(destination, pages=options["pages"])
+                # Read-only connections cannot open a WAL database without
+                # its -shm file, so the copy uses a rollback journal.
+                destination.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                destination.close()
+            self.stdout.write(f"Replica {target} synced in {time.perf_counter() - start:.2f}s")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from students import search
+
+INDEXED = ["student", "course", "instructor", "enrollment", "metadata"]
+
+
+def create_search_tables(apps, schema_editor):
+    search.create_tables(schema_editor.connection, INDEXED)
+
+
+def drop_search_tables(apps, schema_editor):
+    search.drop_tables(schema_editor.connection, INDEXED)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
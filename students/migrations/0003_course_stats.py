@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='students.course')),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('score_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_sq', models.FloatField(default=0)),
+                ('grade_a', models.PositiveIntegerField(default=0)),
+                ('grade_b', models.PositiveIntegerField(default=0)),
+                ('grade_c', models.PositiveIntegerField(default=0)),
+                ('grade_d', models.PositiveIntegerField(default=0)),
+                ('grade_f', models.PositiveIntegerField(default=0)),
+                ('bucket_0', models.PositiveIntegerField(default=0)),
+                ('bucket_1', models.PositiveIntegerField(default=0)),
+                ('bucket_2', models.PositiveIntegerField(default=0)),
+                ('bucket_3', models.PositiveIntegerField(default=0)),
+                ('bucket_4', models.PositiveIntegerField(default=0)),
+                ('bucket_5', models.PositiveIntegerField(default=0)),
+                ('bucket_6', models.PositiveIntegerField(default=0)),
+                ('bucket_7', models.PositiveIntegerField(default=0)),
+                ('bucket_8', models.PositiveIntegerField(default=0)),
+                ('bucket_9', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'course stats',
+            },
+        ),
+    ]
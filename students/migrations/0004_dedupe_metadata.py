@@ -0,0 +1,18 @@
+from django.db import migrations
+
+from students.interning import merge_duplicates
+
+
+def dedupe_metadata(apps, schema_editor):
+    merge_duplicates(apps.get_model("students", "Metadata"), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_course_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_metadata, migrations.RunPython.noop),
+    ]
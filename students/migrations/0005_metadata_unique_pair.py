@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0004_dedupe_metadata'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='metadata',
+            constraint=models.UniqueConstraint(fields=('key', 'value'), name='unique_metadata_key_value'),
+        ),
+    ]
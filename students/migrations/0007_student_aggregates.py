@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+from students.stats import recompute_students
+
+
+def fill_student_aggregates(apps, schema_editor):
+    recompute_students(using=schema_editor.connection.alias, student_model=apps.get_model("students", "Student"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='gpa',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='grade_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='graded_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='score_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='score_sum',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-gpa', 'last_name', 'first_name'], name='student_gpa_idx'),
+        ),
+        migrations.RunPython(fill_student_aggregates, migrations.RunPython.noop),
+    ]
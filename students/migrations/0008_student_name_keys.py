@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+from students.duplicates import fill_name_keys
+
+
+def fill_student_name_keys(apps, schema_editor):
+    fill_name_keys(student_model=apps.get_model("students", "Student"), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0007_student_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='first_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='last_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name_key', 'dob'], name='student_last_key_dob_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['first_name_key', 'dob'], name='student_first_key_dob_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['first_name_key', 'last_name_key'], name='student_name_keys_idx'),
+        ),
+        migrations.RunPython(fill_student_name_keys, migrations.RunPython.noop),
+    ]
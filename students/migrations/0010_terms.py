@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0009_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEnrollment',
+            fields=[
+                ('id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('exam_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('grade', models.CharField(blank=True, choices=[('A', 'A'), ('B', 'B'), ('C', 'C'), ('D', 'D'), ('F', 'F')], max_length=2)),
+                ('metadata', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Term',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40, unique=True)),
+                ('starts_on', models.DateField()),
+                ('ends_on', models.DateField()),
+                ('archived_at', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'ordering': ['-starts_on', '-pk'],
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='enrollment',
+            name='unique_student_course',
+        ),
+        migrations.AddField(
+            model_name='archivedenrollment',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_enrollments', to='students.course'),
+        ),
+        migrations.AddField(
+            model_name='archivedenrollment',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_enrollments', to='students.student'),
+        ),
+        migrations.AddField(
+            model_name='archivedenrollment',
+            name='term',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_enrollments', to='students.term'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='term',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='enrollments', to='students.term'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'term'), name='unique_student_course_term'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(condition=models.Q(('term__isnull', True)), fields=('student', 'course'), name='unique_student_course_no_term', violation_error_message='Enrollment with this Student and Course already exists.'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedenrollment',
+            index=models.Index(fields=['student', 'term'], name='archived_student_term_idx'),
+        ),
+    ]
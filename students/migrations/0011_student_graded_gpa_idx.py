@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_terms'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('graded_count__gt', 0)), fields=['gpa', 'graded_count'], name='student_graded_gpa_idx'),
+        ),
+    ]
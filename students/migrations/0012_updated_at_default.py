@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:18
+
+import django.utils.timezone
+import students.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0011_student_graded_gpa_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='updated_at',
+            field=students.models.UpdatedAtField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='updated_at',
+            field=students.models.UpdatedAtField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='instructor',
+            name='updated_at',
+            field=students.models.UpdatedAtField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='updated_at',
+            field=students.models.UpdatedAtField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
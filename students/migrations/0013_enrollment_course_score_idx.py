@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0012_updated_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'exam_score'], name='enrollment_course_score_idx'),
+        ),
+    ]
@@ -1,4 +1,26 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from .phonetic import soundex
+
+
+class UpdatedAtField(models.DateTimeField):
+  """
+  auto_now that fixtures can load: loaddata saves raw, skipping pre_save(),
+  so the column also defaults to the time the object was built.
+  """
+
+  def __init__(self, *args, **kwargs):
+    kwargs.setdefault("default", timezone.now)
+    kwargs.setdefault("editable", False)
+    super().__init__(*args, **kwargs)
+
+  def pre_save(self, model_instance, add):
+    value = timezone.now()
+    setattr(model_instance, self.attname, value)
+    return value
+
 
 class Metadata(models.Model):
   key=models.CharField(max_length = 100, db_index = True)
@@ -8,23 +30,75 @@ class Metadata(models.Model):
 
   class Meta:
     ordering = ['key', 'id']
+    constraints = [
+        models.UniqueConstraint(fields=["key", "value"], name="unique_metadata_key_value")
+    ]
 
   def __str__(self):
     return f"{self.key} = {self.value[:30]}"
 
+class StudentQuerySet(models.QuerySet):
+  def bulk_create(self, objs, *args, **kwargs):
+    objs = list(objs)
+    for obj in objs:
+      obj.set_name_keys()
+    return super().bulk_create(objs, *args, **kwargs)
+
+
 class Student(models.Model):
   first_name = models.CharField(max_length=80)
   last_name = models.CharField(max_length=80)
   email = models.EmailField(unique=True)
   dob = models.DateField()
+  # Soundex of each name, the blocking keys of duplicate detection
+  # (students/duplicates.py). Set on save() and bulk_create().
+  first_name_key = models.CharField(max_length=4, blank=True, editable=False)
+  last_name_key = models.CharField(max_length=4, blank=True, editable=False)
   metadata = models.ManyToManyField(Metadata, blank=True, related_name='students')
+  updated_at = UpdatedAtField()
+  # Running totals over the student's enrollments, kept current from the
+  # Enrollment signals (see students/stats.py). gpa is stored rather than
+  # derived so the student list can be sorted on an index.
+  enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+  graded_count = models.PositiveIntegerField(default=0, editable=False)
+  grade_points = models.PositiveIntegerField(default=0, editable=False)
+  score_count = models.PositiveIntegerField(default=0, editable=False)
+  score_sum = models.FloatField(default=0, editable=False)
+  gpa = models.FloatField(default=0, editable=False)
 
   class Meta:
-    indexes = [models.Index(fields=['last_name', "first_name"])]
+    indexes = [
+      models.Index(fields=['last_name', "first_name"]),
+      models.Index(fields=["-gpa", "last_name", "first_name"], name="student_gpa_idx"),
+      # Graded students only: class rank is COUNTs over ranges of it (students/ranking.py).
+      models.Index(fields=["gpa", "graded_count"], condition=models.Q(graded_count__gt=0), name="student_graded_gpa_idx"),
+      models.Index(fields=["last_name_key", "dob"], name="student_last_key_dob_idx"),
+      models.Index(fields=["first_name_key", "dob"], name="student_first_key_dob_idx"),
+      models.Index(fields=["first_name_key", "last_name_key"], name="student_name_keys_idx"),
+    ]
+
+  objects = StudentQuerySet.as_manager()
 
   def __str__(self):
     return f"{self.first_name} {self.last_name}"
 
+  def save(self, *args, **kwargs):
+    self.set_name_keys()
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and {"first_name", "last_name"} & set(update_fields):
+      kwargs["update_fields"] = {*update_fields, "first_name_key", "last_name_key"}
+    super().save(*args, **kwargs)
+
+  def set_name_keys(self):
+    self.first_name_key = soundex(self.first_name)
+    self.last_name_key = soundex(self.last_name)
+
+  @property
+  def mean_score(self):
+    if not self.score_count:
+      return None
+    return self.score_sum / self.score_count
+
 
 
 class Course(models.Model):
@@ -32,6 +106,7 @@ class Course(models.Model):
   course_code = models.CharField(max_length=20, unique=True)
   description = models.TextField(blank=True)
   metadata  = models.ManyToManyField(Metadata, blank=True, related_name='courses')
+  updated_at = UpdatedAtField()
 
   class Meta:
     indexes = [models.Index(fields=['course_code'])]
@@ -45,10 +120,41 @@ class Instructor(models.Model):
     email = models.EmailField(unique=True)
     courses = models.ManyToManyField(Course, blank=True, related_name="instructors")
     metadata = models.ManyToManyField(Metadata, blank=True, related_name="instructors")
+    updated_at = UpdatedAtField()
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class TermQuerySet(models.QuerySet):
+    def current(self):
+        """The term running today, else the latest one to have started; None if there is none."""
+        today = timezone.localdate()
+        running = models.Case(models.When(ends_on__gte=today, then=models.Value(1)), default=models.Value(0))
+        return self.filter(starts_on__lte=today).order_by(running.desc(), "-starts_on", "-pk").first()
+
+
+class Term(models.Model):
+    # Enrollments belong to a term. Once a term has ended its enrollments
+    # can be moved to ArchivedEnrollment (manage.py archive_term), keeping
+    # the enrollment table, its indexes and the statistics to recent terms.
+    name = models.CharField(max_length=40, unique=True)
+    starts_on = models.DateField()
+    ends_on = models.DateField()
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = TermQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-starts_on", "-pk"]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def closed(self):
+        return self.ends_on < timezone.localdate()
+
+
 class Enrollment(models.Model):
   GRADE_CHOICES = [
         ("A", "A"),
@@ -61,17 +167,187 @@ class Enrollment(models.Model):
   course= models.ForeignKey(Course, on_delete= models.CASCADE , related_name= 'enrollments')
   exam_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
   grade = models.CharField(max_length=2, choices=GRADE_CHOICES, blank=True)
+  term = models.ForeignKey(Term, on_delete=models.PROTECT, null=True, blank=True, related_name="enrollments")
   metadata = models.ManyToManyField(Metadata, blank=True, related_name="enrollments")
+  updated_at = UpdatedAtField()
 
   class Meta:
+        indexes = [
+            # A course's scores in order: course rank and top N (students/ranking.py).
+            models.Index(fields=["course", "exam_score"], name="enrollment_course_score_idx"),
+        ]
         constraints = [
-            models.UniqueConstraint(fields=["student", "course"], name="unique_student_course")
+            models.UniqueConstraint(fields=["student", "course", "term"], name="unique_student_course_term"),
+            # NULLs never compare equal, so enrollments without a term need their own constraint.
+            models.UniqueConstraint(fields=["student", "course"], condition=models.Q(term__isnull=True), name="unique_student_course_no_term",
+                                    violation_error_message="Enrollment with this Student and Course already exists."),
         ]
 
   def __str__(self):
         return f"{self.student} in {self.course}"
 
+  def metadata_list(self):
+        return self.metadata.all()
+
 
+class CourseStats(models.Model):
+    # Running totals over a course's enrollments, kept current from the
+    # Enrollment signals (see students/stats.py) so the course page never
+    # has to aggregate the enrollment table.
+    BUCKET_WIDTH = 10
+    BUCKETS = 10
 
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    enrollment_count = models.PositiveIntegerField(default=0)
+    score_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_sq = models.FloatField(default=0)
+    grade_a = models.PositiveIntegerField(default=0)
+    grade_b = models.PositiveIntegerField(default=0)
+    grade_c = models.PositiveIntegerField(default=0)
+    grade_d = models.PositiveIntegerField(default=0)
+    grade_f = models.PositiveIntegerField(default=0)
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "course stats"
+
+    def __str__(self):
+        return f"Stats for {self.course_id}"
+
+    @classmethod
+    def bucket_for(cls, score):
+        return min(max(int(score // cls.BUCKET_WIDTH), 0), cls.BUCKETS - 1)
+
+    @property
+    def mean(self):
+        if not self.score_count:
+            return None
+        return self.score_sum / self.score_count
+
+    @property
+    def stddev(self):
+        if not self.score_count:
+            return None
+        variance = self.score_sum_sq / self.score_count - self.mean ** 2
+        return max(variance, 0) ** 0.5
+
+    @property
+    def median(self):
+        # Interpolated from the score buckets, so accurate to within a bucket.
+        if not self.score_count:
+            return None
+        half = self.score_count / 2
+        seen = 0
+        for i, count in enumerate(self.score_buckets()):
+            if count and seen + count >= half:
+                return self.BUCKET_WIDTH * (i + (half - seen) / count)
+            seen += count
+
+    @property
+    def graded_count(self):
+        return sum(count for _, count in self.grade_distribution())
+
+    @property
+    def pass_rate(self):
+        graded = self.graded_count
+        if not graded:
+            return None
+        return (graded - self.grade_f) / graded
+
+    def grade_distribution(self):
+        return [(grade, getattr(self, f"grade_{grade.lower()}")) for grade, _ in Enrollment.GRADE_CHOICES]
+
+    def score_buckets(self):
+        return [getattr(self, f"bucket_{i}") for i in range(self.BUCKETS)]
+
+    def score_distribution(self):
+        labels = [f"{i * self.BUCKET_WIDTH}-{(i + 1) * self.BUCKET_WIDTH}" for i in range(self.BUCKETS)]
+        return list(zip(labels, self.score_buckets()))
+
+
+class ArchivedEnrollment(models.Model):
+    # An enrollment of an archived term, moved out of the enrollment table
+    # by students/archive.py under its original id. Read-only: no
+    # updated_at or search document, and its metadata is copied as
+    # [key, value] pairs instead of links. Still counted in the student
+    # aggregates (GPA); CourseStats covers live enrollments only.
+    id = models.PositiveBigIntegerField(primary_key=True)
+    term = models.ForeignKey(Term, on_delete=models.PROTECT, related_name="archived_enrollments")
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="archived_enrollments")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="archived_enrollments")
+    exam_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    grade = models.CharField(max_length=2, choices=Enrollment.GRADE_CHOICES, blank=True)
+    metadata = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        # The term index comes with the foreign key; archives are read per student or per course.
+        indexes = [models.Index(fields=["student", "term"], name="archived_student_term_idx")]
+
+    def __str__(self):
+        return f"{self.student} in {self.course} ({self.term})"
+
+    def metadata_list(self):
+        return [Metadata(key=key, value=value) for key, value in self.metadata]
+
+
+class Job(models.Model):
+    # A unit of background work, run by `manage.py run_workers` (see
+    # students/jobs.py). The table is the queue: workers claim the oldest
+    # due row with a conditional UPDATE, so no broker is needed.
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-pk"]
+        indexes = [models.Index(fields=["status", "run_after"], name="job_queue_idx")]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
 
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
 
+    @property
+    def percent(self):
+        if self.status == self.DONE:
+            return 100
+        if not self.total:
+            return None
+        return min(100 * self.progress // self.total, 100)
@@ -0,0 +1,162 @@
+import base64
+import binascii
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, values = json.loads(data)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ("n", "p") or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+def resolve(obj, path):
+    for attr in path.split("__"):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor if has_next else None
+        self.previous_cursor = previous_cursor if has_previous else None
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over an ordered queryset. Instead of OFFSET and COUNT(*),
+    each page filters on the ordering values of the last row seen, so every
+    page costs the same as the first one.
+
+    The primary key is appended to the ordering as a tie-breaker, so the
+    ordering must otherwise consist of non-null values.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.per_page = int(per_page)
+        self.ordering = [f for f in ordering if f not in ("pk", "-pk")] + ["pk"]
+        self.queryset = queryset.order_by(*self.ordering)
+
+    def _fields(self):
+        return [(f.lstrip("-"), f.startswith("-")) for f in self.ordering]
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        model, field = self.queryset.model, None
+        for part in name.split("__"):
+            field = model._meta.pk if part == "pk" else model._meta.get_field(part)
+            model = field.related_model or model
+        return field
+
+    def _clean(self, values):
+        # Cursors come from the client: each value must convert to its
+        # ordering field's type, or the filter fails only when it runs.
+        fields = self._fields()
+        if len(values) != len(fields) or None in values:
+            raise InvalidCursor(values)
+        try:
+            return [self._field(name).to_python(value) for (name, _), value in zip(fields, values)]
+        except (FieldDoesNotExist, ValidationError, ValueError, TypeError):
+            raise InvalidCursor(values)
+
+    def _seek(self, values, forward):
+        # (a, b, pk) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        fields = self._fields()
+        values = self._clean(values)
+        clauses = []
+        for i, (name, descending) in enumerate(fields):
+            op = "gt" if forward != descending else "lt"
+            cond = Q(**{f"{name}__{op}": values[i]})
+            for j in range(i):
+                cond &= Q(**{fields[j][0]: values[j]})
+            clauses.append(cond)
+        return reduce(lambda a, b: a | b, clauses)
+
+    def _values(self, obj):
+        if isinstance(obj, dict):
+            # values() querysets: the ordering fields must be among the keys.
+            return [obj[name] for name, _ in self._fields()]
+        return [resolve(obj, name) for name, _ in self._fields()]
+
+    def cursor_at(self, offset):
+        """Cursor of the page that starts after the first offset rows."""
+        return encode_cursor("n", self._values(self.queryset[offset - 1]))
+
+    def page(self, cursor=None):
+        qs, forward, values = self._query(cursor)
+        return self._page(list(qs), forward, values)
+
+    async def apage(self, cursor=None):
+        qs, forward, values = self._query(cursor)
+        return self._page([row async for row in qs], forward, values)
+
+    def _query(self, cursor):
+        qs = self.queryset
+        direction, values = decode_cursor(cursor) if cursor else ("n", None)
+        forward = direction == "n"
+        if values is not None:
+            qs = qs.filter(self._seek(values, forward))
+        if not forward:
+            qs = qs.reverse()
+        # One extra row tells whether there is a further page.
+        return qs[: self.per_page + 1], forward, values
+
+    def _page(self, rows, forward, values):
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        next_cursor = encode_cursor("n", self._values(rows[-1])) if rows else None
+        previous_cursor = encode_cursor("p", self._values(rows[0])) if rows else None
+        return KeysetPage(rows, self, has_next, has_previous, next_cursor, previous_cursor)
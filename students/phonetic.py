@@ -0,0 +1,29 @@
+import unicodedata
+
+CODES = {
+    letter: digit
+    for digit, letters in {"1": "BFPV", "2": "CGJKQSXZ", "3": "DT", "4": "L", "5": "MN", "6": "R"}.items()
+    for letter in letters
+}
+
+
+def soundex(name):
+    """
+    American Soundex of a name: its first letter and three digits, so names
+    that sound alike ("Adhikari", "Adhikary") share a code. Accents are
+    dropped and anything but letters ignored; "" if there are no letters.
+    """
+    letters = [c for c in unicodedata.normalize("NFKD", name).upper() if "A" <= c <= "Z"]
+    if not letters:
+        return ""
+    code, last = letters[0], CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = CODES.get(letter, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code; vowels do.
+        if letter not in "HW":
+            last = digit
+    return code.ljust(4, "0")
@@ -0,0 +1,87 @@
+from django.db.models import F, Func, IntegerField, Subquery
+
+from . import caching
+from .models import CourseStats, Enrollment, Student
+
+# Seconds a cohort size is kept. It is also keyed by the Student and
+# Enrollment generations, so any write that could change it starts a new count.
+COHORT_SIZE_TIMEOUT = 300
+
+
+def _count(queryset):
+    # COUNT(*) as a scalar subquery, so several counts share one query.
+    count = Func(F("pk"), function="COUNT", output_field=IntegerField())
+    return Subquery(queryset.order_by().annotate(n=count).values("n")[:1])
+
+
+def _standing(above, tied, of):
+    below = of - above - tied
+    return {"rank": above + 1, "of": of, "percentile": 100 * (below + tied / 2) / of}
+
+
+def cohort_size_key(using):
+    generations = ".".join(str(g) for g in caching.generations([Student, Enrollment]))
+    return f"rank:cohort:{using or 'default'}:{generations}"
+
+
+def standing(student, using=None):
+    """
+    {'rank', 'of', 'percentile'} of a student among those with a graded
+    enrollment, by GPA, or None if it has none. Tied GPAs share a rank; the
+    percentile counts ties as half.
+
+    SQL indexes keep no subtree counts, so a rank cannot be read off one in
+    O(log n): the students above and level with this one are two COUNTs
+    over ranges of student_graded_gpa_idx, in one query that reads no rows.
+    The cohort size, which would be a count of the whole index, is cached
+    per Student and Enrollment generation and only counted, in the same
+    query, on a miss.
+    """
+    if not student.graded_count:
+        return None
+    graded = Student.objects.using(using).filter(graded_count__gt=0)
+    key = cohort_size_key(using)
+    cache = caching.get_cache()
+    counts = {"above": _count(graded.filter(gpa__gt=student.gpa)), "tied": _count(graded.filter(gpa=student.gpa))}
+    of = cache.get(key)
+    if of is None:
+        counts["of"] = _count(graded)
+    row = graded.filter(pk=student.pk).values(**counts).first()
+    if row is None:
+        return None
+    if of is None:
+        of = row["of"]
+        cache.set(key, of, COHORT_SIZE_TIMEOUT)
+    return _standing(row["above"], row["tied"], of)
+
+
+def course_standing(enrollment, using=None):
+    """
+    standing() of an enrollment within its course, by exam score, or None
+    if it has no score. The course size is CourseStats.score_count, which
+    the Enrollment signals keep current, so only the two range COUNTs over
+    enrollment_course_score_idx are run.
+    """
+    if enrollment.exam_score is None:
+        return None
+    scored = Enrollment.objects.using(using).filter(course_id=enrollment.course_id)
+    row = CourseStats.objects.using(using).filter(course_id=enrollment.course_id).values(
+        "score_count",
+        above=_count(scored.filter(exam_score__gt=enrollment.exam_score)),
+        tied=_count(scored.filter(exam_score=enrollment.exam_score)),
+    ).first()
+    if not row or not row["score_count"]:
+        return None
+    return _standing(row["above"], row["tied"], row["score_count"])
+
+
+def top(n, course=None, using=None):
+    """
+    The n best: students by GPA, or with a course, its scored enrollments
+    (student loaded) by exam score. Either is read in index order, so the
+    cost is O(log n + n) whatever the size of the scope.
+    """
+    if course is None:
+        return list(Student.objects.using(using).filter(graded_count__gt=0).order_by("-gpa", "last_name", "first_name")[:n])
+    scored = Enrollment.objects.using(using).filter(course=course, exam_score__isnull=False)
+    return list(scored.select_related("student").order_by("-exam_score", "-pk")[:n])
@@ -0,0 +1,237 @@
+import re
+from itertools import groupby
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .filters import relation_q
+
+# Search documents per model: the lookups whose values are concatenated into
+# one indexed body. Related lookups are followed so that e.g. an enrollment
+# is found by its student's name.
+INDEXES = {
+    "student": ["first_name", "last_name", "email"],
+    "course": ["course_name", "course_code"],
+    "instructor": ["first_name", "last_name", "email", "courses__course_name", "courses__course_code"],
+    "enrollment": ["student__first_name", "student__last_name", "course__course_code", "exam_score", "grade"],
+    "metadata": ["key", "value"],
+}
+
+# Models whose documents embed fields of another model, as
+# (indexed model, lookup back to the changed object).
+DEPENDENTS = {
+    "student": [("enrollment", "student")],
+    "course": [("enrollment", "course"), ("instructor", "courses")],
+}
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def index_table(model):
+    return f"students_fts_{model._meta.model_name}"
+
+
+def is_indexed(model):
+    return model._meta.model_name in INDEXES
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SQLiteBackend:
+    # FTS5 virtual table keyed by rowid = primary key, ranked with bm25.
+    def create_table(self, cursor, table):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+            f"USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_table(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def clear(self, cursor, table):
+        cursor.execute(f"DELETE FROM {table}")
+
+    def delete(self, cursor, table, pks):
+        cursor.executemany(f"DELETE FROM {table} WHERE rowid = %s", [(pk,) for pk in pks])
+
+    def insert(self, cursor, table, rows):
+        cursor.executemany(f"INSERT INTO {table} (rowid, body) VALUES (%s, %s)", rows)
+
+    def build_query(self, terms):
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def match_sql(self, table):
+        return f"SELECT rowid FROM {table} WHERE {table} MATCH %s"
+
+    def rank_sql(self, table, outer_pk):
+        return f"SELECT rank FROM {table} WHERE {table} MATCH %s AND rowid = {outer_pk}"
+
+
+class PostgresBackend:
+    # Plain table holding a GIN-indexed tsvector, ranked with ts_rank.
+    def create_table(self, cursor, table):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (id bigint PRIMARY KEY, body tsvector NOT NULL)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_body ON {table} USING gin (body)")
+
+    def drop_table(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def clear(self, cursor, table):
+        cursor.execute(f"TRUNCATE {table}")
+
+    def delete(self, cursor, table, pks):
+        cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s)", [list(pks)])
+
+    def insert(self, cursor, table, rows):
+        cursor.executemany(
+            f"INSERT INTO {table} (id, body) VALUES (%s, to_tsvector('simple', %s)) "
+            f"ON CONFLICT (id) DO UPDATE SET body = EXCLUDED.body",
+            rows,
+        )
+
+    def build_query(self, terms):
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def match_sql(self, table):
+        return f"SELECT id FROM {table} WHERE body @@ to_tsquery('simple', %s)"
+
+    def rank_sql(self, table, outer_pk):
+        return f"SELECT -ts_rank(body, to_tsquery('simple', %s)) FROM {table} WHERE id = {outer_pk}"
+
+
+BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "postgresql": PostgresBackend,
+}
+
+
+def get_backend(connection):
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def create_tables(connection, models):
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for name in models:
+            backend.create_table(cursor, f"students_fts_{name}")
+
+
+def drop_tables(connection, models):
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for name in models:
+            backend.drop_table(cursor, f"students_fts_{name}")
+
+
+def document_rows(queryset, chunk_size=2000):
+    """Yield (pk, body) for every object in the queryset, one query in total."""
+    fields = INDEXES[queryset.model._meta.model_name]
+    rows = queryset.order_by("pk").values_list("pk", *fields).iterator(chunk_size=chunk_size)
+    for pk, group in groupby(rows, key=lambda row: row[0]):
+        words = []
+        for row in group:
+            for value in row[1:]:
+                if value not in (None, "") and str(value) not in words:
+                    words.append(str(value))
+        yield pk, " ".join(words)
+
+
+def index_objects(model, pks, using="default"):
+    pks = list(pks)
+    backend = get_backend(connections[using])
+    if backend is None or not pks or not is_indexed(model):
+        return
+    table = index_table(model)
+    rows = list(document_rows(model._default_manager.using(using).filter(pk__in=pks)))
+    with connections[using].cursor() as cursor:
+        backend.delete(cursor, table, pks)
+        backend.insert(cursor, table, rows)
+
+
+def dependent_pks(instance, using="default"):
+    """Return [(model, pks)] of documents that embed fields of instance."""
+    result = []
+    for model_name, lookup in DEPENDENTS.get(instance._meta.model_name, []):
+        model = apps.get_model("students", model_name)
+        pks = list(model._default_manager.using(using).filter(**{lookup: instance}).values_list("pk", flat=True))
+        result.append((model, pks))
+    return result
+
+
+def remove_objects(model, pks, using="default"):
+    pks = list(pks)
+    backend = get_backend(connections[using])
+    if backend is None or not pks or not is_indexed(model):
+        return
+    with connections[using].cursor() as cursor:
+        backend.delete(cursor, index_table(model), pks)
+
+
+def rebuild(model, batch_size=2000, using="default"):
+    """Recreate the index of one model from scratch. Returns the row count."""
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    table = index_table(model)
+    count = 0
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        backend.create_table(cursor, table)
+        backend.clear(cursor, table)
+        batch = []
+        for row in document_rows(model._default_manager.using(using).all(), chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                backend.insert(cursor, table, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            backend.insert(cursor, table, batch)
+            count += len(batch)
+    return count
+
+
+def icontains_filter(queryset, q, search_fields):
+    cond = Q()
+    for f in search_fields:
+        if not f:
+            continue
+        if "__" in f:
+            cond |= relation_q(queryset.model, f, q)
+        else:
+            cond |= Q(**{f"{f}__icontains": q})
+    return queryset.filter(cond)
+
+
+def search(queryset, q, search_fields):
+    """
+    Filter the queryset to objects matching every word of q as a prefix and
+    annotate it with `search_rank` (lower is better). Databases without a
+    full-text backend fall back to icontains over search_fields.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    backend = get_backend(connection)
+    if backend is None or not is_indexed(model):
+        return icontains_filter(queryset, q, search_fields)
+
+    terms = tokenize(q)
+    if not terms:
+        return queryset.none()
+
+    expr = backend.build_query(terms)
+    table = index_table(model)
+    qn = connection.ops.quote_name
+    outer_pk = f"{qn(model._meta.db_table)}.{qn(model._meta.pk.column)}"
+    return queryset.filter(pk__in=RawSQL(backend.match_sql(table), (expr,))).annotate(
+        search_rank=RawSQL(backend.rank_sql(table, outer_pk), (expr,), output_field=FloatField())
+    )
@@ -0,0 +1,172 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, interning, search, stats
+from .models import ArchivedEnrollment, Course, CourseStats, Enrollment, Instructor, Metadata, Student, Term
+
+INDEXED_MODELS = (Student, Course, Instructor, Enrollment, Metadata)
+
+
+# Search index
+def index_on_save(sender, instance, using, **kwargs):
+    search.index_objects(sender, [instance.pk], using)
+    for model, pks in search.dependent_pks(instance, using):
+        search.index_objects(model, pks, using)
+
+
+def collect_dependents_on_delete(sender, instance, using, **kwargs):
+    instance._search_dependents = search.dependent_pks(instance, using)
+
+
+def unindex_on_delete(sender, instance, using, **kwargs):
+    search.remove_objects(sender, [instance.pk], using)
+    for model, pks in getattr(instance, "_search_dependents", []):
+        search.index_objects(model, pks, using)
+
+
+# Connected per model: receivers without a sender would disable Django's
+# fast delete path for every model in the project.
+for model in INDEXED_MODELS:
+    post_save.connect(index_on_save, sender=model, dispatch_uid=f"search_index_{model.__name__}")
+    post_delete.connect(unindex_on_delete, sender=model, dispatch_uid=f"search_unindex_{model.__name__}")
+    if model._meta.model_name in search.DEPENDENTS:
+        pre_delete.connect(collect_dependents_on_delete, sender=model, dispatch_uid=f"search_dependents_{model.__name__}")
+
+
+@receiver(m2m_changed, sender=Instructor.courses.through)
+def index_on_instructor_courses(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            search.index_objects(Instructor, [instance.pk], using)
+    elif action == "pre_clear":
+        instance._search_cleared = list(instance.instructors.values_list("pk", flat=True))
+    elif action == "post_clear":
+        search.index_objects(Instructor, getattr(instance, "_search_cleared", []), using)
+    elif action in ("post_add", "post_remove"):
+        search.index_objects(Instructor, pk_set, using)
+
+
+# Course statistics
+@receiver(pre_save, sender=Enrollment)
+def snapshot_enrollment_stats(sender, instance, using, **kwargs):
+    instance._stats_before = instance._student_before = None
+    if instance.pk:
+        row = (
+            Enrollment.objects.using(using).filter(pk=instance.pk)
+            .values_list("course_id", "exam_score", "grade", "student_id").first()
+        )
+        if row:
+            instance._stats_before, instance._student_before = row[:3], row[3]
+
+
+@receiver(post_save, sender=Enrollment)
+def update_course_stats_on_save(sender, instance, using, **kwargs):
+    after = (instance.course_id, instance.exam_score, instance.grade)
+    stats.record(getattr(instance, "_stats_before", None), after, using=using)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_course_stats_on_delete(sender, instance, using, **kwargs):
+    stats.record(before=(instance.course_id, instance.exam_score, instance.grade), using=using)
+
+
+# Student aggregates (gpa, counts, mean score)
+@receiver(post_save, sender=Enrollment)
+def update_student_stats_on_save(sender, instance, using, **kwargs):
+    before = getattr(instance, "_stats_before", None)
+    if before:
+        before = (instance._student_before, *before[1:])
+    stats.record_student(before, (instance.student_id, instance.exam_score, instance.grade), using=using)
+
+
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_delete, sender=ArchivedEnrollment)
+def update_student_stats_on_delete(sender, instance, using, **kwargs):
+    stats.record_student(before=(instance.student_id, instance.exam_score, instance.grade), using=using)
+
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        CourseStats.objects.using(using).get_or_create(course=instance)
+
+
+# Metadata interning
+@receiver(post_save, sender=Metadata)
+@receiver(post_delete, sender=Metadata)
+def forget_interned_pair(sender, instance, using, **kwargs):
+    interning.cache.discard_pk(using, instance.pk)
+
+
+# Page cache generations
+CACHED_MODELS = (Student, Course, Instructor, Enrollment, Metadata, Term)
+
+
+def bump_on_write(sender, using, **kwargs):
+    caching.bump(sender, using=using)
+
+
+def bump_on_m2m_change(sender, instance, action, model, using, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        caching.bump(type(instance), model, using=using)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(bump_on_write, sender=model, dispatch_uid=f"page_cache_save_{model.__name__}")
+    post_delete.connect(bump_on_write, sender=model, dispatch_uid=f"page_cache_delete_{model.__name__}")
+    for field in model._meta.local_many_to_many:
+        m2m_changed.connect(bump_on_m2m_change, sender=field.remote_field.through, dispatch_uid=f"page_cache_m2m_{model.__name__}_{field.name}")
+
+
+# Modification timestamps: parents are touched with a plain UPDATE when a
+# child enrollment or a metadata link changes, so the ETag/Last-Modified of
+# their pages moves even when rows are only removed.
+def touch(model, pks, using):
+    pks = {pk for pk in pks if pk is not None}
+    if pks:
+        model.objects.using(using).filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def touch_enrollment_parents(sender, instance, using, **kwargs):
+    before = getattr(instance, "_stats_before", None)
+    touch(Student, [instance.student_id, getattr(instance, "_student_before", None)], using)
+    touch(Course, [instance.course_id, before[0] if before else None], using)
+
+
+@receiver(post_delete, sender=ArchivedEnrollment)
+def touch_archived_enrollment_student(sender, instance, using, **kwargs):
+    # Archived enrollments only show on the student's page.
+    touch(Student, [instance.student_id], using)
+
+
+def touch_on_m2m_change(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    owner = instance if not reverse else None
+    if owner is not None:
+        if action in ("post_add", "post_remove", "post_clear"):
+            touch(type(owner), [owner.pk], using)
+        return
+    # Reverse side (e.g. metadata.students.add(...)): the owners are in pk_set.
+    field = next(f for f in model._meta.local_many_to_many if f.remote_field.through is sender)
+    if action == "pre_clear":
+        instance._touch_cleared = list(model.objects.using(using).filter(**{field.name: instance}).values_list("pk", flat=True))
+    elif action == "post_clear":
+        touch(model, getattr(instance, "_touch_cleared", []), using)
+    elif action in ("post_add", "post_remove"):
+        touch(model, pk_set, using)
+
+
+for model in CACHED_MODELS:
+    for field in model._meta.local_many_to_many:
+        m2m_changed.connect(touch_on_m2m_change, sender=field.remote_field.through, dispatch_uid=f"touch_m2m_{model.__name__}_{field.name}")
+
+
+@receiver(pre_delete, sender=Metadata)
+@receiver(pre_delete, sender=Course)
+def touch_m2m_owners_on_delete(sender, instance, using, **kwargs):
+    # Cascaded M2M rows are removed without m2m_changed.
+    for rel in sender._meta.related_objects:
+        if rel.many_to_many:
+            rel.related_model.objects.using(using).filter(**{rel.field.name: instance}).update(updated_at=timezone.now())
@@ -0,0 +1,75 @@
+// Turns <select data-autocomplete-url> into a search box. The select only
+// holds the chosen options; matches are fetched as the user types.
+$(function () {
+  $("select[data-autocomplete-url]").each(function () {
+    var $select = $(this);
+    var url = $select.data("autocomplete-url");
+    var multiple = $select.prop("multiple");
+    var $wrap = $('<div class="position-relative mb-2"></div>');
+    var $chips = $('<div class="d-flex flex-wrap gap-2 mb-2"></div>');
+    var $input = $('<input type="search" class="form-control" autocomplete="off" placeholder="Search...">');
+    var $menu = $('<div class="list-group position-absolute w-100 shadow-sm" style="z-index:1000"></div>').hide();
+    var timer = null;
+    var request = null;
+
+    function renderChips() {
+      $chips.empty();
+      $select.find("option:selected").each(function () {
+        var $option = $(this);
+        if (!$option.val()) {
+          return;
+        }
+        var $chip = $('<span class="badge rounded-pill text-bg-info"></span>').text($option.text());
+        var $remove = $('<button type="button" class="btn-close btn-close-white ms-2" aria-label="Remove"></button>');
+        $remove.css("font-size", "0.6em").on("click", function () {
+          $option.remove();
+          renderChips();
+        });
+        $chips.append($chip.append($remove));
+      });
+    }
+
+    function choose(item) {
+      if (!multiple) {
+        $select.find("option").filter(function () { return this.value; }).remove();
+      }
+      if (!$select.find('option[value="' + item.id + '"]').length) {
+        $select.append($("<option>").val(item.id).text(item.text));
+      }
+      $select.find('option[value="' + item.id + '"]').prop("selected", true);
+      $input.val("");
+      $menu.hide();
+      renderChips();
+    }
+
+    function lookup() {
+      if (request) {
+        request.abort();
+      }
+      request = $.getJSON(url, { q: $input.val() }, function (data) {
+        $menu.empty();
+        $.each(data.results, function (_, item) {
+          $('<button type="button" class="list-group-item list-group-item-action"></button>')
+            .text(item.text)
+            .on("mousedown", function (e) {
+              e.preventDefault();
+              choose(item);
+            })
+            .appendTo($menu);
+        });
+        $menu.toggle(data.results.length > 0);
+      });
+    }
+
+    $input.on("input focus", function () {
+      clearTimeout(timer);
+      timer = setTimeout(lookup, 200);
+    });
+    $input.on("blur", function () {
+      $menu.hide();
+    });
+
+    $select.addClass("d-none").after($wrap.append($chips, $input, $menu));
+    renderChips();
+  });
+});
@@ -0,0 +1,44 @@
+// Draws <canvas data-chart-url data-chart="..."> once the page has loaded,
+// from the pre-aggregated series the chart endpoints return.
+$(window).on("load", function () {
+  var colors = {
+    backgroundColor: "rgba(54, 162, 235, 0.6)",
+    borderColor: "rgba(54, 162, 235, 1)",
+    borderWidth: 1
+  };
+
+  var builders = {
+    history: function (data) {
+      return {
+        labels: data.history.labels,
+        datasets: [$.extend({ label: "Exam Score", data: data.history.scores }, colors)],
+        options: { scales: { y: { beginAtZero: true, max: 100 } } }
+      };
+    },
+    histogram: function (data) {
+      return {
+        labels: data.histogram.labels,
+        datasets: [$.extend({ label: "Students", data: data.histogram.counts }, colors)],
+        options: { scales: { y: { beginAtZero: true, ticks: { precision: 0 } } } }
+      };
+    }
+  };
+
+  $("canvas[data-chart-url]").each(function () {
+    var canvas = this;
+    var build = builders[$(canvas).data("chart")];
+    $.getJSON($(canvas).data("chart-url")).done(function (data) {
+      var chart = build(data);
+      if (!chart.labels.length) {
+        $(canvas).replaceWith('<p class="text-muted mb-0">No scores yet.</p>');
+        return;
+      }
+      chart.options.plugins = { legend: { display: false } };
+      new Chart(canvas.getContext("2d"), {
+        type: "bar",
+        data: { labels: chart.labels, datasets: chart.datasets },
+        options: chart.options
+      });
+    });
+  });
+});
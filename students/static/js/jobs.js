@@ -0,0 +1,22 @@
+// Follows a queued or running job on its page and reloads once it has
+// finished, so the result and any download link appear.
+$(function () {
+  var card = $("[data-job-status-url]");
+  if (!card.length) {
+    return;
+  }
+  var poll = function () {
+    $.getJSON(card.data("job-status-url")).done(function (job) {
+      if (job.finished) {
+        window.location.reload();
+        return;
+      }
+      card.find("[data-job-status]").text(job.status.charAt(0).toUpperCase() + job.status.slice(1));
+      card.find("[data-job-bar]").css("width", (job.percent || 0) + "%").text(job.percent === null ? "" : job.percent + "%");
+      card.find("[data-job-progress]").text(job.progress + (job.total === null ? "" : " of " + job.total));
+      card.find("[data-job-message]").text(job.message);
+      setTimeout(poll, 2000);
+    });
+  };
+  setTimeout(poll, 2000);
+});
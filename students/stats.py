@@ -0,0 +1,186 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from . import caching
+from .models import Course, CourseStats, Enrollment, Student
+
+GRADE_FIELDS = {grade: f"grade_{grade.lower()}" for grade, _ in Enrollment.GRADE_CHOICES}
+STAT_FIELDS = (
+    ["enrollment_count", "score_count", "score_sum", "score_sum_sq"]
+    + list(GRADE_FIELDS.values())
+    + [f"bucket_{i}" for i in range(CourseStats.BUCKETS)]
+)
+
+
+def contribution(exam_score, grade):
+    """The amounts one enrollment adds to its course's CourseStats row."""
+    delta = {"enrollment_count": 1}
+    if exam_score is not None:
+        score = float(exam_score)
+        delta["score_count"] = 1
+        delta["score_sum"] = score
+        delta["score_sum_sq"] = score * score
+        delta[f"bucket_{CourseStats.bucket_for(score)}"] = 1
+    if grade in GRADE_FIELDS:
+        delta[GRADE_FIELDS[grade]] = 1
+    return delta
+
+
+def apply(course_id, exam_score, grade, sign, using="default"):
+    """
+    Add (sign=1) or remove (sign=-1) one enrollment's contribution with a
+    single atomic UPDATE. Returns False if the course has no stats row yet.
+    """
+    delta = contribution(exam_score, grade)
+    return bool(CourseStats.objects.using(using).filter(course_id=course_id).update(
+        **{field: F(field) + sign * value for field, value in delta.items()}
+    ))
+
+
+def record(before=None, after=None, using="default"):
+    """
+    Move one enrollment's contribution from its old (course_id, exam_score,
+    grade) to its new one. A missing row is built by a full recompute,
+    which already reflects the current table; a missing row on the old side
+    is left for get_stats() to build when it is next needed.
+    """
+    if before:
+        apply(*before, sign=-1, using=using)
+    if after and not apply(*after, sign=1, using=using):
+        recompute([after[0]], using=using)
+
+
+def _bucket_q(i):
+    lo, hi = i * CourseStats.BUCKET_WIDTH, (i + 1) * CourseStats.BUCKET_WIDTH
+    if i == 0:
+        return Q(exam_score__lt=hi)
+    if i == CourseStats.BUCKETS - 1:
+        return Q(exam_score__gte=lo)
+    return Q(exam_score__gte=lo, exam_score__lt=hi)
+
+
+def aggregate(queryset):
+    """One GROUP BY course query returning {course_id: {field: value}}."""
+    score = Cast("exam_score", FloatField())
+    annotations = {
+        "enrollment_count": Count("id"),
+        "score_count": Count("exam_score"),
+        "score_sum": Sum(score, default=0),
+        "score_sum_sq": Sum(score * score, default=0),
+    }
+    for grade, field in GRADE_FIELDS.items():
+        annotations[field] = Count("id", filter=Q(grade=grade))
+    for i in range(CourseStats.BUCKETS):
+        annotations[f"bucket_{i}"] = Count("id", filter=_bucket_q(i))
+    rows = queryset.order_by().values("course_id").annotate(**annotations)
+    return {row.pop("course_id"): row for row in rows}
+
+
+def recompute(course_ids=None, batch_size=500, using="default"):
+    """Rebuild CourseStats rows from the enrollment table. Returns the row count."""
+    courses = Course.objects.using(using).order_by("pk")
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    course_ids = list(courses.values_list("pk", flat=True))
+    count = 0
+    for start in range(0, len(course_ids), batch_size):
+        chunk = course_ids[start:start + batch_size]
+        totals = aggregate(Enrollment.objects.using(using).filter(course_id__in=chunk))
+        rows = [CourseStats(course_id=pk, **totals.get(pk, {})) for pk in chunk]
+        CourseStats.objects.using(using).bulk_create(
+            rows, update_conflicts=True, unique_fields=["course"], update_fields=STAT_FIELDS
+        )
+        count += len(rows)
+    caching.bump(CourseStats, using=using)
+    return count
+
+
+def get_stats(course, using="default"):
+    try:
+        return course.stats
+    except CourseStats.DoesNotExist:
+        recompute([course.pk], using=using)
+        return CourseStats.objects.using(using).get(course=course)
+
+
+# Student aggregates
+GRADE_POINTS = {"A": 4, "B": 3, "C": 2, "D": 1, "F": 0}
+STUDENT_FIELDS = ["enrollment_count", "graded_count", "grade_points", "score_count", "score_sum", "gpa"]
+
+
+def gpa(grade_points, graded_count):
+    return Coalesce(Cast(grade_points, FloatField()) / NullIf(graded_count, 0), 0.0)
+
+
+def student_contribution(exam_score, grade):
+    """The amounts one enrollment adds to its student's aggregate columns."""
+    delta = {"enrollment_count": 1}
+    if exam_score is not None:
+        delta["score_count"] = 1
+        delta["score_sum"] = float(exam_score)
+    if grade in GRADE_POINTS:
+        delta["graded_count"] = 1
+        delta["grade_points"] = GRADE_POINTS[grade]
+    return delta
+
+
+def record_student(before=None, after=None, using="default"):
+    """
+    Move one enrollment's contribution from its old (student_id, exam_score,
+    grade) to its new one: one atomic UPDATE per student whose totals
+    change, with gpa recomputed from the same old-value-plus-delta terms.
+    """
+    deltas = defaultdict(Counter)
+    for row, sign in ((before, -1), (after, 1)):
+        if row and row[0] is not None:
+            for field, value in student_contribution(*row[1:]).items():
+                deltas[row[0]][field] += sign * value
+    for student_id, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        updates = {field: F(field) + value for field, value in delta.items() if value}
+        updates["gpa"] = gpa(F("grade_points") + delta["grade_points"], F("graded_count") + delta["graded_count"])
+        Student.objects.using(using).filter(pk=student_id).update(**updates)
+
+
+def recompute_students(student_ids=None, batch_size=5000, using="default", student_model=Student):
+    """
+    Rebuild the aggregate columns of the given students (all by default)
+    from their live and archived enrollments with correlated subqueries, so
+    no rows go through Python. Takes the model as an argument so migrations
+    can pass their historical version. Returns the row count.
+    """
+    relations = {field.name: field.related_model for field in student_model._meta.get_fields() if field.one_to_many}
+    # Historical models from before the archive have no archived_enrollments.
+    sources = [relations[name]._default_manager.using(using) for name in ("enrollments", "archived_enrollments") if name in relations]
+
+    def per_student(aggregate, output_field):
+        total = None
+        for source in sources:
+            rows = source.filter(student_id=OuterRef("pk")).order_by().values("student_id").annotate(value=aggregate)
+            value = Coalesce(Subquery(rows.values("value")), Value(0), output_field=output_field)
+            total = value if total is None else total + value
+        return total
+
+    points = Case(*(When(grade=grade, then=Value(value)) for grade, value in GRADE_POINTS.items()), output_field=IntegerField())
+    totals = {
+        "enrollment_count": per_student(Count("id"), IntegerField()),
+        "graded_count": per_student(Count("id", filter=Q(grade__in=GRADE_POINTS)), IntegerField()),
+        "grade_points": per_student(Sum(points), IntegerField()),
+        "score_count": per_student(Count("exam_score"), IntegerField()),
+        "score_sum": per_student(Sum(Cast("exam_score", FloatField())), FloatField()),
+    }
+    students = student_model._default_manager.using(using)
+    if student_ids is None:
+        batches = [students.all()]
+    else:
+        student_ids = sorted(set(student_ids))
+        batches = [students.filter(pk__in=student_ids[start:start + batch_size]) for start in range(0, len(student_ids), batch_size)]
+    count = 0
+    for batch in batches:
+        count += batch.update(**totals)
+        batch.update(gpa=gpa(F("grade_points"), F("graded_count")))
+    caching.bump(student_model, using=using)
+    return count
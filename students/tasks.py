@@ -0,0 +1,80 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+
+from . import deletion, exports, search, stats
+from .importers import IMPORTERS, guess_format, read_rows
+from .jobs import task
+from .models import Course, Student
+
+
+def job_file(job_id, name):
+    os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+    return os.path.join(settings.JOB_FILES_DIR, f"{job_id}-{name}")
+
+
+@task(label="Recompute course and student statistics", manual=True)
+def recompute_stats(progress):
+    progress(0, 2, "Courses", force=True)
+    courses = stats.recompute(using=progress.using)
+    progress(1, 2, "Students", force=True)
+    students = stats.recompute_students(using=progress.using)
+    return {"courses": courses, "students": students}
+
+
+@task(label="Rebuild the search index", manual=True)
+def rebuild_search_index(progress):
+    counts = {}
+    for i, name in enumerate(search.INDEXES):
+        progress(i, len(search.INDEXES), name, force=True)
+        counts[name] = search.rebuild(apps.get_model("students", name), using=progress.using)
+    return counts
+
+
+@task(label="Export a list", max_attempts=1)
+def export(progress, route, params, fmt):
+    """Write a list view's export, with its filters, to a file offered on the job page."""
+    request = HttpRequest()
+    request.method = "GET"
+    request.GET = QueryDict(params)
+    view = resolve(reverse(route)).func.view_class()
+    view.setup(request)
+    queryset = view.get_queryset()
+    name = f"{view.model._meta.verbose_name_plural.replace(' ', '_')}.{fmt}"
+    progress(0, queryset.count(), force=True)
+    lines = exports.csv_lines if fmt == "csv" else exports.jsonl_lines
+    rows = 0
+    with open(job_file(progress.job.pk, name), "w", encoding="utf-8", newline="") as out:
+        for line in lines(exports.export_rows(queryset, view.export_fields), exports._header(view.export_fields)):
+            out.write(line)
+            rows += 1
+            progress(rows)
+    # The csv header is a line too.
+    return {"file": name, "rows": rows - (fmt == "csv")}
+
+
+@task(label="Import a roster", max_attempts=1)
+def import_roster(progress, path, kind, name):
+    """Import an uploaded roster saved by the import page; the upload is removed afterwards."""
+    def counted(rows):
+        for line_number, row in rows:
+            progress(line_number, message=name)
+            yield line_number, row
+
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            result = IMPORTERS[kind](using=progress.using).run(counted(read_rows(stream, guess_format(name))))
+    finally:
+        os.remove(path)
+    return {"created": result.created, "rejected": result.rejected, "errors": result.errors}
+
+
+@task(label="Delete students or courses")
+def bulk_delete(progress, model, pks):
+    # Safe to retry: a second run finds less, or nothing, to delete.
+    model = {"student": Student, "course": Course}[model]
+    total, counts = deletion.bulk_delete(model, pks, using=progress.using, progress=progress)
+    return {"deleted": counts.get(model._meta.label, 0), "rows": total, "counts": counts}
@@ -1,7 +1,35 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import date, timedelta
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.apps import apps
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, include, path, resolve, reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Student, Course, Enrollment, Instructor, Metadata
+from .filters import needs_distinct, relation_q
+from .models import ArchivedEnrollment, Student, Course, CourseStats, Enrollment, Instructor, Job, Metadata, Term
+from .pagination import encode_cursor
+from .phonetic import soundex
+from . import archive, caching, charts, datasets, deletion, duplicates, exports, grading, interning, jobs, ranking, search, stats
+from .forms import MetadataForm
+from sms import perf, routers, urls as sms_urls
+from . import urls as students_urls
+from . import views
+from .views import StudentCreateView, StudentListView
+from .management.commands import benchmark
 
 User = get_user_model()
 
@@ -151,3 +179,1928 @@ class EnrollmentTest(TestCase):
         enrollment = Enrollment.objects.create(student=self.student, course=self.course, grade="A")
         self.course.delete()
         self.assertFalse(Enrollment.objects.filter(id=enrollment.id).exists())
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.hari = Student.objects.create(first_name="Hari", last_name="Thapa", email="hari@example.com", dob="2000-01-01")
+        self.course = Course.objects.create(course_name="Science", course_code="SCI101")
+
+    def search_students(self, q):
+        response = self.client.get(reverse("student_list"), {"q": q})
+        return list(response.context["students"])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search_students("Adhi"), [self.rita])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search_students("rita thapa"), [])
+        self.assertEqual(self.search_students("hari thap"), [self.hari])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.rita.last_name = "Karki"
+        self.rita.save()
+        self.assertEqual(self.search_students("Adhikari"), [])
+        self.assertEqual(self.search_students("Karki"), [self.rita])
+        self.rita.delete()
+        self.assertEqual(self.search_students("Karki"), [])
+
+    def test_enrollment_follows_related_student(self):
+        enrollment = Enrollment.objects.create(student=self.rita, course=self.course, grade="A")
+        self.rita.first_name = "Sita"
+        self.rita.save()
+        response = self.client.get(reverse("enrollment_list"), {"q": "sita sci"})
+        self.assertEqual(list(response.context["enrollments"]), [enrollment])
+
+    def test_instructor_found_by_course_code(self):
+        instructor = Instructor.objects.create(first_name="Raj", last_name="Sharma", email="raj@example.com")
+        instructor.courses.add(self.course)
+        response = self.client.get(reverse("instructor_list"), {"q": "sci10"})
+        self.assertEqual(list(response.context["instructors"]), [instructor])
+        self.course.delete()
+        response = self.client.get(reverse("instructor_list"), {"q": "sci10"})
+        self.assertEqual(list(response.context["instructors"]), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM students_fts_student")
+        self.assertEqual(self.search_students("rita"), [])
+        call_command("rebuild_search_index", "student", stdout=StringIO())
+        self.assertEqual(self.search_students("rita"), [self.rita])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        course = Course.objects.create(course_name="Science", course_code="SCI101")
+        other = Course.objects.create(course_name="Arts", course_code="ART101")
+        for i in range(13):
+            # Repeated names make the pk tie-breaker matter.
+            student = Student.objects.create(first_name="Rita", last_name=f"Name{i % 4}", email=f"s{i}@example.com", dob="2000-01-01")
+            Enrollment.objects.create(student=student, course=course)
+            Enrollment.objects.create(student=student, course=other)
+
+    def walk(self, url, params=None):
+        params = dict(params or {})
+        pages = []
+        while True:
+            response = self.client.get(url, params)
+            page = response.context["page_obj"]
+            pages.append(list(page))
+            if not page.has_next():
+                return pages, page
+            params["cursor"] = page.next_cursor
+
+    def test_enrollment_pages_match_offset_ordering(self):
+        expected = list(Enrollment.objects.order_by("student__last_name", "student__first_name", "course__course_code", "pk"))
+        pages, last = self.walk(reverse("enrollment_list"), {"cursor": ""})
+        self.assertEqual([len(p) for p in pages], [10, 10, 6])
+        self.assertEqual([e for p in pages for e in p], expected)
+
+        response = self.client.get(reverse("enrollment_list"), {"cursor": last.previous_cursor})
+        self.assertEqual(list(response.context["page_obj"]), expected[10:20])
+        self.assertTrue(response.context["page_obj"].has_previous())
+
+        # Page numbers stay the default, so ?page=N links keep working.
+        response = self.client.get(reverse("enrollment_list"), {"page": 3})
+        self.assertEqual(list(response.context["page_obj"]), expected[20:])
+        self.assertContains(response, "Page 3 of 3")
+
+    def test_keyset_page_runs_no_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("enrollment_list"), {"cursor": ""})
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in ctx.captured_queries))
+
+    def test_cursor_parameter_opts_in_on_other_lists(self):
+        pages, _ = self.walk(reverse("student_list"), {"cursor": ""})
+        self.assertEqual([s for p in pages for s in p], list(Student.objects.order_by("last_name", "first_name", "pk")))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("enrollment_list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_values(self):
+        cursors = [
+            "e30",  # valid base64 of "{}"
+            "!!!",
+            encode_cursor("n", [None, None, None, None]),
+            encode_cursor("n", ["Name1", "Rita", "SCI101", [1]]),
+            encode_cursor("n", ["Name1", "Rita", "SCI101", "one"]),
+            encode_cursor("x", ["Name1", "Rita", "SCI101", 1]),
+            encode_cursor("n", ["Name1", "Rita", 1]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(reverse("enrollment_list"), {"cursor": cursor}).status_code, 404)
+                self.assertEqual(self.client.get(reverse("api_list", args=["enrollments"]), {"cursor": cursor}).status_code, 400)
+        # Search ranks are typed too, so a tampered rank is caught the same way.
+        search_cursor = encode_cursor("n", [{"rank": 1}, "Name1", "Rita", 1])
+        self.assertEqual(self.client.get(reverse("student_list"), {"q": "rita", "cursor": search_cursor}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("student_list"), {"q": "rita", "cursor": encode_cursor("n", [-1.5, "Name1", "Rita", 1])}).status_code, 200)
+
+
+class ListFilterQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.student = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.club = Metadata.objects.create(key="club", value="Science Club")
+        self.hobby = Metadata.objects.create(key="hobby", value="Science fiction")
+        self.student.metadata.add(self.club, self.hobby)
+
+    def list_sql(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, [q["sql"].upper() for q in ctx.captured_queries]
+
+    def test_plain_list_has_no_distinct(self):
+        for name in ["student_list", "course_list", "instructor_list", "enrollment_list"]:
+            _, sql = self.list_sql(reverse(name))
+            self.assertFalse(any("DISTINCT" in q for q in sql), name)
+
+    def test_metadata_filter_uses_exists_without_duplicates(self):
+        response, sql = self.list_sql(reverse("student_list"), {"meta_val": "science"})
+        self.assertEqual(list(response.context["students"]), [self.student])
+        self.assertFalse(any("DISTINCT" in q for q in sql))
+        self.assertTrue(any("EXISTS" in q for q in sql))
+
+    def test_metadata_key_and_value_match_same_pair(self):
+        response, _ = self.list_sql(reverse("student_list"), {"meta_key": "club", "meta_val": "fiction"})
+        self.assertEqual(list(response.context["students"]), [])
+        response, _ = self.list_sql(reverse("student_list"), {"meta_key": "club", "meta_val": "science"})
+        self.assertEqual(list(response.context["students"]), [self.student])
+
+    def test_metadata_list_filters_own_pairs(self):
+        self.client.login(username="admin", password="adminpass")
+        response, _ = self.list_sql(reverse("metadata_list"), {"meta_key": "club"})
+        self.assertEqual(list(response.context["metadata"]), [self.club])
+
+    def test_relation_lookup_does_not_fan_out(self):
+        instructor = Instructor.objects.create(first_name="Raj", last_name="Sharma", email="raj@example.com")
+        instructor.courses.add(
+            Course.objects.create(course_name="Physics", course_code="PHY101"),
+            Course.objects.create(course_name="Physics Lab", course_code="PHY102"),
+        )
+        qs = Instructor.objects.filter(relation_q(Instructor, "courses__course_name__icontains", "physics"))
+        self.assertFalse(needs_distinct(qs))
+        self.assertEqual(list(qs), [instructor])
+        self.assertTrue(needs_distinct(Instructor.objects.filter(courses__course_name="Physics")))
+
+
+class DetailQueryCountTest(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.student.metadata.add(Metadata.objects.create(key="club", value="Chess"))
+        self.instructor = Instructor.objects.create(first_name="Raj", last_name="Sharma", email="raj@example.com")
+        self.course = Course.objects.create(course_name="Science", course_code="SCI000")
+
+    def add_enrollments(self, count):
+        meta, _ = Metadata.objects.get_or_create(key="attendance", value="95%")
+        start = Course.objects.count()
+        for i in range(start, start + count):
+            course = Course.objects.create(course_name=f"Course {i}", course_code=f"C{i:03}")
+            other = Student.objects.create(first_name="S", last_name=f"L{i}", email=f"s{i}@example.com", dob="2000-01-01")
+            Enrollment.objects.create(student=self.student, course=course, exam_score=80).metadata.add(meta)
+            Enrollment.objects.create(student=other, course=self.course, exam_score=70)
+            self.instructor.courses.add(course)
+
+    def assert_constant_queries(self, url_name, pk, num):
+        # Same number of queries with 1 and with 16 related rows; the first
+        # is the ETag/Last-Modified aggregate.
+        for count in (1, 15):
+            self.add_enrollments(count)
+            with self.assertNumQueries(num):
+                response = self.client.get(reverse(url_name, args=[pk]))
+            self.assertEqual(response.status_code, 200)
+
+    def test_student_detail(self):
+        self.assert_constant_queries("student_detail", self.student.pk, 5)
+
+    def test_course_detail(self):
+        self.assert_constant_queries("course_detail", self.course.pk, 5)
+
+    def test_instructor_detail(self):
+        self.assert_constant_queries("instructor_detail", self.instructor.pk, 4)
+
+    def test_enrollment_detail(self):
+        self.add_enrollments(3)
+        enrollment = self.student.enrollments.first()
+        with self.assertNumQueries(4):
+            self.client.get(reverse("enrollment_detail", args=[enrollment.pk]))
+
+
+class CourseStatsTest(TestCase):
+    def setUp(self):
+        self.science = Course.objects.create(course_name="Science", course_code="SCI101")
+        self.arts = Course.objects.create(course_name="Arts", course_code="ART101")
+        self.students = [
+            Student.objects.create(first_name="S", last_name=str(i), email=f"s{i}@example.com", dob="2000-01-01")
+            for i in range(4)
+        ]
+
+    def snapshot(self, course):
+        row = CourseStats.objects.filter(course=course).values(*stats.STAT_FIELDS).get()
+        row["score_sum"] = round(row["score_sum"], 6)
+        row["score_sum_sq"] = round(row["score_sum_sq"], 6)
+        return row
+
+    def assert_matches_recompute(self):
+        incremental = [self.snapshot(self.science), self.snapshot(self.arts)]
+        stats.recompute()
+        self.assertEqual(incremental, [self.snapshot(self.science), self.snapshot(self.arts)])
+
+    def test_incremental_updates_match_full_recompute(self):
+        e1 = Enrollment.objects.create(student=self.students[0], course=self.science, exam_score=95, grade="A")
+        Enrollment.objects.create(student=self.students[1], course=self.science, exam_score=35.5, grade="F")
+        e3 = Enrollment.objects.create(student=self.students[2], course=self.science)
+        Enrollment.objects.create(student=self.students[3], course=self.arts, exam_score=60, grade="C")
+        e3.exam_score, e3.grade = 72, "B"
+        e3.save()
+        e1.course = self.arts
+        e1.save()
+        self.students[1].delete()
+        self.assert_matches_recompute()
+        self.assertEqual(CourseStats.objects.get(course=self.science).enrollment_count, 1)
+        self.assertEqual(CourseStats.objects.get(course=self.arts).enrollment_count, 2)
+
+    def test_summary_values(self):
+        for student, score, grade in zip(self.students, [95, 85, 45, 20], "ABDF"):
+            Enrollment.objects.create(student=student, course=self.science, exam_score=score, grade=grade)
+        summary = CourseStats.objects.get(course=self.science)
+        self.assertEqual(summary.mean, 61.25)
+        self.assertEqual(summary.pass_rate, 0.75)
+        self.assertEqual(summary.grade_distribution(), [("A", 1), ("B", 1), ("C", 0), ("D", 1), ("F", 1)])
+        self.assertEqual(summary.score_buckets(), [0, 0, 1, 0, 1, 0, 0, 0, 1, 1])
+        self.assertEqual(summary.median, 50.0)
+
+    def test_missing_row_is_rebuilt(self):
+        Enrollment.objects.create(student=self.students[0], course=self.science, exam_score=80, grade="A")
+        CourseStats.objects.all().delete()
+        Enrollment.objects.create(student=self.students[1], course=self.science, exam_score=60, grade="C")
+        self.assertEqual(CourseStats.objects.get(course=self.science).enrollment_count, 2)
+        response = self.client.get(reverse("course_detail", args=[self.arts.pk]))
+        self.assertEqual(response.context["stats"].enrollment_count, 0)
+
+    def test_course_detail_renders_summary(self):
+        Enrollment.objects.create(student=self.students[0], course=self.science, exam_score=80, grade="A")
+        response = self.client.get(reverse("course_detail", args=[self.science.pk]))
+        self.assertContains(response, "Course Statistics")
+        self.assertEqual(response.context["stats"].mean, 80)
+
+    def test_recompute_command(self):
+        Enrollment.objects.create(student=self.students[0], course=self.science, exam_score=80, grade="A")
+        CourseStats.objects.filter(course=self.science).update(enrollment_count=99)
+        call_command("recompute_course_stats", "SCI101", stdout=StringIO())
+        self.assertEqual(CourseStats.objects.get(course=self.science).enrollment_count, 1)
+
+
+class RosterImportTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.course = Course.objects.create(course_name="Science", course_code="SCI101")
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_import_students_csv(self):
+        path = self.write("students.csv", (
+            "first_name,last_name,email,dob,metadata\n"
+            "Hari,Thapa,hari@example.com,2001-02-03,club=Chess; house=Blue\n"
+            "Sita,Karki,sita@example.com,2001-02-03,club=Chess\n"
+            "Dup,Db,rita@example.com,2001-02-03,\n"
+            "Dup,File,hari@example.com,2001-02-03,\n"
+            "Future,Dob,future@example.com,2999-01-01,\n"
+        ))
+        errors = os.path.join(self.tmp.name, "errors.csv")
+        out = StringIO()
+        call_command("import_roster", path, "--kind", "students", "--batch-size", "2", "--errors", errors, stdout=out)
+        self.assertIn("2 created, 3 rejected", out.getvalue())
+        self.assertEqual(Student.objects.count(), 3)
+        self.assertEqual(Metadata.objects.filter(key="club", value="Chess").count(), 1)
+        self.assertEqual(Student.objects.get(email="sita@example.com").metadata.get().value, "Chess")
+        with open(errors) as f:
+            lines = f.read()
+        self.assertIn("Date of Birth cannot be in the future.", lines)
+        self.assertEqual(lines.count("already exists"), 2)
+        response = self.client.get(reverse("student_list"), {"q": "hari"})
+        self.assertEqual([s.email for s in response.context["students"]], ["hari@example.com"])
+
+    def test_import_enrollments_jsonl(self):
+        path = self.write("enrollments.jsonl", "\n".join([
+            '{"student_email": "rita@example.com", "course_code": "SCI101", "exam_score": "88.5", "grade": "A", "metadata": {"term": "Fall"}}',
+            '{"student_email": "rita@example.com", "course_code": "SCI101", "grade": "B"}',
+            '{"student_email": "nobody@example.com", "course_code": "SCI101"}',
+            '{"student_email": "rita@example.com", "course_code": "NOPE"}',
+            '{"student_email": "rita@example.com", "course_code": "SCI101", "grade": "Z"}',
+            'not json',
+        ]))
+        out = StringIO()
+        call_command("import_roster", path, "--kind", "enrollments", stdout=out, stderr=StringIO())
+        self.assertIn("1 created, 5 rejected", out.getvalue())
+        enrollment = Enrollment.objects.get()
+        self.assertEqual(enrollment.metadata.get().key, "term")
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrollment_count, 1)
+
+    def test_upload_view(self):
+        user = User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.client.force_login(user)
+        upload = SimpleUploadedFile("students.csv", b"first_name,last_name,email,dob\nHari,Thapa,hari@example.com,2001-02-03\n")
+        response = self.client.post(reverse("roster_import"), {"kind": "students", "file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["result"].created, 1)
+        self.assertTrue(Student.objects.filter(email="hari@example.com").exists())
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.hari = Student.objects.create(first_name="Hari", last_name="Thapa", email="hari@example.com", dob="2001-01-01")
+        self.course = Course.objects.create(course_name="Science", course_code="SCI101")
+        Enrollment.objects.create(student=self.rita, course=self.course, exam_score="88.50", grade="A")
+        self.rita.metadata.add(Metadata.objects.create(key="club", value="Chess"))
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_honours_filters_without_pagination(self):
+        for i in range(12):
+            Student.objects.create(first_name="S", last_name=f"L{i}", email=f"s{i}@example.com", dob="2000-01-01")
+        response = self.client.get(reverse("student_list"), {"format": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(len(self.content(response).splitlines()), 15)
+
+        response = self.client.get(reverse("student_list"), {"format": "csv", "meta_key": "club"})
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines, ["id,first_name,last_name,email,dob", f"{self.rita.pk},Rita,Adhikari,rita@example.com,2000-01-01"])
+
+    def test_jsonl_export(self):
+        response = self.client.get(reverse("enrollment_list"), {"format": "jsonl", "q": "rita"})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["student_email"], "rita@example.com")
+        self.assertEqual(rows[0]["exam_score"], "88.50")
+
+    def test_export_builds_no_model_instances(self):
+        rows = list(exports.export_rows(Student.objects.prefetch_related("metadata"), ["email"]))
+        self.assertEqual(sorted(rows), [("hari@example.com",), ("rita@example.com",)])
+
+    def test_metadata_export_requires_login(self):
+        response = self.client.get(reverse("metadata_list"), {"format": "csv"})
+        self.assertEqual(response.status_code, 302)
+
+
+class MetadataInterningTest(TestCase):
+    def setUp(self):
+        interning.cache.clear()
+        self.addCleanup(interning.cache.clear)
+
+    def test_unique_pair(self):
+        Metadata.objects.create(key="club", value="Chess")
+        form = MetadataForm(data={"key": "club", "value": "Chess"})
+        self.assertFalse(form.is_valid())
+        self.assertTrue(MetadataForm(data={"key": "club", "value": "Drama"}).is_valid())
+
+    def test_intern_pairs_reuses_and_creates(self):
+        chess = Metadata.objects.create(key="club", value="Chess")
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = interning.intern_pairs([("club", "Chess"), ("house", "Blue"), ("club", "Chess")])
+        self.assertEqual(ids[("club", "Chess")], chess.pk)
+        self.assertEqual(Metadata.objects.count(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(interning.intern_pair("house", "Blue"), ids[("house", "Blue")])
+
+    def test_lookup_reads_only_the_requested_pairs(self):
+        Metadata.objects.bulk_create([Metadata(key="club", value=f"Club {i}") for i in range(50)])
+        with CaptureQueriesContext(connection) as ctx, mock.patch.object(interning, "LOOKUP_BATCH", 2):
+            ids = interning.intern_pairs([("club", "Club 7"), ("club", "Club 9"), ("club", "Club 11")])
+        rows = Metadata.objects.filter(value__in=["Club 7", "Club 9", "Club 11"]).values_list("key", "value", "pk")
+        self.assertEqual(ids, {(k, v): pk for k, v, pk in rows})
+        # Two batches, each matching its pairs rather than every "club" row.
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertTrue(all('"value" = ' in query["sql"] for query in ctx.captured_queries))
+
+    def test_cache_forgets_changed_and_deleted_pairs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pk = interning.intern_pair("club", "Chess")
+        meta = Metadata.objects.get(pk=pk)
+        meta.value = "Drama"
+        meta.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertNotEqual(interning.intern_pair("club", "Chess"), pk)
+        Metadata.objects.filter(key="club", value="Chess").delete()
+        self.assertEqual(Metadata.objects.filter(key="club", value="Chess").count(), 0)
+        interning.intern_pair("club", "Chess")
+        self.assertEqual(Metadata.objects.filter(key="club", value="Chess").count(), 1)
+
+    def test_cache_is_bounded(self):
+        lru = interning.PairCache(maxsize=2)
+        for i in range(3):
+            lru.set(("default", "k", str(i)), i)
+        self.assertIsNone(lru.get(("default", "k", "0")))
+        self.assertEqual(lru.get(("default", "k", "2")), 2)
+
+
+class MetadataDedupeTest(TransactionTestCase):
+    def test_merge_rewrites_links(self):
+        executor = MigrationExecutor(connection)
+        after = executor.loader.graph.leaf_nodes("students")
+        executor.migrate([("students", "0003_course_stats")])
+        old_apps = executor.loader.project_state([("students", "0003_course_stats")]).apps
+        OldMetadata = old_apps.get_model("students", "Metadata")
+        OldStudent = old_apps.get_model("students", "Student")
+        keep = OldMetadata.objects.create(key="club", value="Chess")
+        dup1 = OldMetadata.objects.create(key="club", value="Chess")
+        dup2 = OldMetadata.objects.create(key="club", value="Chess")
+        other = OldMetadata.objects.create(key="club", value="Drama")
+        rita = OldStudent.objects.create(first_name="Rita", last_name="A", email="rita@example.com", dob="2000-01-01")
+        hari = OldStudent.objects.create(first_name="Hari", last_name="T", email="hari@example.com", dob="2000-01-01")
+        rita.metadata.add(keep, dup1, other)
+        hari.metadata.add(dup2)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(after)
+
+        self.assertEqual(list(Metadata.objects.order_by("pk").values_list("pk", flat=True)), [keep.pk, other.pk])
+        self.assertEqual(sorted(Student.objects.get(pk=rita.pk).metadata.values_list("pk", flat=True)), [keep.pk, other.pk])
+        self.assertEqual(list(Student.objects.get(pk=hari.pk).metadata.values_list("pk", flat=True)), [keep.pk])
+        self.assertEqual(interning.merge_duplicates(Metadata), (0, 0))
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", password="pass")
+        self.client.login(username="admin", password="pass")
+        self.students = [
+            Student.objects.create(first_name=f"Student{i}", last_name="Shrestha", email=f"s{i}@example.com", dob="2000-01-01")
+            for i in range(25)
+        ]
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.course = Course.objects.create(course_name="Math", course_code="MTH101")
+        self.chess = Metadata.objects.create(key="club", value="Chess")
+
+    def test_lookup_returns_limited_prefix_matches(self):
+        response = self.client.get(reverse("autocomplete", args=["student"]), {"q": "rit"})
+        self.assertEqual(response.json()["results"], [{"id": self.rita.pk, "text": "Rita Adhikari"}])
+        response = self.client.get(reverse("autocomplete", args=["student"]), {"q": "shre", "limit": 5})
+        self.assertEqual(len(response.json()["results"]), 5)
+        response = self.client.get(reverse("autocomplete", args=["student"]), {"limit": 1000})
+        self.assertEqual(len(response.json()["results"]), 20)
+
+    def test_lookup_rejects_unknown_source_and_guests(self):
+        self.assertEqual(self.client.get(reverse("autocomplete", args=["user"])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("autocomplete", args=["student"])).status_code, 302)
+
+    def test_form_renders_only_selected_options(self):
+        response = self.client.get(reverse("enrollment_create"))
+        self.assertNotContains(response, "Student0 Shrestha")
+        self.assertContains(response, 'data-autocomplete-url="/autocomplete/student/"')
+        self.assertContains(response, "js/autocomplete.js")
+
+        enrollment = Enrollment.objects.create(student=self.rita, course=self.course, grade="A")
+        enrollment.metadata.add(self.chess)
+        response = self.client.get(reverse("enrollment_edit", args=[enrollment.pk]))
+        self.assertContains(response, f'<option value="{self.rita.pk}" selected>Rita Adhikari</option>', html=True)
+        self.assertContains(response, f'<option value="{self.chess.pk}" selected>club = Chess</option>', html=True)
+        self.assertNotContains(response, "Student0 Shrestha")
+
+    def test_form_query_count_does_not_grow_with_table(self):
+        url = reverse("instructor_create")
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for i in range(20):
+            Course.objects.create(course_name=f"Course {i}", course_code=f"C{i:03}")
+            Metadata.objects.create(key="tag", value=str(i))
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(len(after), len(before))
+        self.assertNotContains(response, "C001")
+
+    def test_submitted_pks_still_validate(self):
+        response = self.client.post(reverse("enrollment_create"), {
+            "student": self.rita.pk, "course": self.course.pk, "exam_score": "88", "grade": "A",
+            "metadata": [self.chess.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        enrollment = Enrollment.objects.get(student=self.rita, course=self.course)
+        self.assertEqual(list(enrollment.metadata.all()), [self.chess])
+        response = self.client.post(reverse("enrollment_create"), {
+            "student": 999999, "course": self.course.pk, "grade": "B",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Select a valid choice")
+
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class PerfMiddlewareTest(TestCase):
+    def setUp(self):
+        perf.registry.clear()
+        self.addCleanup(perf.registry.clear)
+        Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+
+    def route(self, name):
+        return {route: (stats, summary) for route, stats, summary in perf.registry.snapshot()}[name]
+
+    def test_records_route_queries_and_render_time(self):
+        response = self.client.get(reverse("student_list"))
+        self.assertIn("sql;dur=", response["Server-Timing"])
+        stats, summary = self.route("student_list")
+        self.assertEqual((stats.count, stats.sampled), (1, 1))
+        self.assertGreater(summary["queries"][0.5], 0)
+        self.assertGreater(summary["render"][0.5], 0)
+
+    def test_counts_duplicate_statements(self):
+        profile = perf.RequestProfile()
+        execute = lambda sql, params, many, context: None
+        for params in [(1,), (1,), (2,)]:
+            profile(execute, "SELECT %s", params, False, {})
+        self.assertEqual((profile.queries, profile.duplicates), (3, 1))
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_only_record_wall_time(self):
+        response = self.client.get(reverse("student_list"))
+        self.assertNotIn("Server-Timing", response)
+        stats, _ = self.route("student_list")
+        self.assertEqual((stats.count, stats.sampled), (1, 0))
+
+    def test_panel_is_staff_only(self):
+        self.client.get(reverse("student_list"))
+        self.assertEqual(self.client.get(reverse("perf_panel")).status_code, 302)
+        User.objects.create_user(username="staff", password="pass", is_staff=True)
+        self.client.login(username="staff", password="pass")
+        self.assertContains(self.client.get(reverse("perf_panel")), "student_list")
+
+    def test_prometheus_metrics(self):
+        self.client.get(reverse("student_list"))
+        self.assertEqual(self.client.get(reverse("perf_metrics")).status_code, 302)
+        User.objects.create_user(username="staff", password="pass", is_staff=True)
+        self.client.login(username="staff", password="pass")
+        body = self.client.get(reverse("perf_metrics")).content.decode()
+        self.assertIn('sms_request_duration_seconds{route="student_list",quantile="0.95"}', body)
+        self.assertIn('sms_request_queries_count{route="student_list"} 1', body)
+        self.client.logout()
+        with self.settings(PERF_METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get(reverse("perf_metrics")).status_code, 302)
+            response = self.client.get(reverse("perf_metrics"), headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(reverse("perf_metrics"), headers={"Authorization": "Bearer secret"})
+            self.assertEqual(response.status_code, 200)
+
+
+class PageCacheTest(TransactionTestCase):
+    # Pages are only cached outside transactions, so these run without the
+    # per-test transaction of TestCase.
+    def setUp(self):
+        cache.clear()
+        caching.hits.clear()
+        self.addCleanup(cache.clear)
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse("student_list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Rita")
+        self.assertEqual(caching.hits.snapshot()["StudentListView"], (1, 1))
+
+    def test_writes_invalidate_dependent_pages(self):
+        url = reverse("student_detail", args=[self.rita.pk])
+        self.assertNotContains(self.client.get(url), "MTH101")
+        course = Course.objects.create(course_name="Math", course_code="MTH101")
+        Enrollment.objects.create(student=self.rita, course=course, grade="A")
+        self.assertContains(self.client.get(url), "MTH101")
+
+        list_url = reverse("student_list")
+        self.client.get(list_url)
+        self.rita.metadata.add(Metadata.objects.create(key="club", value="Chess"))
+        self.assertContains(self.client.get(list_url), "Chess")
+
+    def test_bulk_delete_invalidates_cached_lists(self):
+        course = Course.objects.create(course_name="Math", course_code="MTH101")
+        Enrollment.objects.create(student=self.rita, course=course, grade="A")
+        pages = {"student_list": "Rita", "enrollment_list": "Rita", "course_list": "MTH101"}
+        for name, text in pages.items():
+            self.assertContains(self.client.get(reverse(name)), text)
+            self.assertContains(self.client.get(reverse(name)), text)
+        self.assertEqual(caching.hits.snapshot()["StudentListView"], (1, 1))
+        deletion.bulk_delete(Student, [self.rita.pk])
+        self.assertNotContains(self.client.get(reverse("student_list")), "Rita")
+        self.assertNotContains(self.client.get(reverse("enrollment_list")), "Rita")
+        deletion.bulk_delete(Course, [course.pk])
+        self.assertNotContains(self.client.get(reverse("course_list")), "MTH101")
+
+    def test_params_are_normalised_and_unknown_params_bypass(self):
+        url = reverse("student_list")
+        self.client.get(url, {"q": "rita "})
+        self.client.get(url, {"q": "rita", "page": "1"})
+        self.client.get(url, {"utm_source": "x"})
+        self.assertEqual(caching.hits.snapshot()["StudentListView"], (1, 1))
+
+    def test_pages_read_from_the_replica_are_not_stored(self):
+        view = StudentListView()
+        with mock.patch.object(routers, "replica_available", return_value=True):
+            with routers.replica_reads():
+                self.assertTrue(view.reads_replica())
+            self.assertFalse(view.reads_replica())
+        # The replica may lag the write that moved the generation.
+        url = reverse("student_list")
+        with mock.patch.object(StudentListView, "reads_replica", return_value=True):
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(caching.hits.snapshot()["StudentListView"], (0, 2))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(caching.hits.snapshot()["StudentListView"], (1, 3))
+
+    def test_logged_in_users_bypass_cache(self):
+        User.objects.create_user(username="admin", password="pass")
+        self.client.login(username="admin", password="pass")
+        self.client.get(reverse("student_list"))
+        self.client.get(reverse("student_list"))
+        self.assertEqual(caching.hits.snapshot(), {})
+
+    def test_evicted_generation_is_not_reused(self):
+        before = caching.generations([Student])[0]
+        cache.delete(caching.generation_key(Student))
+        self.assertGreater(caching.generations([Student])[0], before)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.course = Course.objects.create(course_name="Math", course_code="MTH101")
+        self.enrollment = Enrollment.objects.create(student=self.rita, course=self.course, grade="A")
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, headers={"If-None-Match": response["ETag"]})
+
+    def test_detail_returns_304_with_one_query(self):
+        for url in (reverse("course_detail", args=[self.course.pk]), reverse("student_detail", args=[self.rita.pk])):
+            first = self.client.get(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+    def test_rank_changes_move_student_validators(self):
+        # The class rank depends on every student, so another student's grade
+        # must change Rita's ETag; Last-Modified cannot say so and is left out.
+        url = reverse("student_detail", args=[self.rita.pk])
+        first = self.client.get(url)
+        self.assertNotIn("Last-Modified", first)
+        self.assertIn("Last-Modified", self.client.get(reverse("course_detail", args=[self.course.pk])))
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        mina = Student.objects.create(first_name="Mina", last_name="Rai", email="mina@example.com", dob="2000-01-01")
+        Enrollment.objects.create(student=mina, course=self.course, grade="B")
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["standing"]["of"], 2)
+
+    def test_child_changes_move_parent_validators(self):
+        url = reverse("student_detail", args=[self.rita.pk])
+        first = self.client.get(url)
+        self.enrollment.delete()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+        second = self.client.get(url)
+        self.rita.metadata.add(Metadata.objects.create(key="club", value="Chess"))
+        self.assertEqual(self.revalidate(url, second).status_code, 200)
+
+    def test_parents_are_touched(self):
+        before = Course.objects.get(pk=self.course.pk).updated_at
+        chess = Metadata.objects.create(key="club", value="Chess")
+        chess.courses.add(self.course)
+        self.assertGreater(Course.objects.get(pk=self.course.pk).updated_at, before)
+
+        instructor = Instructor.objects.create(first_name="Hari", last_name="T", email="hari@example.com")
+        instructor.courses.add(self.course)
+        before = Instructor.objects.get(pk=instructor.pk).updated_at
+        self.course.delete()
+        self.assertGreater(Instructor.objects.get(pk=instructor.pk).updated_at, before)
+
+    def test_etag_varies_by_user(self):
+        url = reverse("course_detail", args=[self.course.pk])
+        first = self.client.get(url)
+        User.objects.create_user(username="admin", password="pass")
+        self.client.login(username="admin", password="pass")
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_export_revalidates_against_filtered_rows(self):
+        url = reverse("enrollment_list")
+        first = self.client.get(url, {"format": "csv", "q": "rita"})
+        self.assertEqual(self.revalidate(url, first, format="csv", q="rita").status_code, 304)
+        self.assertEqual(self.revalidate(url, first, format="csv").status_code, 200)
+        self.rita.last_name = "Sharma"
+        self.rita.save()
+        self.assertEqual(self.revalidate(url, first, format="csv", q="rita").status_code, 200)
+
+
+class SeedFixtureTest(TestCase):
+    # The README's setup step: fixtures are saved raw, without pre_save().
+    fixtures = ["seed_data.json"]
+
+    def test_seed_data_loads_and_renders(self):
+        self.assertEqual(Student.objects.count(), 10)
+        self.assertFalse(Student.objects.filter(updated_at__isnull=True).exists())
+        for url in [
+            reverse("student_list"), reverse("course_list"), reverse("enrollment_list"),
+            reverse("student_detail", args=[1]), reverse("course_detail", args=[1]),
+        ]:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        before = Student.objects.get(pk=1).updated_at
+        Student.objects.get(pk=1).save()
+        self.assertGreater(Student.objects.get(pk=1).updated_at, before)
+
+
+class JsonApiTest(TestCase):
+    def setUp(self):
+        self.chess = Metadata.objects.create(key="club", value="Chess")
+        self.courses = [Course.objects.create(course_name=f"Course {i}", course_code=f"C{i:03}") for i in range(3)]
+        self.students = []
+        for i in range(6):
+            student = Student.objects.create(first_name=f"Rita{i}", last_name=f"L{i}", email=f"s{i}@example.com", dob="2000-01-01")
+            student.metadata.add(self.chess)
+            for course in self.courses:
+                Enrollment.objects.create(student=student, course=course, exam_score=70 + i, grade="B")
+            self.students.append(student)
+
+    def get(self, resource, **params):
+        response = self.client.get(reverse("api_list", args=[resource]), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_sparse_fields(self):
+        data = self.get("students", fields="email")
+        self.assertEqual(data["results"][0], {"id": self.students[0].pk, "email": "s0@example.com"})
+
+    def test_includes_are_batched(self):
+        with self.assertNumQueries(4):
+            data = self.get("students", include="enrollments.course,metadata", fields="last_name,enrollments.grade,enrollments.course.course_code")
+        first = data["results"][0]
+        self.assertEqual(first["metadata"][0]["value"], "Chess")
+        self.assertEqual(len(first["enrollments"]), 3)
+        self.assertEqual(first["enrollments"][0]["course"], {"id": self.courses[0].pk, "course_code": "C000"})
+        self.assertNotIn("exam_score", first["enrollments"][0])
+
+    def test_keyset_pages_and_search(self):
+        data = self.get("students", limit=4, fields="id")
+        self.assertEqual(len(data["results"]), 4)
+        rest = self.client.get(data["next"]).json()
+        self.assertEqual([r["id"] for r in data["results"] + rest["results"]], [s.pk for s in self.students])
+        self.assertIsNone(rest["next"])
+
+        data = self.get("enrollments", q="rita3", include="student", fields="grade,student.first_name")
+        self.assertEqual({r["student"]["first_name"] for r in data["results"]}, {"Rita3"})
+        self.assertEqual(len(self.get("students", meta_key="club", meta_val="Chess")["results"]), 6)
+
+    def test_reverse_many_to_many_include(self):
+        instructor = Instructor.objects.create(first_name="Hari", last_name="T", email="hari@example.com")
+        instructor.courses.add(self.courses[1])
+        data = self.client.get(reverse("api_detail", args=["courses", self.courses[1].pk]), {"include": "instructors"}).json()
+        self.assertEqual([i["email"] for i in data["instructors"]], ["hari@example.com"])
+
+    def test_errors(self):
+        url = reverse("api_list", args=["students"])
+        self.assertEqual(self.client.get(url, {"fields": "password"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"include": "instructors"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"fields": "enrollments.grade"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": "junk"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_list", args=["metadata"])).status_code, 403)
+        self.assertEqual(self.client.get(reverse("api_detail", args=["students", 999])).status_code, 404)
+
+
+class SQLiteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_sqlite", workers=2, seconds=0.2, stdout=out)
+        self.assertIn("tuned:", out.getvalue())
+        self.assertIn("writes/s", out.getvalue())
+
+
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_go_to_replica_only_inside_read_views(self):
+        with mock.patch.object(routers, "replica_available", return_value=True):
+            self.assertIsNone(self.router.db_for_read(Student))
+            with routers.replica_reads():
+                self.assertEqual(self.router.db_for_read(Student), "replica")
+                self.assertEqual(self.router.db_for_write(Student), "default")
+        with routers.replica_reads():
+            # No replica configured here: fall back to the primary.
+            self.assertIsNone(self.router.db_for_read(Student))
+        self.assertFalse(self.router.allow_migrate("replica", "students"))
+
+    def test_middleware_flags_read_only_views(self):
+        middleware = routers.ReplicaPinMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+        for view, method, expected in [
+            (StudentListView, "get", True),
+            (StudentCreateView, "get", False),
+            (StudentListView, "post", False),
+        ]:
+            request = getattr(factory, method)("/")
+            middleware.process_view(request, view.as_view(), (), {})
+            self.assertEqual(routers._replica_reads.get(), expected)
+            middleware.finish(request)
+            self.assertFalse(routers._replica_reads.get())
+
+    def test_exports_stream_from_the_replica(self):
+        # The rows are read after the middleware has reset the flag.
+        with mock.patch.object(routers, "replica_available", return_value=True), \
+                mock.patch.object(views, "last_modified", return_value=(None, 0)), \
+                mock.patch.object(exports, "export_response", return_value=HttpResponse()) as export_response:
+            self.client.get(reverse("student_list"), {"format": "csv"})
+            self.assertFalse(routers._replica_reads.get())
+            self.assertEqual(export_response.call_args.args[0].db, "replica")
+
+    def test_writes_pin_client_to_primary(self):
+        User.objects.create_user(username="admin", password="pass")
+        self.client.login(username="admin", password="pass")
+        response = self.client.post(reverse("student_create"), {
+            "first_name": "Rita", "last_name": "Adhikari", "email": "rita@example.com", "dob": "2000-01-01",
+        })
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        request = RequestFactory().get("/", headers={"Cookie": f"{routers.PIN_COOKIE}={response.cookies[routers.PIN_COOKIE].value}"})
+        self.assertTrue(routers.ReplicaPinMiddleware(None).pinned(request))
+        self.assertNotIn(routers.PIN_COOKIE, self.client.get(reverse("student_list")).cookies)
+
+
+class SyncReplicaTest(TransactionTestCase):
+    # The backup cannot read the source while a test transaction holds it.
+    def test_sync_replica_copies_database(self):
+        Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "replica.sqlite3")
+            call_command("sync_replica", target=target, stdout=StringIO())
+            copy = sqlite3.connect(target)
+            self.assertEqual(copy.execute("SELECT email FROM students_student").fetchall(), [("rita@example.com",)])
+            copy.close()
+
+
+# Root URLconf for AsyncViewsTest: the site as sms/asgi.py serves it.
+urlpatterns = [path("", include("students.async_urls")), *sms_urls.urlpatterns]
+
+
+@override_settings(ROOT_URLCONF=__name__, PERF_SAMPLE_RATE=1)
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        cls.course = Course.objects.create(course_name="Math", course_code="MTH101")
+        cls.course.metadata.add(Metadata.objects.create(key="room", value="B12"))
+        cls.enrollment = Enrollment.objects.create(student=cls.rita, course=cls.course, exam_score=91)
+        for i in range(12):
+            Student.objects.create(first_name="S", last_name=f"L{i:02}", email=f"s{i}@example.com", dob="2000-01-01")
+
+    def test_read_views_are_coroutines(self):
+        from . import async_views
+        self.assertIs(resolve(reverse("student_list")).func.view_class, async_views.StudentListView)
+        self.assertIs(resolve(reverse("student_create")).func.view_class, StudentCreateView)
+        self.assertTrue(async_views.CourseDetailView.view_is_async)
+
+    async def test_list_pages(self):
+        response = await self.async_client.get(reverse("student_list"), {"page": 2})
+        self.assertContains(response, "L09")
+        self.assertEqual(response.context["paginator"].count, 13)
+        self.assertEqual((await self.async_client.get(reverse("student_list"), {"page": 9})).status_code, 404)
+        response = await self.async_client.get(reverse("student_list"), {"q": "rita"})
+        self.assertContains(response, "Adhikari")
+        response = await self.async_client.get(reverse("enrollment_list"), {"cursor": ""})
+        self.assertContains(response, "MTH101")
+        self.assertTrue(response.context["page_obj"].paginator.ordering)
+
+    async def test_course_detail_loads_relations(self):
+        url = reverse("course_detail", args=[self.course.pk])
+        response = await self.async_client.get(url)
+        self.assertContains(response, "Adhikari")
+        self.assertContains(response, "B12")
+        self.assertEqual(response.context["stats"].enrollment_count, 1)
+        revalidated = await self.async_client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual((await self.async_client.get(reverse("course_detail", args=[0]))).status_code, 404)
+
+    async def test_detail_pages(self):
+        for name, pk, text in [
+            ("student_detail", self.rita.pk, "MTH101"),
+            ("enrollment_detail", self.enrollment.pk, "Adhikari"),
+        ]:
+            response = await self.async_client.get(reverse(name, args=[pk]))
+            self.assertContains(response, text)
+            # PerfMiddleware saw the queries the async ORM ran in its thread.
+            self.assertNotIn('"0 queries"', response["Server-Timing"])
+
+    async def test_export_streams_asynchronously(self):
+        response = await self.async_client.get(reverse("enrollment_list"), {"format": "csv"})
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn("rita@example.com", body)
+
+    async def test_login_required_list(self):
+        response = await self.async_client.get(reverse("metadata_list"))
+        self.assertEqual(response.status_code, 302)
+        user = await User.objects.acreate_user(username="admin", password="pass")
+        await self.async_client.aforce_login(user)
+        self.assertContains(await self.async_client.get(reverse("metadata_list")), "B12")
+
+
+class LoadTestCommandTest(TransactionTestCase):
+    # The requests run in other threads, which must see the committed rows.
+    def test_workers_report_percentiles(self):
+        Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        for server in ("wsgi", "asgi"):
+            out = StringIO()
+            call_command("loadtest", worker=server, paths=["/students/", "/missing/"], requests=4, concurrency=2, host="testserver", stdout=out)
+            results = json.loads(out.getvalue())
+            self.assertEqual(results["/students/"]["requests"], 4)
+            self.assertEqual(results["/students/"]["errors"], 0)
+            self.assertEqual(results["/missing/"]["errors"], 4)
+            self.assertGreater(results["/students/"]["rps"], 0)
+
+
+class DatasetGeneratorTest(TestCase):
+    sizes = {"students": 30, "courses": 6, "instructors": 3, "enrollments": 75}
+
+    def generate(self, seed=0):
+        return datasets.DatasetGenerator(**self.sizes, seed=seed, batch_size=20).run()
+
+    def snapshot(self):
+        return (
+            list(Student.objects.order_by("pk").values_list("pk", "email", "dob")),
+            list(Enrollment.objects.order_by("pk").values_list("student_id", "course_id", "exam_score", "grade")),
+            list(Student.metadata.through.objects.order_by("student_id", "metadata_id").values_list("student_id", "metadata_id")),
+        )
+
+    def test_sizes_and_relations(self):
+        counts = self.generate()
+        self.assertEqual({name: counts[name] for name in self.sizes}, self.sizes)
+        pairs = Enrollment.objects.values_list("student_id", "course_id")
+        self.assertEqual(len(set(pairs)), 75)
+        self.assertTrue(Student.metadata.through.objects.exists())
+        self.assertEqual(CourseStats.objects.count(), 6)
+        self.assertEqual(sum(CourseStats.objects.values_list("enrollment_count", flat=True)), 75)
+        student = Student.objects.get(pk=7)
+        # The search index was rebuilt for the bulk-created rows.
+        response = self.client.get(reverse("student_list"), {"q": student.email})
+        self.assertEqual(list(response.context["students"]), [student])
+
+    def test_same_seed_same_rows(self):
+        self.generate(seed=3)
+        first = self.snapshot()
+        datasets.clear()
+        self.generate(seed=3)
+        self.assertEqual(self.snapshot(), first)
+        datasets.clear()
+        self.generate(seed=4)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_rejects_impossible_or_existing_data(self):
+        with self.assertRaises(ValueError):
+            datasets.DatasetGenerator(students=2, courses=2, instructors=0, enrollments=5)
+        self.generate()
+        with self.assertRaises(ValueError):
+            self.generate()
+
+    def test_command(self):
+        out = StringIO()
+        call_command("generate_dataset", students=10, courses=2, instructors=1, enrollments=15, stdout=out)
+        self.assertIn("10 students", out.getvalue())
+        self.assertEqual(Enrollment.objects.count(), 15)
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_times_routes_and_compares_with_baseline(self):
+        datasets.DatasetGenerator(students=20, courses=3, instructors=2, enrollments=30).run()
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.json")
+            call_command("benchmark", only=["student_", "enrollment_list", "api_detail"], repeat=1, host="testserver",
+                         output=output, stdout=StringIO(), stderr=StringIO())
+            with open(output) as f:
+                results = json.load(f)
+        current = results["scales"]["current"]
+        self.assertEqual(current["counts"]["students"], 20)
+        for name in ["student_list:search", "student_list:deep", "student_create", "student_delete", "enrollment_list:deep", "enrollment_list:deep:cursor", "api_detail"]:
+            self.assertLess(current["cases"][name]["status"], 400, name)
+        self.assertEqual(current["cases"]["student_create"]["status"], 302)
+        # Write cases clean up after themselves.
+        self.assertEqual(Student.objects.count(), 20)
+        self.assertFalse(User.objects.filter(username="benchmark").exists())
+
+        slower = json.loads(json.dumps(results))
+        slower["scales"]["current"]["cases"]["student_list"]["median_ms"] *= 10
+        slower["scales"]["current"]["cases"]["student_list"]["median_ms"] += 5
+        slower["scales"]["current"]["cases"]["api_detail"]["queries"] += 1
+        problems = {name: problem for _, name, *_, problem in benchmark.compare(slower, results, 0.25) if problem}
+        self.assertEqual(problems, {"student_list": "slower", "api_detail": "more queries"})
+
+
+# Most SQL queries a GET of each named route may run, as
+# (URL kwargs, guest budget, logged-in budget). Every route in sms/urls.py and
+# students/urls.py needs a row, and QueryBudgetTest also fails any route
+# whose count grows with the number of rows on the page or related rows.
+QUERY_BUDGETS = {
+    "perf_panel": ({}, 0, 2),
+    "perf_metrics": ({}, 0, 2),
+    "home": ({}, 0, 2),
+    "login": ({}, 0, 2),
+    "logout": ({}, 0, 0),
+    "student_list": ({}, 3, 5),
+    "student_create": ({}, 0, 2),
+    "student_detail": ({"pk": 1}, 6, 8),
+    "student_chart": ({"pk": 1}, 2, 4),
+    "student_edit": ({"pk": 1}, 0, 5),
+    "student_delete": ({"pk": 1}, 0, 3),
+    "course_list": ({}, 3, 5),
+    "course_create": ({}, 0, 2),
+    "course_detail": ({"pk": 1}, 5, 7),
+    "course_chart": ({"pk": 1}, 2, 4),
+    "course_edit": ({"pk": 1}, 0, 5),
+    "course_delete": ({"pk": 1}, 0, 3),
+    "instructor_list": ({}, 4, 6),
+    "instructor_create": ({}, 0, 2),
+    "instructor_detail": ({"pk": 1}, 4, 6),
+    "instructor_edit": ({"pk": 1}, 0, 7),
+    "instructor_delete": ({"pk": 1}, 0, 3),
+    "enrollment_list": ({}, 4, 6),
+    "enrollment_create": ({}, 0, 4),
+    "enrollment_detail": ({"pk": 1}, 4, 6),
+    "enrollment_edit": ({"pk": 1}, 0, 10),
+    "enrollment_delete": ({"pk": 1}, 0, 5),
+    "metadata_list": ({}, 0, 4),
+    "metadata_create": ({}, 0, 2),
+    "metadata_edit": ({"pk": 1}, 0, 3),
+    "metadata_delete": ({"pk": 1}, 0, 3),
+    "roster_import": ({}, 0, 2),
+    "student_bulk_delete": ({}, 0, 2),
+    "course_bulk_delete": ({}, 0, 2),
+    "job_list": ({}, 0, 5),
+    "job_create": ({}, 0, 2),
+    "job_detail": ({"pk": 1}, 0, 3),
+    "job_status": ({"pk": 1}, 0, 3),
+    "job_file": ({"pk": 1}, 0, 3),
+    "api_list": ({"resource": "students"}, 1, 1),
+    "api_detail": ({"resource": "students", "pk": 1}, 1, 1),
+    "autocomplete": ({"model": "student"}, 0, 3),
+}
+
+
+class QueryBudgetTest(TestCase):
+    # Few rows, then many: list pages go from partly filled to full and every
+    # student and course gets more enrollments. Every object carries all of
+    # its metadata keys in both, because the autocomplete widgets skip their
+    # lookup when nothing is selected.
+    DATASETS = [
+        {"students": 3, "courses": 2, "instructors": 2, "enrollments": 4, "fanout": 4},
+        {"students": 40, "courses": 8, "instructors": 5, "enrollments": 160, "fanout": 4},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pass")
+        Job.objects.create(pk=1, task="export", status=Job.DONE, result={"file": "students.csv", "rows": 0}, created_by=cls.user)
+
+    def routes(self):
+        return [
+            pattern.name
+            for module in (sms_urls, students_urls)
+            for pattern in module.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        ]
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(sorted(set(self.routes()) ^ set(QUERY_BUDGETS)), [])
+
+    def test_routes_stay_within_budget(self):
+        user = Client()
+        user.force_login(self.user)
+        clients = [("guest", Client(), 1), ("user", user, 2)]
+        first_run = {}
+        for sizes in self.DATASETS:
+            datasets.clear()
+            datasets.DatasetGenerator(**sizes).run()
+            for name in self.routes():
+                kwargs = QUERY_BUDGETS[name][0]
+                for role, client, column in clients:
+                    with CaptureQueriesContext(connection) as captured:
+                        response = client.get(reverse(name, kwargs=kwargs))
+                    statements = [query["sql"] for query in captured]
+                    with self.subTest(route=name, role=role, students=sizes["students"]):
+                        self.assertLess(response.status_code, 500)
+                        self.assertLessEqual(len(statements), QUERY_BUDGETS[name][column], "\n".join(statements))
+                        before = first_run.setdefault((name, role), statements)
+                        self.assertEqual(
+                            len(statements), len(before),
+                            "Query count grows with the data (N+1?):\n" + "\n".join(statements),
+                        )
+
+
+class GradingTest(TestCase):
+    SCORES = [95, 88, 88, 72, 65, 40]
+
+    def setUp(self):
+        self.course = Course.objects.create(course_name="Science", course_code="SCI101")
+        self.other = Course.objects.create(course_name="Arts", course_code="ART101")
+        self.enrollments = [
+            Enrollment.objects.create(
+                student=Student.objects.create(first_name="S", last_name=str(i), email=f"s{i}@example.com", dob="2000-01-01"),
+                course=self.course, exam_score=score, grade="C",
+            )
+            for i, score in enumerate(self.SCORES)
+        ]
+
+    def backends(self):
+        # The NumPy path runs too when NumPy is installed.
+        return [None] + ([grading.numpy] if grading.numpy else [])
+
+    def test_schemes(self):
+        expected = {
+            grading.Cutoffs(): list("ABBCDF"),
+            grading.Cutoffs({"D": 50}): list("DDDDDF"),
+            grading.ZScore(): ["A", "B", "B", "C", "C", "D"],
+            grading.Percentile(): ["A", "B", "B", "C", "C", "C"],
+            grading.Percentile({"A": 50, "D": 90}): ["A", "A", "A", "D", "D", "D"],
+        }
+        for backend in self.backends():
+            with mock.patch.object(grading, "numpy", backend):
+                for scheme, grades in expected.items():
+                    with self.subTest(scheme=str(scheme), numpy=bool(backend)):
+                        self.assertEqual(scheme.grades([float(score) for score in self.SCORES]), grades)
+                self.assertEqual(grading.ZScore().grades([70.0, 70.0]), ["B", "B"])
+
+    def test_invalid_cutoffs(self):
+        for scheme, cutoffs in [
+            (grading.Cutoffs, {"A": 80, "B": 90}), (grading.Cutoffs, {"E": 10}), (grading.Cutoffs, {}),
+            (grading.Percentile, {"A": 50, "B": 20}), (grading.Percentile, {"A": 0}), (grading.Percentile, {"D": 120}),
+        ]:
+            with self.subTest(cutoffs=cutoffs), self.assertRaises(ValueError):
+                scheme(cutoffs)
+        self.assertEqual(grading.parse_cutoffs("a=90, B=80.5"), {"A": 90.0, "B": 80.5})
+        with self.assertRaises(ValueError):
+            grading.parse_cutoffs("A90")
+
+    def test_regrade_writes_in_batches_and_refreshes_derived_data(self):
+        unscored = Enrollment.objects.create(
+            student=Student.objects.create(first_name="U", last_name="N", email="u@example.com", dob="2000-01-01"),
+            course=self.course, grade="B",
+        )
+        Enrollment.objects.create(student=unscored.student, course=self.other, exam_score=99, grade="F")
+        before = Course.objects.get(pk=self.course.pk).updated_at
+        with self.assertNumQueries(17):
+            graded, changes = grading.regrade(grading.Cutoffs(), [self.course.pk])
+        self.assertEqual((graded, len(changes)), (6, 5))
+        self.assertEqual(
+            list(Enrollment.objects.filter(course=self.course).order_by("pk").values_list("grade", flat=True)),
+            list("ABBCDF") + ["B"],
+        )
+        self.assertEqual(Enrollment.objects.get(course=self.other).grade, "F")
+        summary = CourseStats.objects.get(course=self.course)
+        self.assertEqual(summary.grade_distribution(), [("A", 1), ("B", 3), ("C", 1), ("D", 1), ("F", 1)])
+        self.assertGreater(Course.objects.get(pk=self.course.pk).updated_at, before)
+        response = self.client.get(reverse("enrollment_list"), {"q": "95 a"})
+        self.assertEqual(list(response.context["enrollments"]), [self.enrollments[0]])
+
+    def test_dry_run_and_command(self):
+        out = StringIO()
+        call_command("regrade_courses", "SCI101", "--scheme", "percentile", "--dry-run", stdout=out)
+        self.assertIn("SCI101: 3 changed (C->A x1, C->B x2)", out.getvalue())
+        self.assertIn("Would change 3 of 6 scored enrollments in 1 courses", out.getvalue())
+        self.assertEqual(set(Enrollment.objects.values_list("grade", flat=True)), {"C"})
+
+        call_command("regrade_courses", "--cutoffs", "A=90,B=80", "--show", "1", stdout=out)
+        self.assertEqual(
+            list(Enrollment.objects.order_by("pk").values_list("grade", flat=True)), list("ABBFFF")
+        )
+        self.assertIn("... and 5 more", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("regrade_courses", "--cutoffs", "A=80,B=90", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("regrade_courses", "NOPE", stdout=StringIO())
+
+
+class StudentStatsTest(TestCase):
+    def setUp(self):
+        self.courses = [Course.objects.create(course_name=f"Course {i}", course_code=f"C{i:03}") for i in range(3)]
+        self.students = [
+            Student.objects.create(first_name="S", last_name=name, email=f"{name}@example.com", dob="2000-01-01")
+            for name in ["Ames", "Bose", "Chen", "Dahl"]
+        ]
+
+    def snapshot(self):
+        return list(Student.objects.order_by("pk").values_list(*stats.STUDENT_FIELDS))
+
+    def enroll(self, student, course, score=None, grade=""):
+        return Enrollment.objects.create(student=self.students[student], course=self.courses[course], exam_score=score, grade=grade)
+
+    def test_incremental_updates_match_full_recompute(self):
+        e1 = self.enroll(0, 0, 95, "A")
+        self.enroll(0, 1, 60, "C")
+        e3 = self.enroll(1, 0)
+        self.enroll(2, 2, 45.5, "F")
+        e3.exam_score, e3.grade = 72, "B"
+        e3.save()
+        e1.student = self.students[3]
+        e1.save()
+        self.courses[1].delete()
+        incremental = self.snapshot()
+        stats.recompute_students()
+        self.assertEqual(incremental, self.snapshot())
+        ames, bose, chen, dahl = Student.objects.order_by("pk")
+        self.assertEqual((ames.enrollment_count, ames.graded_count, ames.gpa, ames.mean_score), (0, 0, 0, None))
+        self.assertEqual((bose.gpa, bose.mean_score), (3, 72))
+        self.assertEqual((chen.gpa, chen.mean_score), (0, 45.5))
+        self.assertEqual((dahl.gpa, dahl.enrollment_count), (4, 1))
+
+    def test_gpa_averages_graded_enrollments(self):
+        self.enroll(0, 0, 95, "A")
+        self.enroll(0, 1, 70, "C")
+        self.enroll(0, 2, 50)
+        student = Student.objects.get(pk=self.students[0].pk)
+        self.assertEqual((student.enrollment_count, student.graded_count, student.gpa), (3, 2, 3.0))
+        self.assertAlmostEqual(student.mean_score, 71.666, places=2)
+
+    def test_standing_counts_the_graded_cohort(self):
+        self.enroll(0, 0, 95, "A")
+        self.enroll(1, 0, 80, "B")
+        self.enroll(2, 1, 60, "B")
+        self.enroll(3, 2, 40, "F")
+        ames, bose, chen, dahl = Student.objects.order_by("pk")
+        self.assertEqual([ranking.standing(s)["rank"] for s in (ames, bose, chen, dahl)], [1, 2, 2, 4])
+        self.assertEqual([ranking.standing(s)["percentile"] for s in (ames, bose, chen, dahl)], [87.5, 50, 50, 12.5])
+        self.assertEqual(ranking.standing(dahl)["of"], 4)
+        enrollment = Enrollment.objects.get(student=dahl)
+        enrollment.grade = "A"
+        enrollment.save()
+        dahl.refresh_from_db()
+        self.assertEqual(ranking.standing(dahl), {"rank": 1, "of": 4, "percentile": 75})
+        Enrollment.objects.filter(student=dahl).delete()
+        dahl.refresh_from_db()
+        self.assertIsNone(ranking.standing(dahl))
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1] for row in cursor.fetchall() if "U0" in row[-1]]
+
+    def test_standing_is_one_indexed_query(self):
+        self.enroll(0, 0, 95, "A")
+        student = Student.objects.get(pk=self.students[0].pk)
+        for counts in (3, 2):
+            # The cohort size is counted once, then cached until a write.
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(ranking.standing(student)["of"], 1)
+            self.assertEqual(len(captured), 1)
+            plan = self.plan(captured[0]["sql"])
+            # Each count reads only the index, never the student rows.
+            self.assertEqual(len(plan), counts)
+            for step in plan:
+                self.assertIn("USING COVERING INDEX student_graded_gpa_idx", step)
+        self.enroll(1, 0, 80, "B")
+        self.assertEqual(ranking.standing(student)["of"], 2)
+
+    def test_course_standing_and_top(self):
+        self.enroll(0, 0, 95, "A")
+        self.enroll(1, 0, 80, "B")
+        self.enroll(2, 0, 80, "B")
+        self.enroll(3, 0, None, "")
+        self.enroll(0, 1, 40, "F")
+        enrollments = list(Enrollment.objects.filter(course=self.courses[0]).order_by("student_id"))
+        self.assertEqual(
+            [ranking.course_standing(e) for e in enrollments],
+            [{"rank": 1, "of": 3, "percentile": 100 * 2.5 / 3}, {"rank": 2, "of": 3, "percentile": 100 / 3},
+             {"rank": 2, "of": 3, "percentile": 100 / 3}, None],
+        )
+        with CaptureQueriesContext(connection) as captured:
+            ranking.course_standing(enrollments[1])
+        self.assertEqual(len(captured), 1)
+        for step in self.plan(captured[0]["sql"]):
+            self.assertIn("USING COVERING INDEX enrollment_course_score_idx", step)
+
+        self.assertEqual([e.exam_score for e in ranking.top(2, course=self.courses[0])], [95, 80])
+        # Ames averages an A and an F.
+        self.assertEqual([s.last_name for s in ranking.top(3)], ["Bose", "Chen", "Ames"])
+        plan = Enrollment.objects.filter(course=self.courses[0], exam_score__isnull=False).order_by("-exam_score", "-pk")[:2].explain()
+        self.assertIn("enrollment_course_score_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_student_list_sorts_by_gpa(self):
+        for student, grade in enumerate("CAB"):
+            self.enroll(student, 0, 70, grade)
+        response = self.client.get(reverse("student_list"), {"sort": "gpa"})
+        self.assertEqual([s.last_name for s in response.context["students"]], ["Bose", "Chen", "Ames", "Dahl"])
+        response = self.client.get(reverse("student_list"), {"sort": "gpa", "cursor": ""})
+        self.assertEqual([s.last_name for s in response.context["students"]], ["Bose", "Chen", "Ames", "Dahl"])
+        plan = Student.objects.order_by(*StudentListView.sort_orderings["gpa"]).explain()
+        self.assertIn("student_gpa_idx", plan)
+
+    def test_detail_shows_standing(self):
+        self.enroll(0, 0, 95, "A")
+        self.enroll(1, 0, 80, "B")
+        response = self.client.get(reverse("student_detail", args=[self.students[1].pk]))
+        self.assertEqual(response.context["standing"], {"rank": 2, "of": 2, "percentile": 25})
+        self.assertContains(response, "Class Rank:</strong> 2 of 2")
+
+    def test_detail_pages_show_course_rank_and_top(self):
+        first = self.enroll(0, 0, 95, "A")
+        second = self.enroll(1, 0, 80, "B")
+        url = reverse("enrollment_detail", args=[second.pk])
+        response = self.client.get(url)
+        self.assertContains(response, "Course Rank:</strong> 2 of 2")
+        # Another enrollment's score moves this page's rank.
+        first.exam_score = 70
+        first.save()
+        response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Course Rank:</strong> 1 of 2")
+
+        response = self.client.get(reverse("course_detail", args=[self.courses[0].pk]))
+        self.assertEqual(response.context["top"], [second, first])
+        self.assertContains(response, "Top 2 Scores")
+
+
+class ChartDataTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(course_name="Science", course_code="SCI101")
+        self.student = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        for i, (score, grade) in enumerate([(5, "F"), (55, "D"), (59.99, "D"), (100, "A"), (120, "A"), (None, "")]):
+            student = Student.objects.create(first_name="S", last_name=str(i), email=f"s{i}@example.com", dob="2000-01-01")
+            Enrollment.objects.create(student=student, course=self.course, exam_score=score, grade=grade)
+
+    def test_course_histogram_and_grades_in_one_query(self):
+        with self.assertNumQueries(1):
+            data = charts.course_series(self.course.pk, bins=10)
+        self.assertEqual(data["histogram"]["labels"][:2], ["0-10", "10-20"])
+        self.assertEqual(data["histogram"]["counts"], [1, 0, 0, 0, 0, 2, 0, 0, 0, 2])
+        self.assertEqual(data["grades"], {"labels": ["A", "B", "C", "D", "F"], "counts": [2, 0, 0, 2, 1]})
+        self.assertEqual(data["scored"], 5)
+        data = charts.course_series(self.course.pk, bins=3)
+        self.assertEqual(data["histogram"]["labels"], ["0-33.33", "33.33-66.67", "66.67-100"])
+        self.assertEqual(data["histogram"]["counts"], [1, 2, 2])
+        self.assertIsNone(charts.course_series(999))
+
+    def test_student_history_is_downsampled(self):
+        for i, score in enumerate([50, 70, None, 90]):
+            course = Course.objects.create(course_name=f"Course {i}", course_code=f"C{i:03}")
+            Enrollment.objects.create(student=self.student, course=course, exam_score=score, grade="B")
+        with self.assertNumQueries(1):
+            data = charts.student_series(self.student.pk)
+        self.assertEqual(data["history"], {"labels": ["C000", "C001", "C002", "C003"], "scores": [50, 70, None, 90]})
+        self.assertEqual(data["grades"]["counts"], [0, 4, 0, 0, 0])
+        data = charts.student_series(self.student.pk, points=2)
+        self.assertEqual(data["history"], {"labels": ["C000-C001", "C002-C003"], "scores": [60, 90]})
+        empty = Student.objects.create(first_name="N", last_name="E", email="n@example.com", dob="2000-01-01")
+        self.assertEqual(charts.student_series(empty.pk)["history"], {"labels": [], "scores": []})
+        self.assertIsNone(charts.student_series(999))
+
+    def test_endpoints(self):
+        url = reverse("course_chart", args=[self.course.pk])
+        response = self.client.get(url, {"bins": "4"})
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["histogram"]["counts"], [1, 0, 2, 2])
+        self.assertEqual(len(self.client.get(url, {"bins": "1000"}).json()["histogram"]["counts"]), charts.MAX_BINS)
+        self.assertEqual(len(self.client.get(url, {"bins": "x"}).json()["histogram"]["counts"]), charts.DEFAULT_BINS)
+        cached = self.client.get(url, {"bins": "4"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(reverse("course_chart", args=[999])).status_code, 404)
+        response = self.client.get(reverse("student_chart", args=[self.student.pk]))
+        self.assertEqual(response.json()["enrollments"], 0)
+        self.assertEqual(self.client.get(reverse("student_chart", args=[999])).status_code, 404)
+
+    def test_detail_pages_do_not_inline_series(self):
+        roster = views.CourseDetailView.roster_size
+        for i in range(roster):
+            student = Student.objects.create(first_name="R", last_name=f"R{i:03}", email=f"r{i}@example.com", dob="2000-01-01")
+            Enrollment.objects.create(student=student, course=self.course, exam_score=None)
+        response = self.client.get(reverse("course_detail", args=[self.course.pk]))
+        self.assertEqual(len(response.context["object"].roster), roster)
+        self.assertContains(response, f"View all {roster + 6} enrollments")
+        # The roster link filters on the course itself, not a search for its code.
+        link = f'{reverse("enrollment_list")}?course={self.course.pk}'
+        self.assertContains(response, link)
+        other = Course.objects.create(course_name="Other", course_code=f"{self.course.course_code}X")
+        Enrollment.objects.create(student=self.student, course=other, exam_score=60)
+        listed = self.client.get(reverse("enrollment_list"), {"course": self.course.pk}).context["paginator"].count
+        self.assertEqual(listed, roster + 6)
+        self.assertContains(response, reverse("course_chart", args=[self.course.pk]))
+        self.assertNotContains(response, "R049")
+        Enrollment.objects.create(student=self.student, course=self.course, exam_score=70)
+        response = self.client.get(reverse("student_detail", args=[self.student.pk]))
+        self.assertContains(response, reverse("student_chart", args=[self.student.pk]))
+
+
+class DuplicateStudentTest(TestCase):
+    def setUp(self):
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.typo = Student.objects.create(first_name="Rita", last_name="Adhikary", email="rita.a@example.com", dob="2000-01-01")
+        self.swapped = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita2@example.com", dob="2000-01-10")
+        self.namesake = Student.objects.create(first_name="Rita", last_name="Adhikari", email="ra@example.com", dob="1990-06-15")
+        self.other = Student.objects.create(first_name="Sangita", last_name="Sharma", email="sangita@example.com", dob="2000-01-01")
+
+    def test_soundex(self):
+        for name, code in [("Robert", "R163"), ("Rupert", "R163"), ("Ashcraft", "A261"), ("Tymczak", "T522"),
+                           ("Pfister", "P236"), ("Lee", "L000"), ("Müller", "M460"), ("O'Brien", "O165"), ("", "")]:
+            self.assertEqual(soundex(name), code, name)
+
+    def test_name_keys_kept_on_save_and_bulk_create(self):
+        self.assertEqual((self.typo.first_name_key, self.typo.last_name_key), ("R300", "A326"))
+        self.typo.last_name = "Sharma"
+        self.typo.save(update_fields=["last_name"])
+        self.assertEqual(Student.objects.get(pk=self.typo.pk).last_name_key, "S650")
+        [bulk] = Student.objects.bulk_create([Student(first_name="Bo", last_name="Lee", email="bo@example.com", dob="2001-01-01")])
+        self.assertEqual(Student.objects.filter(pk=bulk.pk).values_list("first_name_key", "last_name_key").get(), ("B000", "L000"))
+
+    def test_find_candidates_compares_blocks_only(self):
+        pairs, skipped = duplicates.find_candidates()
+        self.assertEqual(skipped, 0)
+        self.assertEqual(
+            [(pair.first.pk, pair.second.pk) for pair in pairs],
+            [(self.rita.pk, self.typo.pk), (self.rita.pk, self.swapped.pk), (self.typo.pk, self.swapped.pk)],
+        )
+        self.assertTrue(all(pair.score >= duplicates.THRESHOLD for pair in pairs))
+        rita, namesake = Student.objects.get(pk=self.rita.pk), Student.objects.get(pk=self.namesake.pk)
+        self.assertLess(duplicates.score(rita, namesake), duplicates.THRESHOLD)
+        with mock.patch.object(duplicates, "score", wraps=duplicates.score) as score:
+            duplicates.find_candidates()
+        # The 6 pairs of the four Rita Adhikaris; pairs sharing more than one
+        # block are scored once, and Sangita meets no one.
+        self.assertEqual(score.call_count, 6)
+
+        pairs, skipped = duplicates.find_candidates(max_block=2)
+        self.assertEqual(skipped, 1)
+        self.assertEqual([(pair.first.pk, pair.second.pk) for pair in pairs], [(self.rita.pk, self.typo.pk)])
+
+    def test_pairs_of_an_oversized_block_meet_in_a_later_one(self):
+        for i in range(2):
+            Student.objects.create(first_name="Bob", last_name="Adhikari", email=f"bob{i}@example.com", dob="2000-01-01")
+        # Rita and her typo share an oversized (last name, dob) block, so they
+        # are scored in the (first name, dob) block instead.
+        pairs, skipped = duplicates.find_candidates(max_block=3)
+        self.assertEqual(skipped, 2)
+        self.assertIn((self.rita.pk, self.typo.pk), [(pair.first.pk, pair.second.pk) for pair in pairs])
+
+    def test_clusters(self):
+        pairs, _ = duplicates.find_candidates()
+        self.assertEqual(duplicates.clusters(pairs), [(self.rita.pk, [self.typo.pk, self.swapped.pk])])
+
+    def test_merge_keeps_unique_enrollments_and_metadata(self):
+        math = Course.objects.create(course_name="Math", course_code="MATH101")
+        art = Course.objects.create(course_name="Art", course_code="ART101")
+        tag = Metadata.objects.create(key="house", value="red")
+        note = Metadata.objects.create(key="note", value="late")
+        self.rita.metadata.add(tag)
+        self.typo.metadata.add(tag, note)
+        kept = Enrollment.objects.create(student=self.rita, course=math)
+        clash = Enrollment.objects.create(student=self.typo, course=math, exam_score=91, grade="A")
+        clash.metadata.add(note)
+        moved = Enrollment.objects.create(student=self.typo, course=art, exam_score=70, grade="C")
+        Enrollment.objects.create(student=self.swapped, course=art, exam_score=50, grade="D")
+
+        self.assertEqual(duplicates.merge_students(self.rita.pk, [self.typo.pk, self.swapped.pk]), (1, 2))
+        self.assertFalse(Student.objects.filter(pk__in=[self.typo.pk, self.swapped.pk]).exists())
+        self.assertEqual(
+            set(Enrollment.objects.values_list("pk", "student_id", "course_id", "exam_score", "grade")),
+            {(kept.pk, self.rita.pk, math.pk, 91, "A"), (moved.pk, self.rita.pk, art.pk, 70, "C")},
+        )
+        self.assertEqual(set(Enrollment.objects.get(pk=kept.pk).metadata.all()), {note})
+        self.assertEqual(set(self.rita.metadata.all()), {tag, note})
+        self.rita.refresh_from_db()
+        self.assertEqual((self.rita.enrollment_count, self.rita.graded_count, self.rita.gpa), (2, 2, 3.0))
+        self.assertEqual(CourseStats.objects.get(course=art).enrollment_count, 1)
+        self.assertEqual(CourseStats.objects.get(course=math).score_count, 1)
+
+    def test_command(self):
+        Enrollment.objects.create(student=self.typo, course=Course.objects.create(course_name="Math", course_code="MATH101"))
+        out = StringIO()
+        call_command("find_duplicate_students", "--limit", "1", stdout=out)
+        self.assertIn(f"#{self.rita.pk} Rita Adhikari <rita@example.com> 2000-01-01  ~  #{self.typo.pk} Rita Adhikary", out.getvalue())
+        self.assertIn("... and 2 more", out.getvalue())
+        self.assertIn("Found 3 candidate pairs.", out.getvalue())
+        self.assertEqual(Student.objects.count(), 5)
+
+        out = StringIO()
+        call_command("find_duplicate_students", "--merge", stdout=out)
+        self.assertIn("Merged 2 students into 1: moved 1 enrollments", out.getvalue())
+        self.assertEqual(set(Student.objects.values_list("pk", flat=True)), {self.rita.pk, self.namesake.pk, self.other.pk})
+        self.assertEqual(Enrollment.objects.get().student_id, self.rita.pk)
+
+    def test_create_form_asks_before_saving_a_likely_duplicate(self):
+        User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.client.login(username="admin", password="adminpass")
+        data = {"first_name": "Reta", "last_name": "Adhikari", "email": "reta@example.com", "dob": "2000-01-01"}
+        response = self.client.post(reverse("student_create"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "This student may already exist: Rita Adhikari (rita@example.com")
+        self.assertContains(response, "This is a different person")
+        self.assertFalse(Student.objects.filter(email="reta@example.com").exists())
+
+        response = self.client.post(reverse("student_create"), {**data, "not_duplicate": "on"})
+        self.assertRedirects(response, reverse("student_list"))
+        reta = Student.objects.get(email="reta@example.com")
+
+        # Editing never asks.
+        response = self.client.post(reverse("student_edit", args=[reta.pk]), {**data, "first_name": "Rita"})
+        self.assertRedirects(response, reverse("student_list"))
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.calls = []
+
+        def flaky(progress, fail_times=0):
+            self.calls.append(progress.job.attempts)
+            progress(1, 2, "halfway")
+            if len(self.calls) <= fail_times:
+                raise RuntimeError("boom")
+            return {"ok": True}
+
+        tasks = {"flaky": jobs.Task(flaky, "Flaky", 3, False)}
+        patcher = mock.patch.dict(jobs.TASKS, tasks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        files = tempfile.TemporaryDirectory()
+        self.addCleanup(files.cleanup)
+        self.enterContext(override_settings(JOB_FILES_DIR=files.name))
+
+    def test_claim_takes_the_oldest_due_job_once(self):
+        later = jobs.enqueue("flaky", delay=60)
+        first = jobs.enqueue("flaky", user=self.user)
+        second = jobs.enqueue("flaky")
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no_such_task")
+        claimed = jobs.claim("w1")
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts, claimed.worker), (first.pk, Job.RUNNING, 1, "w1"))
+        self.assertEqual(claimed.created_by, self.user)
+        self.assertEqual(jobs.claim("w2").pk, second.pk)
+        self.assertIsNone(jobs.claim("w3"))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.QUEUED)
+
+    def test_retries_with_backoff_then_fails(self):
+        job = jobs.enqueue("flaky", {"fail_times": 5})
+        job = jobs.run(jobs.claim("w"))
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("RuntimeError: boom", job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=jobs.RETRY_DELAY - 1))
+        self.assertIsNone(jobs.claim("w"))
+
+        for attempt in (2, 3):
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            job = jobs.run(jobs.claim("w"))
+        self.assertEqual((job.status, job.attempts, self.calls), (Job.FAILED, 3, [1, 2, 3]))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_success_records_result_and_progress(self):
+        job = jobs.enqueue("flaky", {"fail_times": 1})
+        jobs.run(jobs.claim("w"))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.run(jobs.claim("w"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.error), (Job.DONE, {"ok": True}, ""))
+        self.assertEqual((job.progress, job.total, job.message, job.percent), (2, 2, "halfway", 100))
+
+    def test_progress_is_throttled(self):
+        job = jobs.enqueue("flaky")
+        progress = jobs.Progress(job, interval=60)
+        with self.assertNumQueries(1):
+            for done in range(100):
+                progress(done, 100)
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, 0)
+        progress(50, force=True)
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, 50)
+
+    def test_stale_running_jobs_are_requeued_or_failed(self):
+        retry, spent = jobs.enqueue("flaky"), jobs.enqueue("flaky")
+        jobs.claim("w")
+        jobs.claim("w")
+        Job.objects.filter(pk=spent.pk).update(attempts=3)
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(60), (1, 1))
+        self.assertEqual(Job.objects.get(pk=retry.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=spent.pk).status, Job.FAILED)
+
+    def test_background_export(self):
+        Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        Student.objects.create(first_name="Sangita", last_name="Sharma", email="sangita@example.com", dob="2001-01-01")
+        self.client.login(username="admin", password="adminpass")
+        response = self.client.get(reverse("student_list"), {"format": "csv", "q": "Rita", "background": "1"})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]))
+        self.assertEqual((job.task, job.args["route"], job.args["fmt"], job.args["params"]), ("export", "student_list", "csv", "format=csv&q=Rita"))
+        self.assertContains(self.client.get(reverse("job_detail", args=[job.pk])), "data-job-status-url")
+
+        job = jobs.run(jobs.claim("w"))
+        self.assertEqual((job.status, job.result), (Job.DONE, {"file": "students.csv", "rows": 1}), job.error)
+        response = self.client.get(reverse("job_file", args=[job.pk]))
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertIn("rita@example.com", content)
+        self.assertIn('filename="students.csv"', response["Content-Disposition"])
+        self.assertContains(self.client.get(reverse("job_detail", args=[job.pk])), "Download students.csv")
+
+        # Guests get the plain export.
+        self.client.logout()
+        response = self.client.get(reverse("student_list"), {"format": "csv", "background": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_background_import(self):
+        self.client.login(username="admin", password="adminpass")
+        upload = SimpleUploadedFile("roster.csv", b"first_name,last_name,email,dob\nRita,Adhikari,rita@example.com,2000-01-01\nBad,Row,nope,2000-01-01\n")
+        response = self.client.post(reverse("roster_import"), {"kind": "students", "file": upload, "background": "on"})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]))
+        self.assertFalse(Student.objects.exists())
+        self.assertTrue(os.path.exists(job.args["path"]))
+
+        job = jobs.run(jobs.claim("w"))
+        self.assertEqual((job.status, job.result["created"], job.result["rejected"]), (Job.DONE, 1, 1), job.error)
+        self.assertEqual(Student.objects.get().email, "rita@example.com")
+        self.assertFalse(os.path.exists(job.args["path"]))
+        self.assertContains(self.client.get(reverse("job_detail", args=[job.pk])), "Line 3:")
+
+    def test_pages_are_staff_only(self):
+        job = jobs.enqueue("flaky")
+        for url in [reverse("job_list"), reverse("job_detail", args=[job.pk]), reverse("job_status", args=[job.pk])]:
+            self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username="admin", password="adminpass")
+        self.assertContains(self.client.get(reverse("job_list")), "Flaky")
+        self.assertEqual(self.client.get(reverse("job_status", args=[job.pk])).json()["status"], Job.QUEUED)
+        self.assertEqual(self.client.post(reverse("job_create"), {"task": "flaky"}).status_code, 400)
+
+        response = self.client.post(reverse("job_create"), {"task": "recompute_stats"})
+        job = Job.objects.get(task="recompute_stats")
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]))
+        self.assertEqual(jobs.run(jobs.claim("w")).status, Job.DONE)
+
+
+class RunWorkersTest(TransactionTestCase):
+    # The in-memory test database fails contended writes at once instead of
+    # waiting, so the workers run on a file copy of it, where writers queue
+    # on busy_timeout as they do in production. The file is dropped with the
+    # class, so the "jobs" alias needs no flushing between tests.
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "jobs.sqlite3")
+        call_command("sync_replica", target=path, stdout=StringIO())
+        connections.settings["jobs"] = {**connections.settings["default"], "NAME": path}
+        cls.databases = cls.databases | {"jobs"}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["jobs"].close()
+        del connections["jobs"]
+        del connections.settings["jobs"]
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def test_thread_pool_drains_the_queue(self):
+        Course.objects.using("jobs").create(course_name="Math", course_code="MATH101")
+        queued = [jobs.enqueue("recompute_stats", using="jobs") for _ in range(4)]
+        out = StringIO()
+        call_command("run_workers", "--workers", "2", "--burst", "--poll", "0.05", "--database", "jobs", stdout=out)
+        # One burst runs every job exactly once: each claimed by one worker,
+        # on its first attempt, and nothing left for a retry or the stale sweep.
+        done = Job.objects.using("jobs").order_by("pk")
+        self.assertEqual([(job.pk, job.status, job.attempts) for job in done], [(job.pk, Job.DONE, 1) for job in queued])
+        self.assertEqual([job.result for job in done], [{"courses": 1, "students": 0}] * len(queued))
+        self.assertIn("Started 2 thread workers.", out.getvalue())
+        self.assertEqual(out.getvalue().count(" done after "), len(queued))
+        self.assertNotIn("could not", out.getvalue())
+
+    def test_long_task_keeps_its_heartbeat(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow(progress):
+            started.set()
+            release.wait(10)
+            return {"ok": True}
+
+        self.enterContext(mock.patch.dict(jobs.TASKS, {"slow": jobs.Task(slow, "Slow", 3, False)}))
+        self.enterContext(mock.patch.object(jobs, "HEARTBEAT_INTERVAL", 0.05))
+        job = jobs.enqueue("slow", using="jobs")
+        worker = threading.Thread(target=jobs.Worker(using="jobs", burst=True).run)
+        worker.start()
+        self.assertTrue(started.wait(10))
+        # Silent for longer than stale_after, but its worker is alive.
+        time.sleep(0.5)
+        self.assertEqual(jobs.requeue_stale(0.25, using="jobs"), (0, 0))
+        release.set()
+        worker.join()
+        job.refresh_from_db(using="jobs")
+        self.assertEqual((job.status, job.attempts, job.result), (Job.DONE, 1, {"ok": True}))
+
+
+class BulkDeleteTest(TestCase):
+    # Every table the deletes reach, compared row by row with updated_at
+    # left out (it is compared as the set of touched rows instead).
+    MODELS = [
+        Student, Course, Instructor, Enrollment, CourseStats, Metadata,
+        Student.metadata.through, Course.metadata.through, Instructor.metadata.through,
+        Instructor.courses.through, Enrollment.metadata.through, ArchivedEnrollment,
+    ]
+
+    def setUp(self):
+        datasets.DatasetGenerator(students=30, courses=6, instructors=4, enrollments=150, fanout=2, seed=3).run()
+        term = Term.objects.create(name="Old", starts_on=date(2020, 1, 1), ends_on=date(2020, 6, 1))
+        Enrollment.objects.filter(pk__in=list(Enrollment.objects.order_by("pk").values_list("pk", flat=True))[::5]).update(term=term)
+        archive.archive_term(term)
+
+    def snapshot(self, since):
+        tables = {}
+        for model in self.MODELS:
+            fields = [f.attname for f in model._meta.concrete_fields if f.attname != "updated_at"]
+            tables[model._meta.label] = sorted(
+                tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                for row in model.objects.values_list(*fields)
+            )
+            if any(f.attname == "updated_at" for f in model._meta.concrete_fields):
+                tables[f"{model._meta.label} touched"] = sorted(model.objects.filter(updated_at__gte=since).values_list("pk", flat=True))
+        with connection.cursor() as cursor:
+            for name in search.INDEXES:
+                table = search.index_table(apps.get_model("students", name))
+                cursor.execute(f"SELECT rowid, body FROM {table} ORDER BY rowid")
+                tables[table] = cursor.fetchall()
+        return tables
+
+    def assertMatchesCollector(self, model, pks, **kwargs):
+        since = timezone.now()
+        with transaction.atomic():
+            expected_counts = model.objects.filter(pk__in=pks).delete()
+            expected = self.snapshot(since)
+            transaction.set_rollback(True)
+        self.assertEqual(deletion.bulk_delete(model, pks, **kwargs), expected_counts)
+        actual = self.snapshot(since)
+        for table in expected:
+            self.assertEqual(actual[table], expected[table], table)
+
+    def test_students_match_the_collector(self):
+        pks = list(Student.objects.filter(enrollments__isnull=False).values_list("pk", flat=True).distinct()[:7])
+        self.assertMatchesCollector(Student, pks, batch_size=3)
+
+    def test_courses_match_the_collector(self):
+        pks = list(Course.objects.order_by("-stats__enrollment_count").values_list("pk", flat=True)[:2])
+        self.assertTrue(Instructor.objects.filter(courses__in=pks).exists())
+        self.assertMatchesCollector(Course, pks, batch_size=4)
+
+    def test_queries_do_not_grow_with_enrollments(self):
+        course = Course.objects.order_by("-stats__enrollment_count").first()
+        self.assertGreater(course.enrollments.count(), 20)
+        with CaptureQueriesContext(connection) as captured:
+            deletion.bulk_delete(Course, [course.pk], batch_size=1000)
+        self.assertLess(len(captured), 40)
+        self.assertFalse(Enrollment.objects.filter(course_id=course.pk).exists())
+
+    def test_single_and_filtered_delete_views(self):
+        User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.client.login(username="admin", password="adminpass")
+        student = Student.objects.filter(enrollments__isnull=False).first()
+        response = self.client.post(reverse("student_delete", args=[student.pk]))
+        self.assertRedirects(response, reverse("student_list"))
+        self.assertFalse(Enrollment.objects.filter(student_id=student.pk).exists())
+
+        target = Student.objects.order_by("pk").first()
+        query = {"q": target.last_name}
+        matching = set(StudentListView.model.objects.filter(pk__in=search.search(Student.objects.all(), target.last_name, StudentListView.search_fields)).values_list("pk", flat=True))
+        response = self.client.get(reverse("student_bulk_delete"), query)
+        self.assertContains(response, f"{len(matching)} students")
+        response = self.client.post(reverse("student_bulk_delete") + f"?q={target.last_name}")
+        self.assertRedirects(response, reverse("student_list"), fetch_redirect_response=False)
+        self.assertFalse(Student.objects.filter(pk__in=matching).exists())
+        self.assertTrue(Student.objects.exists())
+
+        # Without a filter the page refuses rather than emptying the table.
+        self.assertEqual(self.client.post(reverse("course_bulk_delete")).status_code, 400)
+
+    def test_large_selections_run_as_a_job(self):
+        User.objects.create_superuser(username="admin", email="admin@example.com", password="adminpass")
+        self.client.login(username="admin", password="adminpass")
+        course = Course.objects.order_by("pk").first()
+        with mock.patch.object(views.BulkDeleteView, "inline_limit", 0):
+            response = self.client.post(reverse("course_bulk_delete") + f"?q={course.course_code}")
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]))
+        self.assertTrue(Course.objects.filter(pk=course.pk).exists())
+        job = jobs.run(jobs.claim("w"))
+        self.assertEqual(job.status, Job.DONE, job.error)
+        self.assertEqual(job.result["deleted"], 1)
+        self.assertFalse(Course.objects.filter(pk=course.pk).exists())
+
+
+class TermArchiveTest(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.fall = Term.objects.create(name="Fall 2024", starts_on=date(2024, 9, 1), ends_on=date(2024, 12, 20))
+        self.spring = Term.objects.create(name="Spring", starts_on=today - timedelta(days=10), ends_on=today + timedelta(days=60))
+        self.rita = Student.objects.create(first_name="Rita", last_name="Adhikari", email="rita@example.com", dob="2000-01-01")
+        self.sita = Student.objects.create(first_name="Sita", last_name="Karki", email="sita@example.com", dob="2001-02-03")
+        self.math = Course.objects.create(course_name="Mathematics", course_code="MATH101")
+        self.bio = Course.objects.create(course_name="Biology", course_code="BIO101")
+        self.old = Enrollment.objects.create(student=self.rita, course=self.math, term=self.fall, exam_score=91, grade="A")
+        self.old.metadata.add(Metadata.objects.create(key="section", value="B"))
+        Enrollment.objects.create(student=self.sita, course=self.bio, term=self.fall, exam_score=55, grade="F")
+        # Retaking a course in a later term is allowed.
+        self.retake = Enrollment.objects.create(student=self.rita, course=self.math, term=self.spring, exam_score=72, grade="C")
+
+    def aggregates(self, student):
+        student.refresh_from_db()
+        return [getattr(student, field) for field in stats.STUDENT_FIELDS]
+
+    def test_uniqueness_per_term(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(student=self.rita, course=self.math, term=self.spring)
+        Enrollment.objects.create(student=self.sita, course=self.math)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(student=self.sita, course=self.math)
+
+    def test_current_term(self):
+        self.assertEqual(Term.objects.current(), self.spring)
+        Enrollment.objects.filter(term=self.spring).delete()
+        self.spring.delete()
+        # With no term running, the latest one to have started.
+        self.assertEqual(Term.objects.current(), self.fall)
+
+    def test_archive_moves_enrollments(self):
+        before = self.aggregates(self.rita)
+        with self.assertRaises(CommandError):
+            call_command("archive_term", "Spring", stdout=StringIO())
+        out = StringIO()
+        call_command("archive_term", "Fall 2024", stdout=out)
+        self.assertIn("Archived 2 enrollments", out.getvalue())
+
+        self.assertEqual(list(Enrollment.objects.values_list("pk", flat=True)), [self.retake.pk])
+        archived = ArchivedEnrollment.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.student, archived.course, archived.term, archived.grade), (self.rita, self.math, self.fall, "A"))
+        self.assertEqual(archived.metadata, [["section", "B"]])
+        self.assertFalse(Enrollment.metadata.through.objects.exists())
+        self.fall.refresh_from_db()
+        self.assertIsNotNone(self.fall.archived_at)
+
+        # Course statistics cover live enrollments; student aggregates the whole record.
+        self.assertEqual(CourseStats.objects.get(course=self.math).enrollment_count, 1)
+        self.assertEqual(CourseStats.objects.get(course=self.bio).enrollment_count, 0)
+        self.assertEqual(self.aggregates(self.rita), before)
+        stats.recompute_students()
+        self.assertEqual(self.aggregates(self.rita), before)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.index_table(Enrollment)} WHERE rowid = %s", [self.old.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_archive_copy_without_json_sql(self):
+        # Databases without an entry in PAIRS_SQL copy through the ORM.
+        self.old.metadata.add(Metadata.objects.create(key="room", value="12"))
+        with mock.patch.dict(archive.PAIRS_SQL, clear=True):
+            self.assertEqual(archive.archive_term(self.fall)[0], 2)
+        archived = ArchivedEnrollment.objects.order_by("pk")
+        self.assertEqual([a.metadata for a in archived], [[["room", "12"], ["section", "B"]], []])
+        self.assertEqual(archived[0].exam_score, 91)
+
+    def test_student_history_unions_the_archive(self):
+        archive.archive_term(self.fall)
+        url = reverse("student_detail", args=[self.rita.pk])
+        response = self.client.get(url)
+        self.assertNotContains(response, "Fall 2024")
+        self.assertContains(response, "Spring")
+        history = self.client.get(url, {"history": "1"})
+        self.assertContains(history, "Fall 2024")
+        self.assertContains(history, "section: B")
+        self.assertEqual([e.term for e in history.context["history"]], [self.spring, self.fall])
+        self.assertNotEqual(response["ETag"], history["ETag"])
+
+    def test_enrollment_list_filters_by_term(self):
+        response = self.client.get(reverse("enrollment_list"), {"term": "current"})
+        self.assertEqual([e.pk for e in response.context["enrollments"]], [self.retake.pk])
+        response = self.client.get(reverse("enrollment_list"), {"term": self.fall.pk})
+        self.assertEqual(len(response.context["enrollments"]), 2)
+
+    def test_archived_enrollments_follow_merges_and_deletes(self):
+        archive.archive_term(self.fall)
+        twin = Student.objects.create(first_name="Rita", last_name="Adhikary", email="rita2@example.com", dob="2000-01-01")
+        ArchivedEnrollment.objects.filter(student=self.rita).update(student=twin)
+        duplicates.merge_students(self.rita.pk, [twin.pk])
+        self.assertEqual(ArchivedEnrollment.objects.get(pk=self.old.pk).student_id, self.rita.pk)
+        self.assertEqual(self.aggregates(self.rita)[0], 2)
+
+        deletion.bulk_delete(Course, [self.math.pk])
+        self.assertFalse(ArchivedEnrollment.objects.filter(course=self.math).exists())
+        self.assertEqual(self.aggregates(self.rita)[0], 0)
+        deletion.bulk_delete(Student, [self.sita.pk])
+        self.assertFalse(ArchivedEnrollment.objects.exists())
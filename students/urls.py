@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -7,14 +7,18 @@ urlpatterns = [
     # Students
     path("students/", views.StudentListView.as_view(), name="student_list"),
     path("students/create/", views.StudentCreateView.as_view(), name="student_create"),
+    path("students/delete/", views.StudentBulkDeleteView.as_view(), name="student_bulk_delete"),
     path("students/<int:pk>/", views.StudentDetailView.as_view(), name="student_detail"),
+    path("students/<int:pk>/chart/", views.StudentChartView.as_view(), name="student_chart"),
     path("students/<int:pk>/edit/", views.StudentUpdateView.as_view(), name="student_edit"),
     path("students/<int:pk>/delete/", views.StudentDeleteView.as_view(), name="student_delete"),
 
     # Courses
     path("courses/", views.CourseListView.as_view(), name="course_list"),
     path("courses/create/", views.CourseCreateView.as_view(), name="course_create"),
+    path("courses/delete/", views.CourseBulkDeleteView.as_view(), name="course_bulk_delete"),
     path("courses/<int:pk>/", views.CourseDetailView.as_view(), name="course_detail"),
+    path("courses/<int:pk>/chart/", views.CourseChartView.as_view(), name="course_chart"),
     path("courses/<int:pk>/edit/", views.CourseUpdateView.as_view(), name="course_edit"),
     path("courses/<int:pk>/delete/", views.CourseDeleteView.as_view(), name="course_delete"),
 
@@ -37,6 +41,23 @@ urlpatterns = [
     path("metadata/create/", views.MetadataCreateView.as_view(), name="metadata_create"),
     path("metadata/<int:pk>/update/", views.MetadataUpdateView.as_view(), name="metadata_edit"),
     path("metadata/<int:pk>/delete/", views.MetadataDeleteView.as_view(), name="metadata_delete"),
+
+    # Bulk import
+    path("import/", views.RosterImportView.as_view(), name="roster_import"),
+
+    # Background jobs
+    path("jobs/", views.JobListView.as_view(), name="job_list"),
+    path("jobs/create/", views.JobCreateView.as_view(), name="job_create"),
+    path("jobs/<int:pk>/", views.JobDetailView.as_view(), name="job_detail"),
+    path("jobs/<int:pk>/status/", views.JobStatusView.as_view(), name="job_status"),
+    path("jobs/<int:pk>/file/", views.JobFileView.as_view(), name="job_file"),
+
+    # Read-only JSON API
+    path("api/<str:resource>/", api.ApiListView.as_view(), name="api_list"),
+    path("api/<str:resource>/<int:pk>/", api.ApiDetailView.as_view(), name="api_detail"),
+
+    # Form widget lookups
+    path("autocomplete/<str:model>/", views.AutocompleteView.as_view(), name="autocomplete"),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,8 @@
+from itertools import islice
+
+
+def chunks(iterable, size):
+    """Lists of up to size items from iterable, in order."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
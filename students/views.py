@@ -1,39 +1,97 @@
+import io
+import os
+import uuid
+
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.db.models import Q
-from .models import Student, Course, Instructor, Enrollment, Metadata
-from .forms import StudentForm, CourseForm, InstructorForm, EnrollmentForm, MetadataForm
+from django.db.models import Count, Prefetch
+from django.http import FileResponse, Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.generic import View, ListView, DetailView, CreateView, UpdateView, DeleteView, FormView, TemplateView
+from .models import Student, Course, CourseStats, Instructor, Enrollment, Job, Metadata, Term
+from .forms import StudentForm, CourseForm, InstructorForm, EnrollmentForm, MetadataForm, RosterImportForm
+from . import archive, charts, deletion, exports, jobs, ranking, search, stats
+from .tasks import job_file
+from .caching import CachedPageMixin
+from .conditional import ConditionalDetailMixin, conditional, last_modified, make_etag, updated_paths
+from .filters import metadata_q, needs_distinct
+from .importers import IMPORTERS, guess_format, read_rows
+from .pagination import InvalidCursor, KeysetPaginator
 
 # Parent list view class
-class SearchPaginateListView(ListView):
+class SearchPaginateListView(CachedPageMixin, ListView):
     paginate_by = 10
+    # Read-only: served from the replica database (sms/routers.py).
+    use_replica = True
     search_fields = []
+    # Seek pagination with opaque ?cursor= links instead of ?page=N. Can also
+    # be requested per request by passing a (possibly empty) cursor parameter.
+    keyset_pagination = False
+    # Columns streamed by ?format=csv / ?format=jsonl.
+    export_fields = []
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get("format")
+        if fmt in exports.FORMATS and self.export_fields:
+            if request.GET.get("background") and request.user.is_staff:
+                return self.export_in_background(fmt)
+            return self.export(fmt)
+        return super().get(request, *args, **kwargs)
+
+    def export_in_background(self, fmt):
+        params = self.request.GET.copy()
+        del params["background"]
+        job = jobs.enqueue("export", {"route": self.request.resolver_match.url_name, "params": params.urlencode(), "fmt": fmt}, user=self.request.user)
+        messages.info(self.request, "The export is being prepared; download it here when it is done.")
+        return redirect("job_detail", pk=job.pk)
+
+    def get_export_queryset(self):
+        # The streamed body is read after ReplicaPinMiddleware has turned
+        # replica reads off again, so pin the database the view chose now.
+        queryset = self.get_queryset()
+        return queryset.using(queryset.db)
+
+    def export(self, fmt):
+        queryset = self.get_export_queryset()
+        filename = self.model._meta.verbose_name_plural.replace(" ", "_")
+        respond = lambda: exports.export_response(queryset, self.export_fields, fmt, filename)
+        modified, rows = last_modified(queryset, updated_paths(self.model, self.export_fields))
+        if modified is None:
+            return respond()
+        # Row count catches deletions, which leave the latest timestamp unchanged.
+        etag = make_etag(type(self).__name__, self.request.GET.urlencode(), rows, modified.isoformat())
+        return conditional(self.request, etag, modified, respond)
 
     def get_queryset(self):
         qs = super().get_queryset()
         q = self.request.GET.get("q", "").strip()
 
         if q and self.search_fields:
-            cond = Q()
-            for f in self.search_fields:
-                if not f:
-                    continue
-                if "__" in f:
-                    cond |= Q(**{f: q})
-                else:
-                    cond |= Q(**{f"{f}__icontains": q})
-            qs = qs.filter(cond)
+            qs = search.search(qs, q, self.search_fields)
+            if "search_rank" in qs.query.annotations:
+                qs = qs.order_by("search_rank", *(self.get_ordering() or ()))
 
         key = self.request.GET.get("meta_key", "").strip()
         val = self.request.GET.get("meta_val", "").strip()
-        if key:
-            qs = qs.filter(metadata__key__icontains=key)
-        if val:
-            qs = qs.filter(metadata__value__icontains=val)
+        if key or val:
+            qs = qs.filter(metadata_q(self.model, key, val))
 
-        return qs.distinct()
+        if needs_distinct(qs):
+            qs = qs.distinct()
+        return qs
 
+    def paginate_queryset(self, queryset, page_size):
+        if not (self.keyset_pagination or "cursor" in self.request.GET):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, queryset.query.order_by)
+        try:
+            page = paginator.page(self.request.GET.get("cursor") or None)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return paginator, page, page.object_list, page.has_other_pages()
 
 
 #Metadata CRUD
@@ -42,9 +100,8 @@ class MetadataListView(LoginRequiredMixin, SearchPaginateListView):
     template_name = "metadata/metadata_list.html"
     context_object_name = "metadata"
     search_fields=['key','value']
-    def get_queryset(self):
-        qs = super().get_queryset().order_by("key", "value")
-        return qs
+    ordering = ["key", "value"]
+    export_fields = ["id", "key", "value", "created_at", "updated_at"]
 
 class MetadataCreateView(LoginRequiredMixin, CreateView):
     model = Metadata
@@ -60,7 +117,7 @@ class MetadataUpdateView(LoginRequiredMixin, UpdateView):
 
 class MetadataDeleteView(LoginRequiredMixin, DeleteView):
     model = Metadata
-    template_name = "metadata/metadata_delete.html"
+    template_name = "includes/confirm_delete.html"
     success_url = reverse_lazy("metadata_list")
 
 
@@ -72,15 +129,51 @@ class StudentListView(SearchPaginateListView):
     template_name = "students/student_list.html"
     context_object_name = "students"
     search_fields = ["first_name", "last_name", "email"]
+    ordering = ["last_name", "first_name"]
+    export_fields = ["id", "first_name", "last_name", "email", "dob"]
+    cache_models = (Student, Metadata)
+    # ?sort=gpa: each ordering is covered by an index on the student table.
+    sort_orderings = {"gpa": ["-gpa", "last_name", "first_name"]}
+
+    def get_ordering(self):
+        return self.sort_orderings.get(self.request.GET.get("sort"), self.ordering)
+
     def get_queryset(self):
-        qs = super().get_queryset().prefetch_related("metadata").order_by("last_name", "first_name")
+        qs = super().get_queryset().prefetch_related("metadata")
         return qs
 
 
 
-class StudentDetailView(DetailView):
+class StudentDetailView(ConditionalDetailMixin, CachedPageMixin, DetailView):
     model = Student
     template_name = "students/student_detail.html"
+    cache_models = (Student, Enrollment, Course, Metadata, Term)
+    modified_paths = ("updated_at", "metadata__updated_at", "enrollments__updated_at", "enrollments__course__updated_at", "enrollments__metadata__updated_at")
+    # The class rank moves with every other student's grades.
+    etag_models = (Student, Enrollment)
+    use_replica = True
+    def get_queryset(self):
+        enrollments = Enrollment.objects.select_related("course", "term").prefetch_related("metadata").order_by("course__course_code")
+        return Student.objects.prefetch_related("metadata", Prefetch("enrollments", queryset=enrollments))
+
+    def show_history(self):
+        # ?history=1 adds the enrollments of archived terms to the live ones.
+        return bool(self.request.GET.get("history"))
+
+    def etag(self, request, kwargs, modified):
+        return make_etag(super().etag(request, kwargs, modified), self.show_history())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["standing"] = self.get_standing()
+        context["history"] = self.get_history() if self.show_history() else None
+        return context
+
+    def get_standing(self):
+        return ranking.standing(self.object)
+
+    def get_history(self):
+        return archive.history(self.object)
 
 class StudentCreateView(LoginRequiredMixin, CreateView):
     model = Student
@@ -95,9 +188,16 @@ class StudentUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "students/student_form.html"
     success_url = reverse_lazy("student_list")
 
-class StudentDeleteView(LoginRequiredMixin, DeleteView):
+class SetDeleteMixin:
+    # Set-based DELETEs (students/deletion.py) instead of the collector loading every enrollment.
+    def form_valid(self, form):
+        success_url = self.get_success_url()
+        deletion.bulk_delete(self.model, [self.object.pk])
+        return HttpResponseRedirect(success_url)
+
+class StudentDeleteView(LoginRequiredMixin, SetDeleteMixin, DeleteView):
     model = Student
-    template_name = "students/student_delete.html"
+    template_name = "includes/confirm_delete.html"
     success_url = reverse_lazy("student_list")
 
 # Course CRUD
@@ -106,14 +206,77 @@ class CourseListView(SearchPaginateListView):
     context_object_name = "courses"
     search_fields=['course_name', 'course_code']
     template_name = "courses/course_list.html"
+    ordering = ["course_name", "course_code"]
+    export_fields = ["id", "course_code", "course_name", "description"]
+    cache_models = (Course, Metadata)
     def get_queryset(self):
-        qs = super().get_queryset().prefetch_related("metadata").order_by("course_name", "course_code")
+        qs = super().get_queryset().prefetch_related("metadata")
         return qs
 
 
-class CourseDetailView(DetailView):
+class CourseDetailView(ConditionalDetailMixin, CachedPageMixin, DetailView):
     model = Course
     template_name = "courses/course_detail.html"
+    cache_models = (Course, Enrollment, Student, Metadata, CourseStats)
+    modified_paths = ("updated_at", "metadata__updated_at", "enrollments__updated_at", "enrollments__student__updated_at")
+    use_replica = True
+    # The page lists this many enrollments and links to the rest, so its
+    # size does not grow with the course.
+    roster_size = 50
+    top_size = 5
+
+    def roster(self):
+        enrollments = Enrollment.objects.select_related("student").order_by("student__last_name", "student__first_name")
+        return Prefetch("enrollments", queryset=enrollments[:self.roster_size], to_attr="roster")
+
+    def get_queryset(self):
+        return Course.objects.select_related("stats").prefetch_related("metadata", self.roster())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["stats"] = stats.get_stats(self.object)
+        context["top"] = self.get_top()
+        return context
+
+    def get_top(self):
+        return ranking.top(self.top_size, course=self.object)
+
+class ChartDataView(ConditionalDetailMixin, CachedPageMixin, View):
+    """
+    Pre-aggregated chart series of one detail page as JSON. The page loads
+    it after first paint, so its HTML does not grow with the data.
+    """
+    use_replica = True
+    pk_url_kwarg = "pk"
+
+    def get(self, request, pk):
+        data = self.series(pk)
+        if data is None:
+            raise Http404(f"No {self.model._meta.verbose_name} found matching the query")
+        return JsonResponse(data)
+
+    def etag(self, request, kwargs, modified):
+        # Same data for every user; the parameters pick the series shape.
+        return make_etag(type(self).__name__, kwargs, request.GET.urlencode(), modified.isoformat())
+
+
+class CourseChartView(ChartDataView):
+    model = Course
+    cache_models = (Course, Enrollment)
+    modified_paths = ("updated_at", "enrollments__updated_at")
+
+    def series(self, pk):
+        return charts.course_series(pk, charts.bounded(self.request.GET.get("bins"), charts.DEFAULT_BINS, charts.MAX_BINS))
+
+
+class StudentChartView(ChartDataView):
+    model = Student
+    cache_models = (Student, Enrollment, Course)
+    modified_paths = ("updated_at", "enrollments__updated_at", "enrollments__course__updated_at")
+
+    def series(self, pk):
+        return charts.student_series(pk, charts.bounded(self.request.GET.get("points"), charts.DEFAULT_POINTS, charts.MAX_POINTS))
+
 
 class CourseCreateView(LoginRequiredMixin, CreateView):
     model = Course
@@ -127,9 +290,9 @@ class CourseUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "courses/course_form.html"
     success_url = reverse_lazy("course_list")
 
-class CourseDeleteView(LoginRequiredMixin, DeleteView):
+class CourseDeleteView(LoginRequiredMixin, SetDeleteMixin, DeleteView):
     model = Course
-    template_name = "courses/course_delete.html"
+    template_name = "includes/confirm_delete.html"
     success_url = reverse_lazy("course_list")
 
 # Instructor
@@ -138,14 +301,23 @@ class InstructorListView(SearchPaginateListView):
     search_fields = ["first_name", "last_name", "email", "courses__course_name", "courses__course_code"]
     template_name = "instructors/instructor_list.html"
     context_object_name="instructors"
+    ordering = ["first_name", "last_name"]
+    export_fields = ["id", "first_name", "last_name", "email"]
+    cache_models = (Instructor, Course, Metadata)
     def get_queryset(self):
-        qs = super().get_queryset().prefetch_related("metadata","courses").order_by("first_name", "last_name")
+        qs = super().get_queryset().prefetch_related("metadata","courses")
         return qs
 
 
-class InstructorDetailView(DetailView):
+class InstructorDetailView(ConditionalDetailMixin, CachedPageMixin, DetailView):
     model = Instructor
     template_name = "instructors/instructor_detail.html"
+    cache_models = (Instructor, Course, Enrollment, Metadata)
+    modified_paths = ("updated_at", "metadata__updated_at", "courses__updated_at")
+    use_replica = True
+    def get_queryset(self):
+        courses = Course.objects.annotate(enrollment_count=Count("enrollments")).order_by("course_code")
+        return Instructor.objects.prefetch_related("metadata", Prefetch("courses", queryset=courses))
 
 class InstructorCreateView(LoginRequiredMixin, CreateView):
     model = Instructor
@@ -161,7 +333,7 @@ class InstructorUpdateView(LoginRequiredMixin, UpdateView):
 
 class InstructorDeleteView(LoginRequiredMixin, DeleteView):
     model = Instructor
-    template_name = "instructors/confirm_delete.html"
+    template_name = "includes/confirm_delete.html"
     success_url = reverse_lazy("instructor_list")
 
 # Enrollment
@@ -170,15 +342,47 @@ class EnrollmentListView(SearchPaginateListView):
     search_fields = ["student__first_name", "student__last_name", "course__course_code", "exam_score", "grade"]
     template_name = "enrollments/enrollment_list.html"
     context_object_name="enrollments"
+    ordering = ["student__last_name", "student__first_name", "course__course_code"]
+    export_fields = ["id", "student__email", "student__first_name", "student__last_name", "course__course_code", "exam_score", "grade"]
+    cache_models = (Enrollment, Student, Course, Metadata, Term)
     def get_queryset(self):
         qs = super().get_queryset()
-        qs = qs.select_related("student", "course").prefetch_related("metadata")
-        qs = qs.order_by("student__last_name", "student__first_name", "course__course_code")
+        qs = qs.select_related("student", "course", "term").prefetch_related("metadata")
+        term = self.request.GET.get("term", "").strip()
+        if term == "current":
+            current = Term.objects.current()
+            qs = qs.filter(term=current) if current else qs.none()
+        elif term.isdigit():
+            qs = qs.filter(term_id=term)
+        # ?course=<pk>: one course's enrollments, e.g. from the course page's roster.
+        course = self.request.GET.get("course", "").strip()
+        if course.isdigit():
+            qs = qs.filter(course_id=course)
         return qs
 
-class EnrollmentDetailView(DetailView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["terms"] = Term.objects.filter(archived_at__isnull=True)
+        return context
+
+class EnrollmentDetailView(ConditionalDetailMixin, CachedPageMixin, DetailView):
     model = Enrollment
     template_name = "enrollments/enrollment_detail.html"
+    cache_models = (Enrollment, Student, Course, Metadata, Term)
+    modified_paths = ("updated_at", "metadata__updated_at", "student__updated_at", "course__updated_at")
+    # The course rank moves with every other enrollment's score.
+    etag_models = (Enrollment,)
+    use_replica = True
+    def get_queryset(self):
+        return Enrollment.objects.select_related("student", "course", "term").prefetch_related("metadata")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["standing"] = self.get_standing()
+        return context
+
+    def get_standing(self):
+        return ranking.course_standing(self.object)
 
 class EnrollmentCreateView(LoginRequiredMixin, CreateView):
     model = Enrollment
@@ -194,7 +398,189 @@ class EnrollmentUpdateView(LoginRequiredMixin, UpdateView):
 
 class EnrollmentDeleteView(LoginRequiredMixin, DeleteView):
     model = Enrollment
-    template_name = "enrollments/confirm_delete.html"
+    template_name = "includes/confirm_delete.html"
     success_url = reverse_lazy("enrollment_list")
 
 
+# Bulk roster import
+class RosterImportView(LoginRequiredMixin, FormView):
+    form_class = RosterImportForm
+    template_name = "imports/roster_import.html"
+
+    def form_valid(self, form):
+        upload = form.cleaned_data["file"]
+        if form.cleaned_data["background"]:
+            return self.import_in_background(upload, form.cleaned_data["kind"])
+        importer = IMPORTERS[form.cleaned_data["kind"]]()
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        result = importer.run(read_rows(stream, guess_format(upload.name)))
+        messages.info(self.request, f"Import finished: {result}.")
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
+
+    def import_in_background(self, upload, kind):
+        path = job_file("upload", f"{uuid.uuid4().hex}-{os.path.basename(upload.name)}")
+        with open(path, "wb") as out:
+            for chunk in upload.chunks():
+                out.write(chunk)
+        job = jobs.enqueue("import_roster", {"path": path, "kind": kind, "name": upload.name}, user=self.request.user)
+        messages.info(self.request, f"{upload.name} is queued for import.")
+        return redirect("job_detail", pk=job.pk)
+
+
+# Delete everything a filtered list shows
+class BulkDeleteView(LoginRequiredMixin, TemplateView):
+    template_name = "includes/confirm_bulk_delete.html"
+    list_view = None
+    # Larger selections are deleted by a background job.
+    inline_limit = 500
+    sample_size = 10
+
+    def filtered(self):
+        return any(self.request.GET.get(param, "").strip() for param in ("q", "meta_key", "meta_val"))
+
+    def selection(self):
+        view = self.list_view()
+        view.setup(self.request)
+        return view.get_queryset()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        model = self.list_view.model
+        context.update(filtered=self.filtered(), verbose_name_plural=model._meta.verbose_name_plural, list_url=reverse(self.list_view_name))
+        if context["filtered"]:
+            selection = self.selection()
+            context["count"] = selection.count()
+            context["sample"] = selection.prefetch_related(None)[:self.sample_size]
+        return context
+
+    def post(self, request):
+        if not self.filtered():
+            return HttpResponseBadRequest("Search or filter the list first.")
+        model = self.list_view.model
+        pks = list(self.selection().values_list("pk", flat=True))
+        if len(pks) > self.inline_limit:
+            job = jobs.enqueue("bulk_delete", {"model": model._meta.model_name, "pks": pks}, user=request.user)
+            messages.info(request, f"Deleting {len(pks)} {model._meta.verbose_name_plural} in the background.")
+            return redirect("job_detail", pk=job.pk)
+        total, counts = deletion.bulk_delete(model, pks)
+        messages.success(request, f"Deleted {counts.get(model._meta.label, 0)} {model._meta.verbose_name_plural} ({total} rows in all).")
+        return redirect(self.list_view_name)
+
+
+class StudentBulkDeleteView(BulkDeleteView):
+    list_view = StudentListView
+    list_view_name = "student_list"
+
+
+class CourseBulkDeleteView(BulkDeleteView):
+    list_view = CourseListView
+    list_view_name = "course_list"
+
+
+# Background jobs
+@method_decorator(staff_member_required, name="dispatch")
+class JobListView(ListView):
+    model = Job
+    template_name = "jobs/job_list.html"
+    context_object_name = "jobs"
+    paginate_by = 20
+
+    def get_queryset(self):
+        qs = Job.objects.select_related("created_by")
+        status = self.request.GET.get("status")
+        if status in dict(Job.STATUS_CHOICES):
+            qs = qs.filter(status=status)
+        return qs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        counts = dict(Job.objects.order_by().values_list("status").annotate(n=Count("pk")))
+        context["status_counts"] = [(status, label, counts.get(status, 0)) for status, label in Job.STATUS_CHOICES]
+        context["manual_tasks"] = sorted((name, t.label) for name, t in jobs.TASKS.items() if t.manual)
+        for job in context["jobs"]:
+            job.task_label = jobs.TASKS[job.task].label if job.task in jobs.TASKS else job.task
+        return context
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class JobDetailView(DetailView):
+    model = Job
+    template_name = "jobs/job_detail.html"
+
+    def get_queryset(self):
+        return Job.objects.select_related("created_by")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        task = jobs.TASKS.get(self.object.task)
+        context["task_label"] = task.label if task else self.object.task
+        return context
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class JobStatusView(View):
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        return JsonResponse({
+            "status": job.status,
+            "finished": job.finished,
+            "progress": job.progress,
+            "total": job.total,
+            "percent": job.percent,
+            "message": job.message,
+            "attempts": job.attempts,
+        })
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class JobCreateView(View):
+    def post(self, request):
+        name = request.POST.get("task")
+        task = jobs.TASKS.get(name)
+        if task is None or not task.manual:
+            return HttpResponseBadRequest("Unknown task.")
+        job = jobs.enqueue(name, user=request.user)
+        messages.info(request, f"{task.label}: queued.")
+        return redirect("job_detail", pk=job.pk)
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class JobFileView(View):
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk, status=Job.DONE)
+        name = (job.result or {}).get("file")
+        path = job_file(job.pk, name) if name else None
+        if not path or not os.path.exists(path):
+            raise Http404("No file for this job.")
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+
+# Autocomplete lookups for the form widgets
+AUTOCOMPLETE_SOURCES = {
+    "student": StudentListView,
+    "course": CourseListView,
+    "instructor": InstructorListView,
+    "metadata": MetadataListView,
+}
+
+
+class AutocompleteView(LoginRequiredMixin, View):
+    max_results = 20
+    use_replica = True
+
+    def get(self, request, model):
+        source = AUTOCOMPLETE_SOURCES.get(model)
+        if source is None:
+            raise Http404("Unknown autocomplete source.")
+        try:
+            limit = min(int(request.GET.get("limit", self.max_results)), self.max_results)
+        except ValueError:
+            limit = self.max_results
+        qs = source.model._default_manager.order_by(*source.ordering)
+        q = request.GET.get("q", "").strip()
+        if q:
+            qs = search.search(qs, q, source.search_fields)
+            if "search_rank" in qs.query.annotations:
+                qs = qs.order_by("search_rank", *source.ordering)
+        results = [{"id": obj.pk, "text": str(obj)} for obj in qs[:max(limit, 0)]]
+        return JsonResponse({"results": results})
@@ -0,0 +1,42 @@
+from django import forms
+from django.urls import reverse
+
+
+class AutocompleteMixin:
+    """
+    Select widget for a model choice field that renders only the selected
+    options and fetches the rest on demand from the autocomplete endpoint,
+    instead of rendering an <option> for every row of the queryset.
+    """
+
+    def __init__(self, model_name, attrs=None, **kwargs):
+        self.model_name = model_name
+        super().__init__(attrs, **kwargs)
+
+    @property
+    def media(self):
+        return forms.Media(js=["js/autocomplete.js"])
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs["data-autocomplete-url"] = reverse("autocomplete", args=[self.model_name])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = {str(v) for v in value if str(v).isdigit()}
+        options = []
+        if not self.allow_multiple_selected and not self.is_required:
+            options.append(self.create_option(name, "", "---------", not selected, 0))
+        if selected:
+            for obj in self.choices.queryset.filter(pk__in=selected):
+                option_value, label = self.choices.choice(obj)
+                options.append(self.create_option(name, option_value, label, True, len(options)))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass